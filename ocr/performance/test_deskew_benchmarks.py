@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.proxy import pyramid_level
+from preprocessing_image.scripts.deskew import ESTIMATORS, angle_difference, skew_angle
+
+# Synthetic A4-ish page at ~150 dpi, rotated by each of these angles (degrees)
+ANGLES = [-20, -8, -2.5, 0, 1.5, 4, 11, 25]
+# Largest accepted angle error per (method, pyramid level); None = not expected to work there
+MAX_ERROR = {
+    ("minarearect", 0): 0.5, ("minarearect", 2): 0.5,
+    ("projection", 0): 0.5, ("projection", 2): 0.5,
+    ("hough", 0): 1.0, ("hough", 2): None,
+}
+
+
+def rotated_page(angle, height=1750, width=1240):
+    rng = np.random.default_rng(int(angle * 10) % 997)
+    page = np.full((height, width), 255, dtype=np.uint8)
+    y = 140
+    while y < height - 140:
+        # Ragged lines with paragraph gaps, like running text
+        words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+        text = " ".join(rng.choice(words, size=int(rng.integers(4, 8))))
+        cv2.putText(page, text, (110, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        y += 48 if rng.random() > 0.15 else 96
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(page, matrix, (width, height), borderValue=255)
+
+
+PAGES = {angle: rotated_page(angle) for angle in ANGLES}
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("level", [0, 2])
+@pytest.mark.parametrize("method", sorted(ESTIMATORS))
+def test_deskew_estimator_benchmark(benchmark, method, level):
+    """
+    Throughput (pages/s = 1 / mean) and worst angle error of each estimator on rotated pages.
+
+    The pyramid level is built outside the timed call, as the pipeline caches it per image.
+    """
+    proxies = [pyramid_level(page, level) for page in PAGES.values()]
+
+    def estimate_all():
+        return [skew_angle(proxy, method=method) for proxy in proxies]
+
+    angles = benchmark(estimate_all)
+    # The page is rotated by +a, so the correcting rotation is -a
+    errors = [angle_difference(found, -true) for found, true in zip(angles, PAGES)]
+    benchmark.extra_info["max_angle_error"] = round(max(errors), 3)
+    benchmark.extra_info["mean_angle_error"] = round(float(np.mean(errors)), 3)
+    benchmark.extra_info["pages_per_call"] = len(proxies)
+    print(f"{method} level {level}: max error {max(errors):.3f} deg, mean {np.mean(errors):.3f} deg")
+
+    if MAX_ERROR[(method, level)] is not None:
+        assert max(errors) <= MAX_ERROR[(method, level)]
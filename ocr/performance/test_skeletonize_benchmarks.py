@@ -0,0 +1,22 @@
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.scripts.skeletonize import preprocess
+
+# Bold text on a 300-dpi-sized page (2480 x 3508): thick strokes need many peeling passes
+PAGE = np.full((3508, 2480), 255, dtype=np.uint8)
+for line in range(40):
+    cv2.putText(PAGE, "Bold heading text line %d" % line, (120, 140 + 82 * line), cv2.FONT_HERSHEY_SIMPLEX, 2.2, 0, 10)
+
+
+@pytest.mark.performance
+@pytest.mark.parametrize("method", ["morphological", "zhangsuen", "guohall"])
+def test_skeletonize_benchmark(benchmark, method):
+    """Time one page per method; the morphological loop is the pre-thinning implementation."""
+    params = {"method": method}
+    output = benchmark(preprocess, PAGE, params)
+    skeleton = (output == 0).astype(np.uint8)
+    two_by_two = skeleton[:-1, :-1] & skeleton[1:, :-1] & skeleton[:-1, 1:] & skeleton[1:, 1:]
+    benchmark.extra_info["reduction_percent"] = round(params["reduction_percent"], 2)
+    benchmark.extra_info["thick_spots"] = int(two_by_two.sum())
+    benchmark.extra_info["pieces"] = cv2.connectedComponents(skeleton, connectivity=8)[0] - 1
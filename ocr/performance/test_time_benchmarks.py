@@ -8,6 +8,9 @@ SCRIPTS = [
     ("hist_equalization",(1000, 1000, 3), {}),
     ("threshold",       (1000, 1000),    {"method": "otsu", "threshold_value": 0}),
     ("resize",          (1000, 1000, 3), {"target_width": 800, "target_height": 600, "upscale_only": False}),
+    ("adaptive_threshold", (1000, 1000), {"method": "gaussian", "block_size": 31}),
+    ("adaptive_threshold", (1000, 1000), {"method": "sauvola", "block_size": 31}),
+    ("adaptive_threshold", (1000, 1000), {"method": "sauvola", "block_size": 301}),
     # …add others here…
 ]
 
@@ -0,0 +1,175 @@
+"""
+Decode-aware input: read each image with no more pixels and channels than the plan uses.
+
+``cv2.imread`` decodes a JPEG to full-resolution BGR even when the first steps throw most
+of it away: ``grayscale`` drops the colour and a downscaling ``resize`` drops three
+quarters of the pixels or more. libjpeg can do both while decoding, for a fraction of the
+cost: ``IMREAD_GRAYSCALE`` decodes the luma plane only, and ``IMREAD_REDUCED_*_2/4/8``
+scale the DCT blocks down by 2, 4 or 8. ``ImageDecoder`` looks ahead at the plan's leading
+steps and picks flags that leave every step's output the same size and layout as with the
+full decode:
+
+* grayscale (``decode.grayscale``), when the steps before the first one producing a single
+  channel are all geometric (they move pixels without mixing channels),
+* reduced (``decode.reduced``), by the largest factor for which the first step that is
+  not pointwise still scales the image to the same size (it must express itself as a
+  scale through its ``affine`` hook, see geometry.py); the pointwise steps before it do
+  not depend on the resolution,
+* ``IMREAD_IGNORE_ORIENTATION`` when the header shows no EXIF rotation to apply.
+
+Neither shortcut gives the same pixels as the full decode, so both are off by default.
+libjpeg's luma plane is not the gray conversion of its upsampled, colour-converted BGR
+output (on coloured scans they differ by up to a few dozen grey levels at chroma edges),
+and the DCT scaling low-passes the blocks differently from the resize's area filter. The
+step metrics move accordingly (threshold coverage, noise estimates, morphology pixel
+counts), so enable them only where throughput matters more than matching a full-decode
+run. The journal fingerprint includes the flags in effect.
+
+Only JPEG decodes faster this way (other formats are decoded in full and converted or
+resized afterwards), so other files are always read as before. The size and orientation
+come from the file header through Pillow; without it images are not reduced.
+"""
+
+import io
+import os
+import logging
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from preprocessing_image.registry import GEOMETRIC, POINTWISE
+
+JPEG_EXTENSIONS = (".jpg", ".jpeg", ".jpe", ".jfif")
+FACTORS = (8, 4, 2)
+
+_REDUCED = {
+    (2, False): cv2.IMREAD_REDUCED_COLOR_2,
+    (4, False): cv2.IMREAD_REDUCED_COLOR_4,
+    (8, False): cv2.IMREAD_REDUCED_COLOR_8,
+    (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# EXIF orientation tag, and the orientations that swap width and height
+_ORIENTATION = 0x0112
+_TRANSPOSED = (5, 6, 7, 8)
+
+
+def discards_color(steps: Sequence) -> bool:
+    """True if the steps reduce the image to one channel before anything but geometric steps runs on it."""
+    for step in steps:
+        if step.spec.output_channels == 1:
+            return True
+        if step.spec.kind_for(step.params) != GEOMETRIC:
+            return False
+    return False
+
+
+def _scaling_step(steps: Sequence):
+    """The first step that is not pointwise, if it can express itself as a map of pixel coordinates."""
+    for step in steps:
+        if step.spec.kind_for(step.params) != POINTWISE:
+            return step if step.affine is not None else None
+    return None
+
+
+def _scaled_size(step, width: int, height: int) -> Optional[Tuple[int, int]]:
+    """Output (width, height) of ``step`` on an image of the given size, or None unless it only scales."""
+    try:
+        affine = step.affine((height, width), dict(step.params))
+    except Exception:
+        return None
+    if affine is None:
+        return None
+    matrix, size = affine
+    if matrix[0][1] != 0 or matrix[1][0] != 0 or matrix[0][0] <= 0 or matrix[1][1] <= 0:
+        return None
+    return tuple(size)
+
+
+def reduction(steps: Sequence, width: int, height: int) -> int:
+    """
+    Largest factor (8, 4 or 2) an image of the given size can be decoded reduced by for
+    these steps, or 1.
+    """
+    step = _scaling_step(steps)
+    if step is None:
+        return 1
+    size = _scaled_size(step, width, height)
+    if size is None:
+        return 1
+    for factor in FACTORS:
+        # libjpeg rounds the reduced size up
+        small = (-(-width // factor), -(-height // factor))
+        if small[0] >= size[0] and small[1] >= size[1] and _scaled_size(step, *small) == size:
+            return factor
+    return 1
+
+
+def read_header(source) -> Optional[Tuple[int, int, int]]:
+    """``(width, height, EXIF orientation)`` from the header of a file (a path or file object), or None."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+            orientation = image.getexif().get(_ORIENTATION, 1)
+    except Exception:
+        return None
+    return width, height, orientation
+
+
+class ImageDecoder:
+    """Reads input images with the cheapest ``cv2.imread`` flags the plan allows."""
+
+    def __init__(self, steps: Sequence = (), grayscale: bool = False, reduce: bool = False):
+        self.steps = tuple(steps)
+        self.grayscale = grayscale
+        # Only worth reading the header for when a step could take a reduced image
+        self.reduce = reduce and _scaling_step(self.steps) is not None
+
+    @classmethod
+    def from_config(cls, config: dict, steps: Sequence) -> "ImageDecoder":
+        """Decoder for the ``decode`` config section (``grayscale`` and ``reduced`` default to false)."""
+        decode_cfg = config.get("decode") or {}
+        decoder = cls(steps,
+                      grayscale=bool(decode_cfg.get("grayscale", False)) and discards_color(steps),
+                      reduce=bool(decode_cfg.get("reduced", False)))
+        if decoder.grayscale or decoder.reduce:
+            logging.info(f"JPEG input decoded with grayscale={decoder.grayscale}, reduced={decoder.reduce}")
+        return decoder
+
+    def flags(self, path: str, source=None) -> int:
+        """
+        The ``cv2.imread`` flags to read the image at ``path`` with. Its header is read from
+        ``source`` (a file object) when given; ``path`` then only supplies the extension.
+        """
+        if os.path.splitext(path)[1].lower() not in JPEG_EXTENSIONS:
+            return cv2.IMREAD_COLOR
+        flags = cv2.IMREAD_GRAYSCALE if self.grayscale else cv2.IMREAD_COLOR
+        if self.reduce:
+            header = read_header(path if source is None else source)
+            if header is not None:
+                width, height, orientation = header
+                if orientation in _TRANSPOSED:
+                    width, height = height, width
+                factor = reduction(self.steps, width, height)
+                if factor > 1:
+                    flags = _REDUCED[factor, self.grayscale]
+                if orientation == 1:
+                    flags |= cv2.IMREAD_IGNORE_ORIENTATION
+        return flags
+
+    def read(self, path: str) -> Optional[np.ndarray]:
+        """Decode the image at ``path``; None if it cannot be read, like cv2.imread."""
+        return cv2.imread(path, self.flags(path))
+
+    def decode(self, data: bytes, name: str) -> Optional[np.ndarray]:
+        """Decode an encoded image held in memory, with the flags for a file called ``name``; None if it cannot be."""
+        if not data:
+            return None
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), self.flags(name, io.BytesIO(data)))
@@ -0,0 +1,92 @@
+"""
+Fusion of consecutive pointwise steps into a single lookup-table pass.
+
+A pointwise step maps every uint8 value through a fixed 256-entry table (invert, gamma
+correction, fixed threshold, min-max normalization once the input's bounds are known).
+A run of such steps composes into one table, so the image is read and written once by a
+single ``cv2.LUT`` instead of once per step.
+
+A step takes part when its script defines ``lookup_table(params, channels, present)``
+and its validation module defines ``validate_histogram(input_hist, output_hist, params)``.
+``lookup_table`` returns None when the step is not a plain per-value map for this input
+(e.g. Otsu, color input to threshold); the run then falls back to one step at a time.
+The intensity histogram is pushed through each table, so every logical step is still
+validated against exactly the histogram its materialized input and output would have.
+"""
+
+import logging
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+_IDENTITY = np.arange(256, dtype=np.uint8)
+
+
+def is_pointwise(step) -> bool:
+    """True if the step can be fused into a lookup-table run."""
+    return step.lookup_table is not None and step.validate_histogram is not None
+
+
+def group_pointwise(steps: Sequence) -> list:
+    """Split steps into stages: runs of two or more consecutive pointwise steps, and single steps."""
+    stages = []
+    run = []
+
+    def flush():
+        if len(run) > 1:
+            stages.append(tuple(run))
+        else:
+            stages.extend((step,) for step in run)
+        run.clear()
+
+    for step in steps:
+        if is_pointwise(step):
+            run.append(step)
+        else:
+            flush()
+            stages.append((step,))
+    flush()
+    return stages
+
+
+def apply_fused(steps: Sequence, image) -> Optional[Tuple[np.ndarray, dict]]:
+    """
+    Apply a run of pointwise steps as one composed lookup table.
+
+    Returns:
+        tuple | None: (output image, {step: validation result}), or None if the run cannot
+        be fused for this image and has to be applied one step at a time.
+    """
+    if not isinstance(image, np.ndarray) or image.dtype != np.uint8 or image.size == 0:
+        return None
+    if image.ndim == 2:
+        channels = 1
+    elif image.ndim == 3 and image.shape[2] in (3, 4):
+        channels = image.shape[2]
+    else:
+        return None
+
+    hist = np.bincount(image.ravel(), minlength=256)
+    composed = _IDENTITY
+    stages = []
+    for step in steps:
+        params = dict(step.params)
+        table = step.lookup_table(params, channels, present=hist > 0)
+        if table is None:
+            return None
+        out_hist = np.bincount(table, weights=hist, minlength=256).astype(np.int64)
+        stages.append((step, params, hist, out_hist))
+        composed = table[composed]
+        hist = out_hist
+
+    output_img = cv2.LUT(image, composed)
+    logging.info(f"Applied fused pointwise steps {[step.name for step in steps]} as one lookup table.")
+    results = {}
+    for step, params, in_hist, out_hist in stages:
+        try:
+            results[step.name] = step.validate_histogram(in_hist, out_hist, params)
+        except Exception as e:
+            logging.error(f"Validation error in step '{step.name}': {e}")
+            results[step.name] = {"step": step.name, "status": "failure", "error": str(e)}
+    return output_img, results
@@ -0,0 +1,198 @@
+"""
+Fusion of consecutive geometric steps into a single warp.
+
+Deskew, crop and resize each resample (or slice) the whole image, so a run of them
+interpolates the page several times, each time over pixels a later step throws away.
+Each of them is an affine map of pixel coordinates once its decision is made (the skew
+angle, the crop box, the target size), so a run composes into one 2x3 matrix, applied
+once and only over the final output region.
+
+A step takes part when its script defines ``affine(shape, params, image=None, state=None)``
+returning ``(matrix, (width, height))``: the 2x3 matrix taking its input's pixel centres to
+its output's, and the output size. It records in ``params`` what its preprocess would (e.g.
+``detected_angle``, ``new_width``), so every step's validation still gets its metrics; the
+validators see the run's real input and final output, and zero-cost stand-ins of the right
+shape for the images in between. Only the first step of a run is handed the pixels; a later
+step that needs them (deskew, auto crop) returns None, and the run is split there.
+
+The interpolation suits the content rather than the steps:
+
+* binary images are sampled with nearest neighbour, so they stay binary,
+* a scale/translation-only map that starts on pixel boundaries (crop then resize) is a slice
+  and a ``cv2.resize`` (area when shrinking, cubic when enlarging), exactly as the unfused steps,
+* other downscales are area-averaged to the target scale over the needed source region first,
+  then warped; other enlargements are warped at the source's scale over the output region,
+  then enlarged with ``cv2.resize``, which is several times cheaper per pixel than a warp,
+* everything else is one cubic ``warpAffine``, with replicated borders as deskew uses.
+"""
+
+import logging
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from preprocessing_image.state import ImageState
+
+_EPS = 1e-6
+
+
+def is_geometric(step) -> bool:
+    """True if the step can be fused into a warp run."""
+    return step.affine is not None
+
+
+def group_geometric(stages: Sequence) -> list:
+    """Merge consecutive single-step stages of geometric steps into runs."""
+    grouped = []
+    run = []
+
+    def flush():
+        if len(run) > 1:
+            grouped.append(tuple(run))
+        else:
+            grouped.extend((step,) for step in run)
+        run.clear()
+
+    for stage in stages:
+        if len(stage) == 1 and is_geometric(stage[0]):
+            run.append(stage[0])
+        else:
+            flush()
+            grouped.append(stage)
+    flush()
+    return grouped
+
+
+def _homogeneous(matrix: np.ndarray) -> np.ndarray:
+    return np.vstack([np.asarray(matrix, dtype=np.float64), [0.0, 0.0, 1.0]])
+
+
+def source_edges(matrix: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """``[x0, y0, x1, y1]``: bounding box, in source pixel-edge coordinates, of what the output covers."""
+    width, height = size
+    inverse = cv2.invertAffineTransform(np.asarray(matrix, dtype=np.float64))
+    corners = np.float64([[-0.5, -0.5], [width - 0.5, -0.5], [-0.5, height - 0.5], [width - 0.5, height - 0.5]])
+    source = corners @ inverse[:, :2].T + inverse[:, 2] + 0.5
+    return np.concatenate([source.min(axis=0), source.max(axis=0)])
+
+
+def warp(image: np.ndarray, matrix: np.ndarray, size: Tuple[int, int], binary: bool = False) -> np.ndarray:
+    """Resample ``image`` through the 2x3 ``matrix`` into an image of ``size`` (width, height)."""
+    width, height = size
+    linear = matrix[:, :2]
+    image_h, image_w = image.shape[:2]
+
+    if abs(linear[0, 1]) < _EPS and abs(linear[1, 0]) < _EPS and linear[0, 0] > 0 and linear[1, 1] > 0:
+        edges = source_edges(matrix, size)
+        rounded = np.round(edges)
+        x0, y0, x1, y1 = (int(v) for v in rounded)
+        if np.allclose(edges, rounded, atol=1e-4) and x0 >= 0 and y0 >= 0 and x1 <= image_w and y1 <= image_h:
+            region = image[y0:y1, x0:x1]
+            if (x1 - x0, y1 - y0) == (width, height):
+                return region
+            if binary:
+                interpolation = cv2.INTER_NEAREST
+            elif width > x1 - x0 or height > y1 - y0:
+                interpolation = cv2.INTER_CUBIC
+            else:
+                interpolation = cv2.INTER_AREA
+            return cv2.resize(region, (width, height), interpolation=interpolation)
+
+    if binary:
+        return cv2.warpAffine(image, matrix, size, flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE)
+
+    scale_x = float(np.hypot(linear[0, 0], linear[1, 0]))
+    scale_y = float(np.hypot(linear[0, 1], linear[1, 1]))
+    if min(scale_x, scale_y) < 1:
+        # Area-average the source region the output needs down to the output's scale, then warp the rest
+        fx, fy = min(scale_x, 1.0), min(scale_y, 1.0)
+        margin = int(np.ceil(2 / min(fx, fy))) + 1
+        ex0, ey0, ex1, ey1 = source_edges(matrix, size)
+        x0, y0 = max(int(np.floor(ex0)) - margin, 0), max(int(np.floor(ey0)) - margin, 0)
+        x1, y1 = min(int(np.ceil(ex1)) + margin, image_w), min(int(np.ceil(ey1)) + margin, image_h)
+        if x1 > x0 and y1 > y0:
+            small_w, small_h = max(1, round((x1 - x0) * fx)), max(1, round((y1 - y0) * fy))
+            image = cv2.resize(image[y0:y1, x0:x1], (small_w, small_h), interpolation=cv2.INTER_AREA)
+            fx, fy = small_w / (x1 - x0), small_h / (y1 - y0)
+            # Pixel centres of the reduced region -> source pixel centres
+            to_source = np.float64([[1 / fx, 0, 0.5 / fx - 0.5 + x0], [0, 1 / fy, 0.5 / fy - 0.5 + y0]])
+            matrix = (_homogeneous(matrix) @ _homogeneous(to_source))[:2]
+    elif max(scale_x, scale_y) > 1 + _EPS:
+        # warpAffine costs several times cv2.resize per output pixel: rotate at the source's scale,
+        # over the output region only, and let cv2.resize do the enlarging
+        small_w, small_h = max(1, round(width / scale_x)), max(1, round(height / scale_y))
+        sx, sy = width / small_w, height / small_h
+        to_output = np.float64([[sx, 0, 0.5 * sx - 0.5], [0, sy, 0.5 * sy - 0.5]])
+        to_small = (np.linalg.inv(_homogeneous(to_output)) @ _homogeneous(matrix))[:2]
+        small = cv2.warpAffine(image, to_small, (small_w, small_h), flags=cv2.INTER_CUBIC,
+                               borderMode=cv2.BORDER_REPLICATE)
+        return cv2.resize(small, size, interpolation=cv2.INTER_CUBIC)
+    return cv2.warpAffine(image, matrix, size, flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _stand_in(shape: tuple, dtype) -> np.ndarray:
+    """A read-only image of ``shape`` that takes no memory, for validators that only look at shapes."""
+    return np.broadcast_to(np.zeros((), dtype=dtype), shape)
+
+
+def apply_warp(steps: Sequence, image: np.ndarray, state: ImageState) -> Optional[tuple]:
+    """
+    Apply the longest leading run of ``steps`` that can be decided as one composed warp.
+
+    Returns:
+        tuple | None: (output image, {step: validation result}, number of steps applied, state
+        of the output), or None if the first step cannot be expressed as a warp of this image.
+        The output image is None if a step failed.
+    """
+    shape = image.shape
+    composed = np.eye(3)
+    decided = []
+    for i, step in enumerate(steps):
+        params = dict(step.params)
+        try:
+            affine = step.affine(shape, params, image if i == 0 else None, state if i == 0 else None)
+        except Exception as e:
+            if i > 0:
+                # Applied on its own after the run, where it fails like any other step
+                break
+            logging.error(f"Error in step '{step.name}': {e}")
+            return None, {step.name: {"status": "failure", "error": str(e)}}, 1, state
+        if affine is None:
+            break
+        matrix, (width, height) = affine
+        composed = _homogeneous(matrix) @ composed
+        out_shape = (height, width) + shape[2:]
+        decided.append((step, params, shape, out_shape))
+        shape = out_shape
+    if not decided:
+        return None
+
+    size = (shape[1], shape[0])
+    matrix = composed[:2]
+    if shape == image.shape and np.allclose(matrix, np.eye(3)[:2], atol=_EPS):
+        output = image
+    else:
+        output = warp(image, matrix, size, binary=state.binary)
+    logging.info(f"Applied {[step.name for step, *_ in decided]} as one warp to {size[0]}x{size[1]}.")
+
+    results = _validate(decided, image, output)
+    if output is image:
+        out_state = state
+    else:
+        # Nearest-neighbour sampling and slicing keep a binary image binary
+        out_state = ImageState.of(output, binary=state.binary, polarity=state.polarity if state.binary else None)
+    return output, results, len(decided), out_state
+
+
+def _validate(decided: list, image: np.ndarray, output: np.ndarray) -> dict:
+    results = {}
+    for k, (step, params, in_shape, out_shape) in enumerate(decided):
+        step_in = image if k == 0 else _stand_in(in_shape, image.dtype)
+        step_out = output if k == len(decided) - 1 else _stand_in(out_shape, image.dtype)
+        try:
+            results[step.name] = step.validate(step_in, step_out, params)
+        except Exception as e:
+            logging.error(f"Validation error in step '{step.name}': {e}")
+            results[step.name] = {"step": step.name, "status": "failure", "error": str(e)}
+    return results
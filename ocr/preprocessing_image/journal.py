@@ -0,0 +1,105 @@
+"""
+On-disk run journal for resumable, incremental pipeline runs.
+
+Each finished image is appended to a JSON-lines file as soon as it completes, keyed by
+the hash of the image's bytes and the hash of the normalized step configuration. A later
+run with the same journal skips every image whose (content hash, config hash) pair is
+already recorded and reuses the recorded validation results, so an interrupted run
+resumes where it stopped and a nightly run only processes new or changed images.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Optional
+
+JOURNAL_FILE = "journal.jsonl"
+_CHUNK_SIZE = 1 << 20
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunJournal:
+    """
+    Append-only journal of finished images.
+
+    The file is replayed on open; a truncated last line (from a run killed mid-write) is
+    ignored, and ended so that new entries start on a line of their own. The size and mtime recorded with each entry let an unchanged file be matched
+    without re-reading it; anything else is hashed.
+    """
+
+    def __init__(self, path: str, config_hash: str):
+        self.path = path
+        self.config_hash = config_hash
+        self._results = {}  # (content_hash, config_hash) -> result
+        self._stats = {}    # name -> (size, mtime_ns, content_hash)
+        self._pending = {}  # name -> (size, mtime_ns, content_hash) for images looked up but not yet recorded
+        self._load()
+        self._file = open(self.path, 'a')
+        if self._file.tell() and not self._ends_with_newline():
+            # Finish a truncated last line, or the next record would be appended to it and lost too
+            self._file.write("\n")
+            self._file.flush()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        skipped = 0
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = (entry["content_hash"], entry["config_hash"])
+                    self._results[key] = entry["result"]
+                    self._stats[entry["name"]] = (entry["size"], entry["mtime_ns"], entry["content_hash"])
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1
+        if skipped:
+            logging.warning(f"Ignored {skipped} unreadable journal line(s) in {self.path}")
+        logging.info(f"Loaded run journal {self.path} ({len(self._results)} finished image(s)).")
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _content_hash(self, name: str, path: str) -> tuple:
+        st = os.stat(path)
+        known = self._stats.get(name)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return st.st_size, st.st_mtime_ns, known[2]
+        return st.st_size, st.st_mtime_ns, file_hash(path)
+
+    def lookup(self, name: str, path: str) -> Optional[dict]:
+        """Return the recorded result for an unchanged image under this config, or None if it must run."""
+        try:
+            stat_and_hash = self._content_hash(name, path)
+        except OSError as e:
+            logging.error(f"Cannot hash image {path}: {e}")
+            return None
+        self._pending[name] = stat_and_hash
+        return self._results.get((stat_and_hash[2], self.config_hash))
+
+    def record(self, name: str, result: dict) -> None:
+        """Append a finished image to the journal and flush it to disk."""
+        stat_and_hash = self._pending.pop(name, None)
+        if stat_and_hash is None:
+            return
+        size, mtime_ns, content_hash = stat_and_hash
+        entry = {"name": name, "size": size, "mtime_ns": mtime_ns, "content_hash": content_hash,
+                 "config_hash": self.config_hash, "result": result}
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._results[(content_hash, self.config_hash)] = result
+        self._stats[name] = stat_and_hash
+
+    def close(self) -> None:
+        self._file.close()
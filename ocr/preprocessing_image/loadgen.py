@@ -0,0 +1,120 @@
+"""
+Load generator for the preprocessing service (see service.py).
+
+Posts the images of a directory to ``/process/<config>`` from ``concurrency`` threads,
+round-robin, until ``total`` requests have been answered, and reports throughput,
+p50/p95/p99 latency and the mean micro-batch size the service formed::
+
+    python -m preprocessing_image.loadgen samples/ --url http://127.0.0.1:8080 --config base \
+        --concurrency 8 --requests 200
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import itertools
+import threading
+
+import numpy as np
+import yaml
+
+from preprocessing_image.metrics import QUANTILES
+from preprocessing_image.sources import is_image_file
+
+
+def load_images(image_dir: str) -> list:
+    """``(name, bytes)`` of every image file in ``image_dir``, in name order."""
+    images = []
+    for name in sorted(os.listdir(image_dir)):
+        path = os.path.join(image_dir, name)
+        if is_image_file(name) and os.path.isfile(path):
+            with open(path, "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+def run_load(url: str, config: str, images: list, concurrency: int = 4, total: int = 100,
+             response: str = "json", timeout: float = 300.0) -> dict:
+    """
+    Send ``total`` requests for ``images`` (``(name, bytes)`` pairs) from ``concurrency`` threads.
+
+    Returns:
+        dict: request and error counts, the elapsed seconds, throughput in requests per
+        second, latency percentiles in milliseconds, and the service's mean batch size and
+        processing time.
+    """
+    import requests
+
+    if not images:
+        raise ValueError("No images to send.")
+    endpoint = f"{url.rstrip('/')}/process/{config}"
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies, batch_sizes, process_ms = [], [], []
+    errors = []
+
+    def client():
+        with requests.Session() as session:
+            while True:
+                i = next(counter)
+                if i >= total:
+                    return
+                name, data = images[i % len(images)]
+                start = time.perf_counter()
+                try:
+                    reply = session.post(endpoint, params={"response": response},
+                                         files={"image": (name, data)}, timeout=timeout)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    reply.raise_for_status()
+                    if response == "image":
+                        timing = json.loads(reply.headers["X-Timing"])
+                    else:
+                        timing = reply.json()["timing"]
+                except Exception as e:
+                    with lock:
+                        errors.append(f"{name}: {e}")
+                    continue
+                with lock:
+                    latencies.append(elapsed)
+                    batch_sizes.append(timing.get("batch_size", 1))
+                    process_ms.append(timing.get("process_ms", 0.0))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, name=f"client-{n}") for n in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    for error in errors[:5]:
+        logging.warning(f"Request failed: {error}")
+    report = {"requests": len(latencies), "errors": len(errors), "concurrency": concurrency,
+              "seconds": round(seconds, 3), "throughput_rps": round(len(latencies) / seconds, 2)}
+    if latencies:
+        values = np.asarray(latencies)
+        latency = {f"p{q}": round(float(np.percentile(values, q)), 3) for q in QUANTILES}
+        latency.update(mean=round(float(values.mean()), 3), max=round(float(values.max()), 3))
+        report.update(latency_ms=latency, mean_batch_size=round(float(np.mean(batch_sizes)), 2),
+                      mean_process_ms=round(float(np.mean(process_ms)), 3))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the latency and throughput of the preprocessing service.")
+    parser.add_argument("image_dir", help="Directory of images to send (round-robin).")
+    parser.add_argument("--url", default="http://127.0.0.1:8080", help="Base URL of the service.")
+    parser.add_argument("--config", default="base", help="Name of the config to process with.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument("--requests", dest="total", type=int, default=100, help="Requests to send in all.")
+    parser.add_argument("--response", choices=["json", "image"], default="json",
+                        help="Ask for the JSON response or the raw image.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    report = run_load(args.url, args.config, load_images(args.image_dir), args.concurrency, args.total, args.response)
+    print(yaml.safe_dump(report, sort_keys=False), end="")
+
+
+if __name__ == "__main__":
+    main()
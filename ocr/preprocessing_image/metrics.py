@@ -0,0 +1,172 @@
+"""
+Per-step latency and memory metrics.
+
+With ``metrics.enabled`` in the config, every step's result gains a ``timing`` entry with
+its wall time and CPU time in milliseconds, plus its peak traced allocation when
+``metrics.tracemalloc`` is set. Steps fused into one stage (see fusion.py) share one
+measurement and name their stage. ``RunMetrics`` collects the timings as images finish,
+rewrites an optional Prometheus textfile (for node_exporter's textfile collector) while
+the run goes, and produces the end-of-run p50/p95/p99 summary per step.
+
+CPU time is process CPU time, so it includes OpenCV's worker threads; with decode
+prefetching in the same process it also includes some decoding.
+"""
+
+import os
+import time
+import logging
+import tracemalloc
+from typing import Callable, Optional
+
+import numpy as np
+
+QUANTILES = (50, 95, 99)
+METRIC_PREFIX = "ocr_preprocess"
+
+
+def timed(func: Callable, *args, trace_memory: bool = False):
+    """
+    Call ``func(*args)`` and measure it.
+
+    Returns:
+        tuple: (return value, {"wall_ms", "cpu_ms"[, "peak_kib"]}).
+    """
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    value = func(*args)
+    timing = {"wall_ms": round((time.perf_counter() - wall) * 1000, 3),
+              "cpu_ms": round((time.process_time() - cpu) * 1000, 3)}
+    if trace_memory:
+        timing["peak_kib"] = round((tracemalloc.get_traced_memory()[1] - base) / 1024, 1)
+    return value, timing
+
+
+def attach_timing(stage: tuple, stage_results: dict, timing: dict) -> None:
+    """Record a stage's timing in the results of the steps it ran."""
+    if len(stage) > 1:
+        timing = dict(timing, stage="+".join(step.name for step in stage))
+    for step in stage:
+        if isinstance(stage_results.get(step.name), dict):
+            stage_results[step.name]["timing"] = dict(timing)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RunMetrics:
+    """
+    Collects per-step timings of finished images.
+
+    ``prometheus_file`` (optional) is rewritten atomically at most every ``interval``
+    seconds while images finish, and once more by ``close()``.
+    """
+
+    def __init__(self, prometheus_file: Optional[str] = None, interval: float = 10.0):
+        self.prometheus_file = prometheus_file
+        self.interval = interval
+        self.wall = {}   # stage -> [ms, ...]
+        self.cpu = {}    # stage -> [ms, ...]
+        self.peak = {}   # stage -> max KiB
+        self.images = {"success": 0, "failure": 0}
+        self._last_write = 0.0
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["RunMetrics"]:
+        """RunMetrics for ``metrics.enabled``, otherwise None."""
+        metrics_cfg = config.get("metrics") or {}
+        if not metrics_cfg.get("enabled", False):
+            return None
+        return cls(metrics_cfg.get("prometheus_file"), float(metrics_cfg.get("prometheus_interval", 10.0)))
+
+    def add(self, result: dict) -> None:
+        """Add one finished image's results."""
+        failed = "pipeline" in result
+        seen = set()
+        for step_name, step_result in result.items():
+            if not isinstance(step_result, dict):
+                continue
+            failed = failed or step_result.get("status") == "failure"
+            timing = step_result.get("timing")
+            if not timing:
+                continue
+            stage = timing.get("stage", step_name)
+            if stage in seen:
+                continue
+            seen.add(stage)
+            self.wall.setdefault(stage, []).append(timing["wall_ms"])
+            self.cpu.setdefault(stage, []).append(timing["cpu_ms"])
+            if "peak_kib" in timing:
+                self.peak[stage] = max(self.peak.get(stage, 0.0), timing["peak_kib"])
+        self.images["failure" if failed else "success"] += 1
+        if self.prometheus_file and time.monotonic() - self._last_write >= self.interval:
+            self.write_prometheus()
+
+    def summary(self) -> dict:
+        """Per step: image count, total and p50/p95/p99 wall and CPU milliseconds, and the largest peak."""
+        summary = {}
+        for stage, walls in self.wall.items():
+            entry = {"count": len(walls), "wall_ms_total": round(float(np.sum(walls)), 3)}
+            for q, value in zip(QUANTILES, np.percentile(walls, QUANTILES)):
+                entry[f"wall_ms_p{q}"] = round(float(value), 3)
+            for q, value in zip(QUANTILES, np.percentile(self.cpu[stage], QUANTILES)):
+                entry[f"cpu_ms_p{q}"] = round(float(value), 3)
+            if stage in self.peak:
+                entry["peak_kib_max"] = self.peak[stage]
+            summary[stage] = entry
+        return summary
+
+    def log_summary(self) -> None:
+        for stage, entry in sorted(self.summary().items(), key=lambda item: -item[1]["wall_ms_total"]):
+            logging.info(f"Step {stage}: n={entry['count']} wall p50={entry['wall_ms_p50']}ms "
+                         f"p95={entry['wall_ms_p95']}ms p99={entry['wall_ms_p99']}ms "
+                         f"total={entry['wall_ms_total']}ms cpu p50={entry['cpu_ms_p50']}ms")
+
+    def prometheus_text(self) -> str:
+        p = METRIC_PREFIX
+        lines = [f"# HELP {p}_step_seconds Wall time of a pipeline step per image.",
+                 f"# TYPE {p}_step_seconds summary"]
+        for stage, walls in sorted(self.wall.items()):
+            label = _label(stage)
+            for q, value in zip(QUANTILES, np.percentile(walls, QUANTILES)):
+                lines.append(f'{p}_step_seconds{{step="{label}",quantile="{q / 100}"}} {value / 1000:.6f}')
+            lines.append(f'{p}_step_seconds_sum{{step="{label}"}} {np.sum(walls) / 1000:.6f}')
+            lines.append(f'{p}_step_seconds_count{{step="{label}"}} {len(walls)}')
+        lines += [f"# HELP {p}_step_cpu_seconds_total CPU time spent in a pipeline step.",
+                  f"# TYPE {p}_step_cpu_seconds_total counter"]
+        for stage, cpus in sorted(self.cpu.items()):
+            lines.append(f'{p}_step_cpu_seconds_total{{step="{_label(stage)}"}} {np.sum(cpus) / 1000:.6f}')
+        if self.peak:
+            lines += [f"# HELP {p}_step_peak_bytes Largest traced allocation peak of a pipeline step.",
+                      f"# TYPE {p}_step_peak_bytes gauge"]
+            for stage, peak in sorted(self.peak.items()):
+                lines.append(f'{p}_step_peak_bytes{{step="{_label(stage)}"}} {int(peak * 1024)}')
+        lines += [f"# HELP {p}_images_total Images finished by the pipeline.",
+                  f"# TYPE {p}_images_total counter"]
+        for status, count in self.images.items():
+            lines.append(f'{p}_images_total{{status="{status}"}} {count}')
+        lines += [f"# HELP {p}_last_update_timestamp_seconds Time this file was written.",
+                  f"# TYPE {p}_last_update_timestamp_seconds gauge",
+                  f"{p}_last_update_timestamp_seconds {time.time():.3f}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self) -> None:
+        """Atomically replace the Prometheus textfile, so a scrape never sees a partial file."""
+        tmp_path = f"{self.prometheus_file}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.prometheus_file)), exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                f.write(self.prometheus_text())
+            os.replace(tmp_path, self.prometheus_file)
+        except OSError as e:
+            logging.error(f"Failed to write Prometheus textfile {self.prometheus_file}: {e}")
+        self._last_write = time.monotonic()
+
+    def close(self) -> None:
+        if self.prometheus_file:
+            self.write_prometheus()
@@ -0,0 +1,40 @@
+"""
+Shared pieces of the morphology steps (dilate, erode, morph_open, morph_close, skeletonize).
+
+Structuring elements are built once per (shape, size) and cached; the cached arrays are
+read-only, so a caller cannot change the kernel every other step sees.
+
+Steps with ``target: dark`` work on the dark regions. Instead of inverting the image,
+running the operation and inverting back, they run the dual operation on the image as is:
+for the symmetric kernels below, dilating the inverted image is eroding the image (and
+inverted), and opening it is closing the image. ``bitwise_not`` reverses the order of
+pixel values, so the two are equal bit for bit, without the two full-image inversions.
+"""
+
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+SHAPES = {"rect": cv2.MORPH_RECT, "ellipse": cv2.MORPH_ELLIPSE, "cross": cv2.MORPH_CROSS}
+
+# Operation applied to the image when the requested one is meant for its dark regions
+DUAL = {
+    cv2.MORPH_DILATE: cv2.MORPH_ERODE,
+    cv2.MORPH_ERODE: cv2.MORPH_DILATE,
+    cv2.MORPH_OPEN: cv2.MORPH_CLOSE,
+    cv2.MORPH_CLOSE: cv2.MORPH_OPEN,
+}
+
+
+@lru_cache(maxsize=64)
+def structuring_element(shape: str, ksize: int) -> np.ndarray:
+    """Read-only ``ksize`` x ``ksize`` kernel of ``shape`` ("rect", "ellipse" or "cross"; anything else is "rect")."""
+    kernel = cv2.getStructuringElement(SHAPES.get(shape, cv2.MORPH_RECT), (ksize, ksize))
+    kernel.flags.writeable = False
+    return kernel
+
+
+def for_target(op: int, target: str) -> int:
+    """The morphology operation to run on the image for ``op`` on its ``target`` ("bright" or "dark") regions."""
+    return DUAL[op] if target == "dark" else op
@@ -1,82 +1,401 @@
 import os
-import cv2
+import itertools
+import threading
 import yaml
 import logging
-import importlib
-from utils import load_config, save_image, update_result_yaml
+import numpy as np
+from collections import deque
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from preprocessing_image.fusion import apply_fused
+from preprocessing_image.geometry import apply_warp, is_geometric
+from preprocessing_image.journal import JOURNAL_FILE, RunJournal
+from preprocessing_image.metrics import RunMetrics, attach_timing, timed
+from preprocessing_image.packed import PackedBinary
+from preprocessing_image.plan import PipelinePlan, PlanStep
+from preprocessing_image.sinks import YamlSink, make_sink, to_legacy_yaml
+from preprocessing_image.sources import make_source, prefetch
+from preprocessing_image.state import ImageState, next_state
+from preprocessing_image.tiling import TiledExecutor
+from preprocessing_image.utils import load_config, update_result_yaml
+from preprocessing_image.watch import FolderWatcher
+from preprocessing_image.writer import ImageWriter
 
-def run_pipeline(image_dir: str, config: dict) -> dict:
-    """Run the preprocessing pipeline on all images in the given directory using the provided config."""
-    results = {}
+# Per-process state installed by _init_worker when running with a process pool
+_worker_context = {}
+
+
+def apply_step(step: PlanStep, image, state: ImageState = None, tiler: TiledExecutor = None):
+    """
+    Run one plan step and its validation on an image.
+
+    ``state`` (the image's ImageState) is passed on to scripts that accept it. With a
+    ``tiler``, neighborhood steps on large images run tile by tile; validation still sees
+    the whole input and output.
+
+    Returns:
+        tuple: (output image, validation result). The output image is None if the step itself failed.
+    """
+    name = step.name
+    try:
+        # Copy params to avoid cross-image modifications
+        step_params = dict(step.params)
+        if tiler is not None and tiler.applies(step, image, step_params):
+            output_img = tiler.run(step, image, step_params)
+        else:
+            output_img = step.run(image, step_params, state)
+    except Exception as e:
+        logging.error(f"Error in step '{name}': {e}")
+        return None, {"status": "failure", "error": str(e)}
+    try:
+        val_result = step.validate(image, output_img, step_params)
+    except Exception as e:
+        logging.error(f"Validation error in step '{name}': {e}")
+        val_result = {"step": name, "status": "failure", "error": str(e)}
+    return output_img, val_result
+
+
+def apply_stage(stage: tuple, image, state: ImageState = None, tiler: TiledExecutor = None):
+    """
+    Run one plan stage: a single step, a run of pointwise steps fused into one lookup table,
+    or a run of geometric steps fused into one warp.
+
+    A fused run that cannot be applied to this image (e.g. not uint8) runs one step at a time.
+    A warp run is split before any step that needs the pixels of its own input (see geometry.py).
+
+    Returns:
+        tuple: (output image, {step: validation result}, state of the output image). The output
+        image is None if a step failed.
+    """
+    if state is None:
+        state = ImageState.of(image)
+    if len(stage) > 1 and is_geometric(stage[0]):
+        warped = apply_warp(stage, image, state)
+        if warped is None:
+            # The first step cannot be decided as a warp of this image: run it on its own
+            output_img, stage_results, state = apply_stage(stage[:1], image, state, tiler)
+            count = 1
+        else:
+            output_img, stage_results, count, state = warped
+        if output_img is None or count == len(stage):
+            return output_img, stage_results, state
+        rest_img, rest_results, state = apply_stage(stage[count:], output_img, state, tiler)
+        stage_results.update(rest_results)
+        return rest_img, stage_results, state
+    if len(stage) > 1:
+        fused = apply_fused(stage, image)
+        if fused is not None:
+            output_img, stage_results = fused
+            return output_img, stage_results, next_state(stage, state, image, output_img)
+    stage_results = {}
+    for step in stage:
+        output_img, stage_results[step.name] = apply_step(step, image, state, tiler)
+        if output_img is None:
+            return None, stage_results, state
+        state = next_state((step,), state, image, output_img)
+        image = output_img
+    return image, stage_results, state
+
+
+def run_stages(plan: PipelinePlan, image, results: dict, fuse: bool = True, on_stage=None):
+    """
+    Apply every stage of the plan to a decoded image, recording each step's validation in ``results``.
+
+    With the plan's ``pack_binary``, images known to be binary are held bit-packed between
+    stages (see packed.py). ``on_stage(stage, output image, state)`` is called after each
+    stage that succeeded (e.g. to save intermediates).
+
+    Returns:
+        tuple: (the last image a stage produced, possibly a PackedBinary, and its ImageState).
+        Stages after a failed step are not run.
+    """
+    current_img = image
+    state = ImageState.of(image)
+    # Sequentially apply each stage
+    for stage in plan.stages(fuse=fuse):
+        if isinstance(current_img, PackedBinary):
+            current_img = current_img.unpack()
+        if plan.record_timing:
+            (output_img, stage_results, state), timing = timed(apply_stage, stage, current_img, state,
+                                                               plan.tiler, trace_memory=plan.trace_memory)
+            attach_timing(stage, stage_results, timing)
+        else:
+            output_img, stage_results, state = apply_stage(stage, current_img, state, plan.tiler)
+        # Record validation results for the steps of this stage
+        results.update(stage_results)
+        if output_img is None:
+            break
+        if plan.pack_binary and state.binary and state.channels == 1 and state.dtype == np.uint8:
+            # Held between stages one bit per pixel
+            output_img = PackedBinary.pack(output_img)
+        if on_stage is not None:
+            on_stage(stage, output_img, state)
+        # Set current image for next step
+        current_img = output_img
+    return current_img, state
+
+
+def process_image(image_dir: str, image_name: str, plan: PipelinePlan, output_dir: str, save_intermediate: bool = False,
+                  image=None, writer: ImageWriter = None):
+    """
+    Run every step of the plan on a single image and save the final output.
+
+    ``image_name`` is relative to ``image_dir`` and may contain subdirectories, which are
+    mirrored under ``output_dir``. Pass ``image`` when it has already been decoded; otherwise
+    it is read with the plan's decoder (see decode.py).
+
+    The stages run through ``run_stages``. Output images are written in the plan's output
+    format (see writer.py) by ``writer``, under the key ``image_name``; without one they are
+    written before returning, and a failed write is recorded as the image's ``output`` result.
+
+    Returns:
+        dict | None: The per-step validation results for the image, or None if the image could not be read.
+    """
+    image_path = os.path.join(image_dir, image_name)
+    image_results = {}
+    own_writer = writer is None
+    if own_writer:
+        writer = ImageWriter(plan.output, workers=0)
+    try:
+        img = image if image is not None else plan.decoder.read(image_path)
+        if img is None:
+            logging.error(f"Failed to read image: {image_path}")
+            return None
+        logging.info(f"Processing image: {image_name}")
+
+        def save_intermediate_image(stage, output_img, state):
+            inter_path = os.path.join(output_dir, f"{os.path.splitext(image_name)[0]}_{stage[-1].name}.png")
+            writer.submit(image_name, output_img, inter_path, binary=state.binary and state.channels == 1)
+
+        # Intermediates need every step materialized, so no fusion then
+        current_img, state = run_stages(plan, img, image_results, fuse=not save_intermediate,
+                                        on_stage=save_intermediate_image if save_intermediate else None)
+        # Save final output image
+        final_path = writer.submit(image_name, current_img, os.path.join(output_dir, image_name),
+                                   binary=state.binary and state.channels == 1)
+        logging.info(f"Saved processed image to {final_path}")
+    except Exception as e:
+        logging.exception(f"Pipeline error processing image {image_name}: {e}")
+    if own_writer:
+        failure = writer.result(image_name)
+        if failure is not None:
+            image_results["output"] = failure
+    return image_results
+
+
+def _init_worker(image_dir: str, plan: PipelinePlan, output_dir: str, save_intermediate: bool) -> None:
+    """Process pool initializer: keep the run settings in the worker so each task only ships an image name."""
+    _worker_context.update(image_dir=image_dir, plan=plan, output_dir=output_dir,
+                           save_intermediate=save_intermediate)
+
+
+def _process_in_worker(image_name: str):
+    ctx = _worker_context
+    return process_image(ctx["image_dir"], image_name, ctx["plan"], ctx["output_dir"], ctx["save_intermediate"])
+
+
+def _crash_result(image_name: str) -> dict:
+    logging.error(f"Worker process crashed while processing image {image_name}")
+    return {"pipeline": {"status": "failure", "error": "worker process crashed"}}
+
+
+def _run_isolated(image_name: str, initargs: tuple) -> dict:
+    """Re-run one image in a fresh single-process pool so a crash is attributed to the image that caused it."""
+    try:
+        with ProcessPoolExecutor(max_workers=1, initializer=_init_worker, initargs=initargs) as pool:
+            return pool.submit(_process_in_worker, image_name).result()
+    except BrokenProcessPool:
+        return _crash_result(image_name)
+
+
+def _run_parallel(batches, workers: int, initargs: tuple, on_batch=None):
+    """
+    Process batches of images across one pool of worker processes, yielding ``(name, result)``
+    as each finishes.
+
+    ``batches`` is an iterable of image name iterables (the whole source, or a watch's polls).
+    Each batch is consumed lazily with at most 2 * workers images in flight, and
+    ``on_batch()`` is called once all of its images have finished. The pool is started for
+    the first image and kept open across batches, so a watch does not start new processes
+    per poll. If a worker dies (e.g. a segfault inside cv2) the pool is torn down, every image
+    that was in flight is retried on its own, and the run continues with a new pool.
+    """
+    max_in_flight = 2 * workers
+    pool = None
+    try:
+        for batch in batches:
+            names = iter(batch)
+            next_name = next(names, None)
+            in_flight = {}
+            while next_name is not None or in_flight:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+                try:
+                    while next_name is not None and len(in_flight) < max_in_flight:
+                        in_flight[pool.submit(_process_in_worker, next_name)] = next_name
+                        next_name = next(names, None)
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+                        yield in_flight.pop(future), result
+                except BrokenProcessPool:
+                    logging.warning(f"Process pool broke; retrying {len(in_flight)} in-flight image(s) one at a time.")
+                    pool.shutdown(wait=True)
+                    pool = None
+                    for name in sorted(in_flight.values()):
+                        yield name, _run_isolated(name, initargs)
+                    in_flight = {}
+            if on_batch is not None:
+                on_batch()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def _finish_written(writer: ImageWriter, name: str, result: dict, finished) -> None:
+    """Pass an image's results on once its outputs are written, with the ``output`` failure if a write failed."""
+    failure = writer.result(name)
+    if failure is not None and result is not None:
+        result["output"] = failure
+    finished(name, result)
+
+
+def _open_journal(config: dict, output_dir: str, plan: PipelinePlan):
+    """Open the run journal when ``journal.enabled`` is set in the config, otherwise return None."""
+    journal_cfg = config.get("journal") or {}
+    if not journal_cfg.get("enabled", False):
+        return None
+    path = journal_cfg.get("path") or os.path.join(output_dir, JOURNAL_FILE)
+    return RunJournal(path, plan.fingerprint())
+
+
+def run_pipeline(image_dir: str, config: dict, stop: Optional[threading.Event] = None) -> dict:
+    """
+    Run the preprocessing pipeline on all images in the given directory using the provided config.
+
+    Images come from the configured ``source`` (see sources.make_source; by default the
+    top level of image_dir in sorted order). With ``workers`` > 1 in the config, images are
+    processed across that many worker processes; otherwise upcoming images are decoded on a
+    small ``prefetch`` thread pool while the current one is processed. With the ``decode``
+    config section's opt-in flags, JPEG input is decoded straight to grayscale and/or reduced
+    in size when the leading steps would discard the colour or downscale anyway (see decode.py).
+
+    Output images are written in the ``output`` config section's format; with a single worker
+    they are encoded on background threads (see writer.py), and an image's results are passed
+    on once its outputs are written, so a failed write is in its results.
+
+    Each finished image's results go to the configured ``results`` sink (see sinks.py): the
+    legacy result.yaml written at the end (default), or a JSONL or SQLite file written as
+    images complete. Records carry the image's source position, so result.yaml is in
+    source order whatever the worker count.
+
+    With ``journal.enabled``, every finished image is recorded in a run journal (see
+    journal.RunJournal) and images already recorded for the same content and step config
+    are skipped, reusing their recorded results.
+
+    With ``watch.enabled``, the run keeps going after the source is exhausted: newly
+    arrived images are processed in batches as they become complete (see watch.py) until
+    ``stop`` is set or the process is interrupted, and the sink is flushed after each batch.
+
+    With ``metrics.enabled``, each step's result includes its timing, an optional
+    Prometheus textfile is kept up to date during the run, and the per-step p50/p95/p99
+    summary is logged and written to output/metrics.yaml (see metrics.py).
+
+    Returns:
+        Mapping: Results by image name in source order. For the streaming sinks this is read
+        back from the result file on first access.
+    """
+    # Resolve every step up front: a missing module fails the run here, not once per image
+    plan = PipelinePlan.from_config(config)
     # Prepare output directory
     output_dir = os.path.join(image_dir, "output")
     os.makedirs(output_dir, exist_ok=True)
     save_intermediate = config.get("save_intermediate", False)
-    steps = config.get("steps", [])
-    for image_name in os.listdir(image_dir):
-        if not image_name.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')):
-            continue  # skip non-image files
-        image_path = os.path.join(image_dir, image_name)
-        try:
-            img = cv2.imread(image_path)
-            if img is None:
-                logging.error(f"Failed to read image: {image_path}")
-                continue
-            logging.info(f"Processing image: {image_name}")
-            original_img = img.copy()
-            results[image_name] = {}
-            current_img = img
-            # Sequentially apply each preprocessing step
-            for step in steps:
-                name = step.get('name')
-                enabled = step.get('enabled', True)
-                params = step.get('params', {})
-                if not enabled:
-                    logging.info(f"Skipping step {name}")
+    workers = max(1, int(config.get("workers", 1) or 1))
+    source = make_source(image_dir, config, exclude=[output_dir])
+    sink = make_sink(config, output_dir)
+    journal = _open_journal(config, output_dir, plan)
+    run_metrics = RunMetrics.from_config(config)
+    watcher = FolderWatcher.from_config(config, source)
+    if watcher is not None and isinstance(sink, YamlSink):
+        logging.warning("Watching with the yaml result sink: result.yaml is only written when the watch stops.")
+    # Source position of each image still being processed, so records can be put back in source order
+    positions = {}
+    counter = itertools.count()
+
+    def pending(names):
+        """Yield the images that still need processing, passing journaled results straight to the sink."""
+        for name in names:
+            index = next(counter)
+            if journal is not None:
+                cached = journal.lookup(name, source.path(name))
+                if cached is not None and os.path.exists(plan.output.path_for(os.path.join(output_dir, name))):
+                    logging.info(f"Skipping unchanged image: {name}")
+                    sink.write(name, cached, index)
                     continue
-                module_path = f"preprocessing_image.scripts.{name}"
-                validation_path = f"preprocessing_image.validation.{name}_validation"
-                try:
-                    step_module = importlib.import_module(module_path)
-                except ImportError as ie:
-                    logging.error(f"Step module {module_path} not found: {ie}")
-                    results[image_name][name] = {"status": "failure", "error": "module not found"}
-                    break
-                try:
-                    # Copy params to avoid cross-image modifications
-                    step_params = dict(params)
-                    output_img = step_module.preprocess(current_img, step_params)
-                except Exception as e:
-                    logging.error(f"Error in step '{name}': {e}")
-                    results[image_name][name] = {"status": "failure", "error": str(e)}
-                    break
-                try:
-                    val_module = importlib.import_module(validation_path)
-                except ImportError as ie:
-                    logging.error(f"Validation module {validation_path} not found: {ie}")
-                    results[image_name][name] = {"status": "failure", "error": "validation module not found"}
-                    break
-                try:
-                    val_result = val_module.validate(current_img, output_img, step_params)
-                except Exception as e:
-                    logging.error(f"Validation error in step '{name}': {e}")
-                    val_result = {"step": name, "status": "failure", "error": str(e)}
-                # Record validation result for this step
-                results[image_name][name] = val_result
-                # Optionally save intermediate output
-                if save_intermediate:
-                    inter_path = os.path.join(output_dir, f"{os.path.splitext(image_name)[0]}_{name}.png")
-                    save_image(output_img, inter_path)
-                # Set current image for next step
-                current_img = output_img
-            # Save final output image
-            final_path = os.path.join(output_dir, image_name)
-            save_image(current_img, final_path)
-            logging.info(f"Saved processed image to {final_path}")
-        except Exception as e:
-            logging.exception(f"Pipeline error processing image {image_name}: {e}")
-    # Write summary results to YAML
-    result_path = os.path.join(output_dir, "result.yaml")
-    update_result_yaml(results, result_path)
-    logging.info(f"Pipeline completed. Results saved to {result_path}")
-    return results
+            positions[name] = index
+            yield name
+
+    def finished(name, result):
+        index = positions.pop(name)
+        if result is None:
+            return
+        # Crashed workers and unwritten outputs are not journaled so the image is retried on the next run
+        if journal is not None and "pipeline" not in result and "output" not in result:
+            journal.record(name, result)
+        if run_metrics is not None:
+            run_metrics.add(result)
+        sink.write(name, result, index)
+
+    # The whole source at once, or with watch mode each poll's newly complete images until stopped
+    batches = [source] if watcher is None else watcher.batches(stop)
+    try:
+        if workers > 1:
+            logging.info(f"Processing images with {workers} worker processes.")
+            initargs = (image_dir, plan, output_dir, save_intermediate)
+            # One pool for the whole run: with watch mode, new images are queued to the running workers
+            batches = (pending(batch) for batch in batches)
+            for name, result in _run_parallel(batches, workers, initargs, on_batch=sink.flush):
+                finished(name, result)
+        else:
+            prefetch_cfg = config.get("prefetch") or {}
+            with ImageWriter.from_config(config, plan.output) as writer:
+                for batch in batches:
+                    decoded = prefetch(source, reader=plan.decoder.read, workers=prefetch_cfg.get("workers", 2),
+                                       depth=prefetch_cfg.get("depth", 4), names=pending(batch))
+                    # Images whose outputs are still being written, in the order they were processed
+                    writing = deque()
+                    for name, img in decoded:
+                        if img is None:
+                            logging.error(f"Failed to read image: {source.path(name)}")
+                            finished(name, None)
+                            continue
+                        writing.append((name, process_image(image_dir, name, plan, output_dir, save_intermediate,
+                                                            image=img, writer=writer)))
+                        while writing and writer.done(writing[0][0]):
+                            _finish_written(writer, *writing.popleft(), finished)
+                    while writing:
+                        _finish_written(writer, *writing.popleft(), finished)
+                    sink.flush()
+            if writer.failed:
+                logging.error(f"{writer.failed} output image(s) could not be written; see the 'output' results.")
+    except KeyboardInterrupt:
+        # Interrupting is how a watch is normally stopped; images still in flight run again next time
+        if watcher is None:
+            raise
+        logging.info("Watch interrupted.")
+    finally:
+        sink.close()
+        if journal is not None:
+            journal.close()
+        if run_metrics is not None:
+            run_metrics.close()
+    results_cfg = config.get("results") or {}
+    if results_cfg.get("legacy_yaml", False) and not isinstance(sink, YamlSink):
+        to_legacy_yaml(sink.path, os.path.join(output_dir, "result.yaml"))
+    if run_metrics is not None:
+        run_metrics.log_summary()
+        update_result_yaml(run_metrics.summary(), os.path.join(output_dir, "metrics.yaml"))
+    logging.info(f"Pipeline completed. Results saved to {sink.path}")
+    return sink.results()
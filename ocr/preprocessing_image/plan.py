@@ -0,0 +1,203 @@
+"""
+Compile the configured step list into an execution plan.
+
+The plan resolves each enabled step's preprocess and validate functions and its declared
+StepSpec (see registry.py) once, before the first image is decoded, so a missing module
+fails the whole run up front and the per-image loop only has to call the steps.
+"""
+
+import json
+import hashlib
+import importlib
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from preprocessing_image.decode import ImageDecoder
+from preprocessing_image.fusion import group_pointwise
+from preprocessing_image.geometry import group_geometric
+from preprocessing_image.registry import DEFAULT_SPEC, SCRIPTS_PACKAGE, StepSpec, spec_of
+from preprocessing_image.tiling import TiledExecutor
+from preprocessing_image.writer import OutputFormat
+
+VALIDATION_PACKAGE = "preprocessing_image.validation"
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """
+    A resolved pipeline step: its name, configured params and the functions that run and validate it.
+
+    ``lookup_table`` and ``validate_histogram`` are set for pointwise steps that can be fused
+    into a single lookup-table pass (see fusion.py). ``output_state`` declares what the step
+    guarantees about its output (see state.py) and ``spec`` holds the rest of its declared
+    metadata, including how it is called (see registry.py). ``tile_params`` resolves params
+    that depend on the whole image before the step runs tile by tile (see tiling.py).
+    ``affine`` expresses a geometric step as a map of pixel coordinates, so a run of them
+    can be applied as one warp (see geometry.py).
+    """
+    name: str
+    params: dict
+    preprocess: Callable
+    validate: Callable
+    lookup_table: Optional[Callable] = None
+    validate_histogram: Optional[Callable] = None
+    output_state: Optional[Callable] = None
+    tile_params: Optional[Callable] = None
+    affine: Optional[Callable] = None
+    spec: StepSpec = DEFAULT_SPEC
+
+    def run(self, image, params: dict, state=None):
+        """Call the step's preprocess with its declared signature."""
+        return self.spec.call(self.preprocess, image, params, state)
+
+
+def _import(module_path: str):
+    try:
+        return importlib.import_module(module_path)
+    except ImportError as e:
+        raise ImportError(f"Module {module_path} could not be imported: {e}") from e
+
+
+def _resolve(module, attr: str) -> Callable:
+    func = getattr(module, attr, None)
+    if not callable(func):
+        raise ImportError(f"Module {module.__name__} does not define {attr}()")
+    return func
+
+
+def _resolve_optional(module, attr: str) -> Optional[Callable]:
+    func = getattr(module, attr, None)
+    return func if callable(func) else None
+
+
+def _check_layouts(steps) -> None:
+    """Warn about steps whose declared input layout cannot take what the previous steps produce."""
+    channels = 3  # cv2.imread decodes to BGR
+    for step in steps:
+        spec = step.spec
+        if channels is not None and spec.channels is not None and channels not in spec.channels:
+            logging.warning(f"Step '{step.name}' accepts {spec.channels}-channel images "
+                            f"but receives {channels}-channel images.")
+        if spec.output_channels is not None:
+            channels = spec.output_channels
+        elif spec.channels is None:
+            channels = None
+
+
+class PipelinePlan:
+    """
+    An ordered, pre-resolved list of enabled pipeline steps.
+
+    With ``fuse_pointwise`` (config key, default true), runs of consecutive pointwise
+    steps are executed as one lookup-table pass. With ``fuse_geometric`` (default false),
+    runs of consecutive geometric steps (deskew, crop, resize) are applied as one warp (see
+    geometry.py); unlike the lookup tables this changes the interpolation, so it is opt-in.
+    ``record_timing`` and ``trace_memory`` come from the ``metrics`` config section (see
+    metrics.py), and ``tiler`` (None unless ``tiling.enabled``) runs neighborhood steps on
+    large images tile by tile (see tiling.py).
+    ``pack_binary`` (``binary.packed`` in the config) carries binary images bit-packed
+    between stages (see packed.py). ``output`` is the format images are written in, from the
+    ``output`` section and ``binary.bilevel_output`` (see writer.py). ``decoder`` reads the
+    input images no larger than the leading steps need (see decode.py); by default it reads
+    them like ``cv2.imread``.
+    """
+
+    def __init__(self, steps, fuse_pointwise: bool = True, record_timing: bool = False, trace_memory: bool = False,
+                 tiler: Optional[TiledExecutor] = None, pack_binary: bool = False,
+                 output: Optional[OutputFormat] = None, fuse_geometric: bool = False,
+                 decoder: Optional[ImageDecoder] = None):
+        self.steps = tuple(steps)
+        self.fuse_pointwise = fuse_pointwise
+        self.fuse_geometric = fuse_geometric
+        self.record_timing = record_timing
+        self.trace_memory = trace_memory
+        self.tiler = tiler
+        self.pack_binary = pack_binary
+        self.output = output if output is not None else OutputFormat()
+        self.decoder = decoder if decoder is not None else ImageDecoder(self.steps)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "PipelinePlan":
+        """
+        Build a plan from the ``steps`` section of a pipeline config.
+
+        Raises:
+            ValueError: If a step has no name.
+            ImportError: If a step or validation module is missing or lacks preprocess()/validate().
+        """
+        plan_steps = []
+        for step in config.get("steps", []) or []:
+            name = step.get("name")
+            if not name:
+                raise ValueError(f"Pipeline step without a name: {step}")
+            if not step.get("enabled", True):
+                logging.info(f"Skipping step {name}")
+                continue
+            script = _import(f"{SCRIPTS_PACKAGE}.{name}")
+            validation = _import(f"{VALIDATION_PACKAGE}.{name}_validation")
+            plan_steps.append(PlanStep(
+                name=name,
+                params=dict(step.get("params") or {}),
+                preprocess=_resolve(script, "preprocess"),
+                validate=_resolve(validation, "validate"),
+                lookup_table=_resolve_optional(script, "lookup_table"),
+                validate_histogram=_resolve_optional(validation, "validate_histogram"),
+                output_state=_resolve_optional(script, "output_state"),
+                tile_params=_resolve_optional(script, "tile_params"),
+                affine=_resolve_optional(script, "affine"),
+                spec=spec_of(script),
+            ))
+        logging.info(f"Pipeline plan: {[s.name for s in plan_steps]}")
+        _check_layouts(plan_steps)
+        metrics_cfg = config.get("metrics") or {}
+        binary_cfg = config.get("binary") or {}
+        return cls(plan_steps, fuse_pointwise=config.get("fuse_pointwise", True),
+                   record_timing=bool(metrics_cfg.get("enabled", False)),
+                   trace_memory=bool(metrics_cfg.get("enabled", False) and metrics_cfg.get("tracemalloc", False)),
+                   tiler=TiledExecutor.from_config(config),
+                   pack_binary=bool(binary_cfg.get("packed", False)),
+                   output=OutputFormat.from_config(config),
+                   fuse_geometric=bool(config.get("fuse_geometric", False)),
+                   decoder=ImageDecoder.from_config(config, plan_steps))
+
+    def fingerprint(self) -> str:
+        """
+        Stable hash of the normalized step list (enabled step names and params, in order) and
+        of the plan settings that change the output. The settings are only included when set,
+        so the fingerprint of a plan without them stays what it was.
+        """
+        normalized = [[step.name, step.params] for step in self.steps]
+        settings = {}
+        if self.fuse_geometric:
+            settings["fuse_geometric"] = True
+        if self.decoder.grayscale or self.decoder.reduce:
+            settings["decode"] = {"grayscale": self.decoder.grayscale, "reduced": self.decoder.reduce}
+        if settings:
+            normalized.append(settings)
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+    def stages(self, fuse: bool = True) -> list:
+        """
+        Group the steps into execution stages (tuples of steps).
+
+        A stage of several steps is a run of pointwise steps to apply as one lookup table, or
+        a run of geometric steps to apply as one warp; without fusion every stage is a single step.
+        """
+        if fuse and self.fuse_pointwise:
+            stages = group_pointwise(self.steps)
+        else:
+            stages = [(step,) for step in self.steps]
+        if fuse and self.fuse_geometric:
+            stages = group_geometric(stages)
+        return stages
+
+    @property
+    def names(self) -> list:
+        return [step.name for step in self.steps]
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
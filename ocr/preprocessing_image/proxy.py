@@ -0,0 +1,79 @@
+"""
+Analysis on a downsampled proxy of the image.
+
+Some steps only make a decision from the image (deskew's skew angle, a crop box, a noise
+level) and then apply one geometric or parametric action at full resolution. The decision
+rarely needs every pixel: it can be made on a level of the image's Gaussian pyramid
+(level 1 is 1/2 scale, level 2 is 1/4 scale, ...), which has 4**level times fewer pixels.
+
+Steps opt in with two params:
+
+* ``proxy_level`` (int, default 0 = full resolution): pyramid level to analyse. The level
+  is lowered for small images so the proxy keeps at least ``MIN_PROXY_SIDE`` pixels per side.
+* ``verify_proxy`` (bool, default false): also analyse at full resolution and compare. The
+  difference is recorded in ``params["proxy_error"]``; a proxy result further than the
+  step's stated tolerance from the full-resolution one is replaced by it.
+
+Pyramid levels are built from the gray image with ``cv2.pyrDown``, each from the one
+above, and cached in the pipeline's ImageState, so several analysis steps on the same
+image build the pyramid once.
+"""
+
+import logging
+from typing import Callable, Optional
+
+import numpy as np
+
+from preprocessing_image.state import ImageState, to_gray
+
+MIN_PROXY_SIDE = 64
+
+
+def effective_level(shape: tuple, level: int) -> int:
+    """``level`` lowered until the proxy of an image of ``shape`` keeps ``MIN_PROXY_SIDE`` pixels per side."""
+    level = max(0, int(level))
+    side = min(shape[:2])
+    while level > 0 and side >> level < MIN_PROXY_SIDE:
+        level -= 1
+    return level
+
+
+def pyramid_level(image: np.ndarray, level: int, state: Optional[ImageState] = None) -> np.ndarray:
+    """Gray ``image`` at pyramid ``level``, through the state's cache when a state is given."""
+    return (state or ImageState.of(image)).pyramid(image, level)
+
+
+def analyze(analysis: Callable, image: np.ndarray, params: dict, state: Optional[ImageState] = None,
+            tolerance: float = 0.0, difference: Callable = lambda a, b: abs(a - b)):
+    """
+    Run ``analysis(gray, state)`` on the pyramid level requested by ``params``.
+
+    ``analysis`` must return a value that does not depend on the scale it was computed at
+    (an angle, a fraction of the image size, a noise level in gray levels). It receives the
+    state only at full resolution, where the state's facts (e.g. ``binary``) hold.
+
+    Args:
+        analysis: The decision to make, called with a gray image and an ImageState or None.
+        image (np.ndarray): The full-resolution image (gray or BGR).
+        params (dict): The step's params; ``proxy_level`` and ``verify_proxy`` are read,
+            ``proxy_error`` is written when verifying.
+        state (ImageState, optional): The pipeline's state for the image.
+        tolerance: Largest accepted ``difference`` between proxy and full-resolution results.
+        difference: Distance between two results.
+
+    Returns:
+        The analysis result.
+    """
+    level = effective_level(image.shape, params.get("proxy_level", 0))
+    if level == 0:
+        return analysis(to_gray(image, state), state)
+    result = analysis(pyramid_level(image, level, state), None)
+    if params.get("verify_proxy", False):
+        full = analysis(to_gray(image, state), state)
+        error = float(difference(result, full))
+        params["proxy_error"] = error
+        if error > tolerance:
+            logging.warning(f"Proxy analysis at level {level} is {error:.3f} off the full-resolution result "
+                            f"(tolerance {tolerance}); using the full-resolution result.")
+            return full
+    return result
@@ -0,0 +1,88 @@
+"""
+Step registry: what each preprocessing step declares about itself.
+
+Every script in ``preprocessing_image.scripts`` describes itself with a module-level
+``SPEC = StepSpec(...)``: how it is called, what kind of operation it is, the image
+layouts it accepts and produces, and whether it may write its output into its input.
+The runner reads these declarations instead of guessing, which is what makes it safe
+to fuse, tile, reorder or run steps in place. A script without a SPEC is treated as
+an opaque whole-image step.
+"""
+
+import pkgutil
+import importlib
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple, Union
+
+SCRIPTS_PACKAGE = "preprocessing_image.scripts"
+
+# Call signatures
+PARAMS = "params"   # preprocess(image, params)
+KWARGS = "kwargs"   # preprocess(image, **params)
+
+# Operation kinds
+POINTWISE = "pointwise"        # each output pixel depends only on the same input pixel
+NEIGHBORHOOD = "neighborhood"  # each output pixel depends on input pixels within ``radius``
+GEOMETRIC = "geometric"        # moves pixels (rotate, resize, crop); output shape may change
+GLOBAL = "global"              # depends on whole-image statistics or connectivity
+
+
+@dataclass(frozen=True)
+class StepSpec:
+    """
+    Declared metadata of a preprocessing step.
+
+    ``kind`` and ``radius`` may be callables of the step's params when they depend on them
+    (e.g. a fixed threshold is pointwise, Otsu is global). ``radius`` is an upper bound in
+    pixels. ``dtypes`` and ``channels`` list the accepted input layouts (None: anything);
+    ``output_dtype`` and ``output_channels`` are None when the output keeps the input's.
+    ``accepts_state`` marks scripts taking the pipeline's ImageState as a ``state=`` keyword.
+    """
+    signature: str = PARAMS
+    kind: Union[str, Callable[[dict], str]] = GLOBAL
+    radius: Union[int, Callable[[dict], int]] = 0
+    dtypes: Optional[Tuple[str, ...]] = None
+    channels: Optional[Tuple[int, ...]] = None
+    output_dtype: Optional[str] = None
+    output_channels: Optional[int] = None
+    in_place: bool = False
+    accepts_state: bool = False
+
+    def kind_for(self, params: dict) -> str:
+        return self.kind(params) if callable(self.kind) else self.kind
+
+    def radius_for(self, params: dict) -> int:
+        return self.radius(params) if callable(self.radius) else self.radius
+
+    def call(self, preprocess: Callable, image, params: dict, state=None):
+        """Run ``preprocess`` with this step's calling convention."""
+        if self.signature == KWARGS:
+            return preprocess(image, **params)
+        if state is not None and self.accepts_state:
+            return preprocess(image, params, state=state)
+        return preprocess(image, params)
+
+
+DEFAULT_SPEC = StepSpec()
+
+
+def odd_ksize(ksize: int) -> int:
+    """Kernel size as the scripts use it: even sizes are bumped to the next odd one."""
+    return ksize + 1 if ksize % 2 == 0 else ksize
+
+
+def spec_of(module) -> StepSpec:
+    """The SPEC a script module declares, or the opaque default."""
+    spec = getattr(module, "SPEC", None)
+    return spec if isinstance(spec, StepSpec) else DEFAULT_SPEC
+
+
+def available_steps() -> dict:
+    """Every script in the scripts package with its declared spec, by step name."""
+    package = importlib.import_module(SCRIPTS_PACKAGE)
+    steps = {}
+    for info in pkgutil.iter_modules(package.__path__):
+        module = importlib.import_module(f"{SCRIPTS_PACKAGE}.{info.name}")
+        if callable(getattr(module, "preprocess", None)):
+            steps[info.name] = spec_of(module)
+    return dict(sorted(steps.items()))
@@ -1,16 +1,57 @@
 import argparse
 import logging
-from utils import load_config
-from pipeline import run_pipeline
+from preprocessing_image.utils import load_config
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.sweep import run_sweep
 
 def main():
     parser = argparse.ArgumentParser(description="Run OCR preprocessing pipeline on a folder of images.")
     parser.add_argument("image_dir", help="Path to input image directory containing JPEG files.")
     parser.add_argument("--config", dest="config_path", default="preprocessing/configs/base.yaml",
                         help="Path to YAML configuration file.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes to spread images across (overrides 'workers' in the config).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep a run journal and skip images already processed with the same content and config.")
+    parser.add_argument("--sweep", dest="sweep_path", default=None,
+                        help="Path to a sweep spec YAML: run every config in it, sharing common step prefixes.")
+    parser.add_argument("--results", choices=["yaml", "jsonl", "sqlite"], default=None,
+                        help="Result sink: result.yaml at the end, or a JSONL/SQLite file written as images finish.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and process new images as they arrive in image_dir "
+                             "(implies --resume; yaml results become JSONL so they can be read while it runs).")
+    parser.add_argument("--watch-interval", type=float, default=None,
+                        help="Seconds between scans for new images in watch mode.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--recursive", action="store_true",
+                        help="Walk subdirectories of image_dir as well as its top level.")
+    source.add_argument("--manifest", default=None,
+                        help="Process the images listed in this file (one path per line, relative to image_dir).")
+    source.add_argument("--glob", dest="pattern", default=None,
+                        help="Process the images under image_dir matching this glob pattern ('**' recurses).")
     args = parser.parse_args()
     # Load configuration
     config = load_config(args.config_path)
+    if args.workers is not None:
+        config["workers"] = args.workers
+    if args.resume:
+        config["journal"] = dict(config.get("journal") or {}, enabled=True)
+    if args.watch:
+        config["watch"] = dict(config.get("watch") or {}, enabled=True)
+        if args.watch_interval is not None:
+            config["watch"]["interval"] = args.watch_interval
+        # A restarted watch skips what it already processed, and results are readable while it runs
+        config["journal"] = dict(config.get("journal") or {}, enabled=True)
+        if not args.results and (config.get("results") or {}).get("sink", "yaml") == "yaml":
+            config["results"] = dict(config.get("results") or {}, sink="jsonl")
+    if args.results:
+        config["results"] = dict(config.get("results") or {}, sink=args.results)
+    if args.recursive:
+        config["source"] = {"type": "directory", "recursive": True}
+    elif args.manifest:
+        config["source"] = {"type": "manifest", "manifest": args.manifest}
+    elif args.pattern:
+        config["source"] = {"type": "glob", "pattern": args.pattern}
     # Configure logging (console and file)
     log_level = config.get('logging', {}).get('level', 'INFO').upper()
     log_file = config.get('logging', {}).get('file', 'pipeline.log')
@@ -19,7 +60,10 @@ def main():
                         handlers=[logging.FileHandler(log_file), logging.StreamHandler()])
     logging.info("Starting OCR preprocessing pipeline...")
     # Run pipeline
-    run_pipeline(args.image_dir, config)
+    if args.sweep_path:
+        run_sweep(args.image_dir, config, load_config(args.sweep_path))
+    else:
+        run_pipeline(args.image_dir, config)
 
 if __name__ == "__main__":
     main()
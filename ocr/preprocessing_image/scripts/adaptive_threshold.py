@@ -1,20 +1,117 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.state import to_gray
+from preprocessing_image.registry import GLOBAL, NEIGHBORHOOD, StepSpec, odd_ksize
 
-def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
+# Wolf's threshold uses the image's minimum and largest local deviation, so it is not a neighborhood operation
+SPEC = StepSpec(kind=lambda p: GLOBAL if p.get("method", "gaussian").lower() == "wolf" else NEIGHBORHOOD,
+                radius=lambda p: odd_ksize(p.get("block_size", 11)) // 2,
+                dtypes=("uint8",), channels=(1, 3), output_channels=1, accepts_state=True)
+
+# Default 'k' per integral-image method
+DEFAULT_K = {"niblack": -0.2, "sauvola": 0.2, "wolf": 0.5, "bradley": 0.15}
+# Rows of the image whose window statistics are computed at once, bounding the float temporaries
+STATS_ROWS = 256
+
+
+def output_state(state, params: dict) -> dict:
+    """Adaptive thresholding always produces a 0/255 image with the input's polarity."""
+    return {"binary": True, "polarity": state.polarity}
+
+
+def window_stats(gray: np.ndarray, block_size: int):
+    """
+    Yield ``(rows, mean, std)`` of the ``block_size`` window around every pixel, a band of rows at a time.
+
+    Sums come from the integral images of the pixels and their squares, so the cost per pixel does
+    not depend on the window size. Windows are clipped at the image border by clamping their corner
+    indices into the integrals. The pixel integral is int32: on large scans its totals wrap around,
+    but a window's sum is a difference of four of them and fits in 31 bits, so it comes out exact
+    (windows too large for that use float64). The squares' integral is float64, in which the sums
+    of squared 8-bit pixels are exact integers. Either way the statistics of a pixel do not depend
+    on how much of the image around it was passed in.
+    """
+    h, w = gray.shape
+    r = block_size // 2
+    d = 2 * r + 1
+    sdepth = cv2.CV_32S if d * d * 255 < 2 ** 31 else cv2.CV_64F
+    sums, squares = cv2.integral2(gray, sdepth=sdepth, sqdepth=cv2.CV_64F)
+    # Window corners in integral coordinates, clamped to the image
+    top = np.clip(np.arange(h) - r, 0, h)
+    bottom = np.clip(np.arange(h) + r + 1, 0, h)
+    left = np.clip(np.arange(w) - r, 0, w)
+    right = np.clip(np.arange(w) + r + 1, 0, w)
+    widths = (right - left).astype(np.float64)
+    for start in range(0, h, STATS_ROWS):
+        stop = min(start + STATS_ROWS, h)
+        count = (bottom[start:stop] - top[start:stop]).astype(np.float64)[:, None] * widths
+
+        def window_sum(integral):
+            # Column sums over each window's rows, then the difference across its columns (in the
+            # integral's type, so wrapped int32 totals cancel out)
+            columns = integral[bottom[start:stop]] - integral[top[start:stop]]
+            total = np.take(columns, right, axis=1) - np.take(columns, left, axis=1)
+            return total.astype(np.float64, copy=False)
+
+        mean = window_sum(sums)
+        mean /= count
+        var = window_sum(squares)
+        var /= count
+        var -= mean * mean
+        yield slice(start, stop), mean, np.sqrt(np.maximum(var, 0, out=var), out=var)
+
+
+def integral_threshold(gray: np.ndarray, method: str, block_size: int, k: float, R: float = 128.0) -> np.ndarray:
+    """
+    Binarize with a local threshold T from the window mean m and standard deviation s:
+
+    * niblack: T = m + k * s
+    * sauvola: T = m * (1 + k * (s / R - 1))
+    * wolf:    T = m - k * (1 - s / max(s)) * (m - min(gray))
+    * bradley: T = m * (1 - k)
+
+    Pixels above T become 255, the rest 0 (as with cv2.adaptiveThreshold).
+    """
+    binary = np.empty(gray.shape, dtype=np.uint8)
+    if method == "wolf":
+        min_gray = float(gray.min())
+        # Wolf needs the largest deviation of the whole image before any threshold
+        max_std = max(float(std.max()) for _, _, std in window_stats(gray, block_size)) or 1.0
+    for rows, mean, std in window_stats(gray, block_size):
+        if method == "niblack":
+            threshold = mean + k * std
+        elif method == "sauvola":
+            threshold = mean * (1 + k * (std / R - 1))
+        elif method == "wolf":
+            threshold = mean - k * (1 - std / max_std) * (mean - min_gray)
+        else:
+            threshold = mean * (1 - k)
+        np.multiply(gray[rows] > threshold, 255, out=binary[rows], casting="unsafe")
+    return binary
+
+
+def preprocess(image: np.ndarray, params: dict, state=None) -> np.ndarray:
     """
     Binarize the image using adaptive thresholding.
 
     This function applies **adaptive thresholding** to the input image, which dynamically determines a threshold for each pixel based on its neighborhood. 
-    It is particularly useful for images with varying lighting conditions. The thresholding method can be either **mean** or **Gaussian**.
+    It is particularly useful for images with varying lighting conditions. The thresholding method can be **mean** or **Gaussian**
+    (OpenCV, threshold = weighted window mean - C), or one of the local-statistics methods **sauvola**, **niblack**, **wolf** and
+    **bradley**, which cope much better with stains, faded ink and uneven backgrounds. Those are computed from integral images,
+    so their cost does not grow with the block size and very large windows are affordable.
 
     Args:
         image (np.ndarray): The input image to be binarized. It can be grayscale or color. If the image is in color, it will be converted to grayscale.
         params (dict): A dictionary containing configuration parameters for the adaptive thresholding process:
-            - 'method' (str): The thresholding method to use. Can be "mean" or "gaussian" (default is "gaussian").
+            - 'method' (str): The thresholding method to use. Can be "mean", "gaussian", "sauvola", "niblack", "wolf"
+              or "bradley" (default is "gaussian").
             - 'block_size' (int): The size of the neighborhood around each pixel to calculate the threshold (default is 11).
-            - 'C' (int): A constant subtracted from the calculated threshold (default is 2).
+            - 'C' (int): A constant subtracted from the calculated threshold, for "mean" and "gaussian" (default is 2).
+            - 'k' (float): Weight of the local deviation for "niblack" (default -0.2), "sauvola" (default 0.2) and "wolf"
+              (default 0.5); for "bradley", the fraction below the local mean a pixel must be to be black (default 0.15).
+            - 'R' (float): Dynamic range of the standard deviation for "sauvola" (default is 128).
+        state (ImageState, optional): The pipeline's state for the image; its cached gray conversion is reused.
 
     Returns:
         np.ndarray: The binarized image, where pixel values are either 0 (black) or 255 (white).
@@ -33,10 +130,8 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         if image.size == 0:
             raise ValueError("Input image is empty.")
 
-        gray = image
         # Ensure grayscale input
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = to_gray(image, state)
 
         # Get the thresholding method and parameters
         method = params.get("method", "gaussian").lower()
@@ -47,6 +142,12 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         if block_size % 2 == 0:
             block_size += 1  # block_size must be odd
 
+        if method in DEFAULT_K:
+            k = float(params.get("k", DEFAULT_K[method]))
+            binary = integral_threshold(gray, method, block_size, k, float(params.get("R", 128.0)))
+            logging.info(f"Applied adaptive thresholding (method={method}, block_size={block_size}, k={k}).")
+            return binary
+
         # Choose the adaptive thresholding method
         if method == "mean":
             thresh_method = cv2.ADAPTIVE_THRESH_MEAN_C
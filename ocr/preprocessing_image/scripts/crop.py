@@ -1,38 +1,110 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.proxy import analyze
+from preprocessing_image.registry import GEOMETRIC, StepSpec
 
 """
-Crop image to the specified rectangle.
+Crop image to the specified rectangle, or to the page content.
 
 This is used in OCR preprocessing to isolate text regions.
 If crop parameters are missing, it will attempt to crop the full image.
 Invalid crop dimensions will raise errors.
+
+In "auto" mode the content's bounding box is found from the row and column profiles of
+a binarized, reduced copy of the image (see proxy.py), after stripping the dark bars a
+scanner leaves along the page edges. Placed early in the pipeline, it removes blank
+margins before the expensive steps run on them.
 """
 
-import numpy as np
+SPEC = StepSpec(kind=GEOMETRIC, accepts_state=True)
+
+# Largest accepted difference (fraction of the image side) between the box found on a proxy and at full resolution
+PROXY_BOX_TOLERANCE = 0.01
 
 
-def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
+def _trim(profile: np.ndarray, limit: float, start: int, stop: int) -> tuple:
     """
-    Crop the input image based on given parameters.
+    Shrink ``[start, stop)`` past the entries of ``profile`` above ``limit`` at either end, and one
+    entry further where any were stripped: the border's blurred edge belongs to it.
+    """
+    begin, end = start, stop
+    while start < stop and profile[start] > limit:
+        start += 1
+    while stop > start and profile[stop - 1] > limit:
+        stop -= 1
+    return min(start + (start > begin), stop), max(stop - (stop < end), start)
 
-    Parameters:
-        image (np.ndarray): The input image (grayscale or RGB).
-        params (dict): Dictionary with keys 'x', 'y', 'width', 'height'
+
+def content_box(gray: np.ndarray, bg_threshold="otsu", min_fill: float = 0.002, edge_fill: float = 0.9):
+    """
+    Bounding box of the content of a page, as fractions ``(left, top, right, bottom)`` of its size.
+
+    Pixels on the other side of ``bg_threshold`` (a gray level, or "otsu") than the median pixel
+    are content, so both dark-on-light and inverted pages work. Rows and columns touching the image
+    edge whose content fill exceeds ``edge_fill`` are scanner borders and are stripped first. The box
+    then spans the rows and columns whose fill exceeds ``min_fill``.
 
     Returns:
-        np.ndarray: Cropped image region.
+        tuple or None: The box, or None when no content was found.
     """
+    if bg_threshold == "otsu":
+        level = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[0] + 1
+    else:
+        level = float(bg_threshold)
+    light = gray >= level
+    content = ~light if np.median(gray) >= level else light
 
-    if not isinstance(image, np.ndarray) or image.size == 0:
-        raise ValueError("Invalid or empty image provided.")
+    h, w = gray.shape
+    top, bottom, left, right = 0, h, 0, w
+    while top < bottom and left < right:
+        region = content[top:bottom, left:right]
+        new_top, new_bottom = _trim(region.mean(axis=1), edge_fill, 0, bottom - top)
+        new_left, new_right = _trim(region.mean(axis=0), edge_fill, 0, right - left)
+        if (new_top, new_bottom, new_left, new_right) == (0, bottom - top, 0, right - left):
+            break
+        top, bottom, left, right = top + new_top, top + new_bottom, left + new_left, left + new_right
+
+    region = content[top:bottom, left:right]
+    if region.size == 0:
+        return None
+    rows = np.flatnonzero(region.mean(axis=1) > min_fill)
+    cols = np.flatnonzero(region.mean(axis=0) > min_fill)
+    if rows.size == 0 or cols.size == 0:
+        return None
+    return ((left + cols[0]) / w, (top + rows[0]) / h, (left + cols[-1] + 1) / w, (top + rows[-1] + 1) / h)
+
+
+def _box_difference(a, b) -> float:
+    if a is None or b is None:
+        return 0.0 if a is b else 1.0
+    return max(abs(p - q) for p, q in zip(a, b))
 
+
+def auto_crop_rect(image: np.ndarray, params: dict, state=None) -> tuple:
+    """Full-resolution ``(x, y, width, height)`` of the content box plus ``padding``, or the whole image."""
+    height, width = image.shape[:2]
+    box = analyze(lambda gray, gray_state: content_box(gray, params.get("bg_threshold", "otsu"),
+                                                       params.get("min_fill", 0.002), params.get("edge_fill", 0.9)),
+                  image, params, state, tolerance=PROXY_BOX_TOLERANCE, difference=_box_difference)
+    if box is None:
+        logging.warning("Auto crop found no content; keeping the whole image.")
+        return 0, 0, width, height
+    padding = int(params.get("padding", 10))
+    x0 = max(int(np.floor(box[0] * width)) - padding, 0)
+    y0 = max(int(np.floor(box[1] * height)) - padding, 0)
+    x1 = min(int(np.ceil(box[2] * width)) + padding, width)
+    y1 = min(int(np.ceil(box[3] * height)) + padding, height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def manual_rect(shape: tuple, params: dict) -> tuple:
+    """``(x, y, width, height)`` from the 'x', 'y', 'width' and 'height' params, clipped to the image."""
     try:
         x = int(params.get("x", 0))
         y = int(params.get("y", 0))
-        width = int(params.get("width", image.shape[1] - x))
-        height = int(params.get("height", image.shape[0] - y))
+        width = int(params.get("width", shape[1] - x))
+        height = int(params.get("height", shape[0] - y))
     except (TypeError, ValueError):
         raise ValueError("Crop parameters must be convertible to int.")
 
@@ -41,8 +113,65 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     if width <= 0 or height <= 0:
         raise ValueError("Crop size must be positive.")
 
-    max_h, max_w = image.shape[:2]
+    max_h, max_w = shape[:2]
     x_end = min(x + width, max_w)
     y_end = min(y + height, max_h)
+    return x, y, max(x_end - x, 0), max(y_end - y, 0)
+
+
+def crop_rect(shape: tuple, params: dict, image=None, state=None):
+    """
+    The ``(x, y, width, height)`` to crop an image of ``shape`` to, recorded in ``params``.
+
+    Auto mode needs the image's pixels: without ``image`` it returns None.
+    """
+    if params.get("mode", "manual") == "auto":
+        if image is None:
+            return None
+        x, y, width, height = auto_crop_rect(image, params, state)
+        params["crop_rect"] = [x, y, width, height]
+        params["removed_percent"] = 100.0 * (1 - width * height / (shape[0] * shape[1]))
+        logging.info(f"Auto crop to x={x}, y={y}, width={width}, height={height} "
+                     f"({params['removed_percent']:.1f}% removed).")
+    else:
+        x, y, width, height = manual_rect(shape, params)
+        params["removed_percent"] = 100.0 * (1 - width * height / (shape[0] * shape[1]))
+    return x, y, width, height
+
+
+def affine(shape: tuple, params: dict, image=None, state=None):
+    """The crop as a map of pixel coordinates (see geometry.py); None when it needs the pixels or is empty."""
+    rect = crop_rect(shape, params, image, state)
+    if rect is None or rect[2] == 0 or rect[3] == 0:
+        return None
+    x, y, width, height = rect
+    return np.float64([[1, 0, -x], [0, 1, -y]]), (width, height)
+
+
+def preprocess(image: np.ndarray, params: dict, state=None) -> np.ndarray:
+    """
+    Crop the input image based on given parameters.
+
+    Parameters:
+        image (np.ndarray): The input image (grayscale or RGB).
+        params (dict): Dictionary with keys 'x', 'y', 'width', 'height', or with 'mode' "auto" and:
+            - 'bg_threshold' (int or "otsu"): Gray level separating background from content (default "otsu").
+            - 'padding' (int): Pixels kept around the content box (default 10).
+            - 'min_fill' (float): Fraction of a row or column that must be content for it to count (default 0.002).
+            - 'edge_fill' (float): Rows and columns at the image edge fuller than this are scanner borders
+              and are cropped away (default 0.9; 1 disables).
+            - 'proxy_level', 'verify_proxy': Find the box on a pyramid level (see proxy.py) (default 0).
+        state (ImageState, optional): The pipeline's state for the image; its gray conversion and pyramid are reused.
+
+    The percentage of the area removed is recorded in params["removed_percent"] and the
+    rectangle in params["crop_rect"].
+
+    Returns:
+        np.ndarray: Cropped image region.
+    """
+
+    if not isinstance(image, np.ndarray) or image.size == 0:
+        raise ValueError("Invalid or empty image provided.")
 
-    return image[y:y_end, x:x_end]
+    x, y, width, height = crop_rect(image.shape, params, image, state)
+    return image[y:y + height, x:x + width]
@@ -1,8 +1,164 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.proxy import analyze
+from preprocessing_image.state import is_binary
+from preprocessing_image.registry import GEOMETRIC, StepSpec
 
-def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
+SPEC = StepSpec(kind=GEOMETRIC, dtypes=("uint8",), channels=(1, 3), accepts_state=True)
+
+# Largest accepted difference (degrees) between the angle found on a pyramid proxy and at full resolution
+PROXY_ANGLE_TOLERANCE = 0.5
+
+DEFAULT_MAX_ANGLE = 45.0
+# Projection search: candidate angle steps (degrees), each pass searching +/- one step of the previous best
+PROJECTION_STEPS = (1.0, 0.1)
+# Projection search: width (px) of the vertical strips whose row profiles are shifted per candidate angle
+PROJECTION_STRIP = 8
+# Hough estimator: number of strongest lines whose median angle is taken
+HOUGH_LINES = 10
+# Hough estimator: deepest pyramid level it is run on; characters merge at 1/4 scale and below
+HOUGH_MAX_PROXY_LEVEL = 1
+
+
+def foreground(gray: np.ndarray, state=None) -> np.ndarray:
+    """Binary image with the dark (text) pixels of a gray image at 255, Otsu-thresholded unless already binary."""
+    if is_binary(gray, state):
+        return cv2.bitwise_not(gray)
+    _, inv = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return inv
+
+
+def min_area_rect_angle(fg: np.ndarray, max_angle: float = DEFAULT_MAX_ANGLE) -> float:
+    """Angle of the minimum area rectangle around all foreground pixels (``max_angle`` is not used)."""
+    points = cv2.findNonZero(fg)
+    if points is None:
+        return 0.0
+    # int32 (row, col) points, as the rectangle angle convention below expects
+    angle = cv2.minAreaRect(np.ascontiguousarray(points[:, 0, ::-1]))[-1]
+
+    if angle < -45:
+        angle = -(90 + angle)
+    else:
+        angle = -angle
+
+    # Handle rare case where it detects 90 degree rotation for straight line
+    if abs(angle) == 90:
+        angle = 0.0
+    return angle
+
+
+def projection_angle(fg: np.ndarray, max_angle: float = DEFAULT_MAX_ANGLE) -> float:
+    """
+    Angle in [-max_angle, max_angle] at which the row projection profile of the foreground is sharpest.
+
+    The image is cut into vertical strips whose row profiles are computed once; a candidate
+    angle shifts each strip's profile by the text-line slope at the strip's centre instead of
+    rotating the image. The search is coarse to fine over ``PROJECTION_STEPS``.
+    """
+    h, w = fg.shape
+    if cv2.countNonZero(fg) == 0:
+        return 0.0
+    edges = np.arange(0, w, PROJECTION_STRIP)
+    centers = (edges + np.minimum(edges + PROJECTION_STRIP, w)) / 2.0 - w / 2.0
+    margin = int(np.ceil(np.tan(np.radians(min(max_angle, 89.0))) * w / 2)) + 1
+    profiles = np.zeros((len(edges), h + 2 * margin))
+    profiles[:, margin:margin + h] = np.add.reduceat(fg, edges, axis=1, dtype=np.int32).T
+    strips = np.arange(len(edges))[:, None]
+    rows = np.arange(h)[None, :] + margin
+
+    def sharpness(angle: float) -> float:
+        shifts = np.rint(np.tan(np.radians(angle)) * centers).astype(np.intp)
+        profile = profiles[strips, rows + shifts[:, None]].sum(axis=0)
+        steps = np.diff(profile)
+        return float(np.dot(steps, steps))
+
+    best, low, high = 0.0, -max_angle, max_angle
+    for step in PROJECTION_STEPS:
+        candidates = np.arange(low, high + step / 2, step)
+        best = float(candidates[int(np.argmax([sharpness(a) for a in candidates]))])
+        low, high = best - step, best + step
+    return best
+
+
+def hough_angle(fg: np.ndarray, max_angle: float = DEFAULT_MAX_ANGLE) -> float:
+    """
+    Median angle of the strongest Hough lines through the centroids of the foreground's connected components.
+
+    Centroids of characters (or words, on a reduced image) lie along the text lines; blobs
+    taller than 1/8 of the image (rules, photos) are ignored.
+    """
+    h, w = fg.shape
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(fg, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    keep = (stats[1:, cv2.CC_STAT_AREA] >= 2) & (heights < h / 8)
+    if np.count_nonzero(keep) < 3:
+        return 0.0
+    points = np.rint(centroids[1:][keep]).astype(np.intp)
+    canvas = np.zeros((h, w), dtype=np.uint8)
+    canvas[points[:, 1], points[:, 0]] = 255
+    # Distance resolution follows the text size, so centroids of one line fall into one bin
+    rho = max(1.0, float(np.median(heights[keep])) / 3)
+    lines = cv2.HoughLines(canvas, rho, np.pi / 1800, 3, None, 0, 0,
+                           np.radians(90 - max_angle), np.radians(90 + max_angle))
+    if lines is None:
+        return 0.0
+    return float(np.median(np.degrees(lines[:HOUGH_LINES, 0, 1]) - 90))
+
+
+ESTIMATORS = {
+    "minarearect": min_area_rect_angle,
+    "projection": projection_angle,
+    "hough": hough_angle,
+}
+
+
+def skew_angle(gray: np.ndarray, state=None, method: str = "minarearect", max_angle: float = DEFAULT_MAX_ANGLE) -> float:
+    """Skew angle (degrees) of a gray image with the given estimator (see ESTIMATORS)."""
+    estimator = ESTIMATORS.get(method)
+    if estimator is None:
+        raise ValueError(f"Invalid deskew method: {method}. Use one of {sorted(ESTIMATORS)}.")
+    return estimator(foreground(gray, state), max_angle)
+
+
+def angle_difference(a: float, b: float) -> float:
+    """Distance between two rectangle angles, which are only defined modulo 90 degrees."""
+    d = abs(a - b) % 90
+    return min(d, 90 - d)
+
+
+def rotation(image: np.ndarray, params: dict, state=None):
+    """
+    Detect the skew angle (recorded in params["detected_angle"]) and return the 2x3 matrix
+    rotating the image about its centre to correct it, or None when it is straight enough.
+    """
+    method = params.get("method", "minarearect").lower()
+    max_angle = float(params.get("max_angle", DEFAULT_MAX_ANGLE))
+    if method == "hough" and int(params.get("proxy_level", 0)) > HOUGH_MAX_PROXY_LEVEL:
+        params["proxy_level"] = HOUGH_MAX_PROXY_LEVEL
+    angle = analyze(lambda gray, gray_state: skew_angle(gray, gray_state, method, max_angle), image, params, state,
+                    tolerance=PROXY_ANGLE_TOLERANCE, difference=angle_difference)
+
+    params["detected_angle"] = angle  # Always set this before return
+
+    if abs(angle) < 5:
+        return None
+    (h, w) = image.shape[:2]
+    center = (w // 2, h // 2)
+    return cv2.getRotationMatrix2D(center, angle, 1.0)
+
+
+def affine(shape: tuple, params: dict, image=None, state=None):
+    """The deskew rotation as a map of pixel coordinates (see geometry.py); None without the image's pixels."""
+    if image is None:
+        return None
+    M = rotation(image, params, state)
+    if M is None:
+        M = np.float64([[1, 0, 0], [0, 1, 0]])
+    return M, (shape[1], shape[0])
+
+
+def preprocess(image: np.ndarray, params: dict, state=None) -> np.ndarray:
     """
     Perform skew detection and deskewing on the input image for OCR preprocessing.
 
@@ -19,55 +175,47 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     Process Details:
         - Converts the image to grayscale if it is in color (BGR).
         - Applies binarization (thresholding) if the image is not already binary.
-        - Detects the skew angle using the minimum area bounding rectangle of foreground pixels.
+        - Detects the skew angle with the selected estimator, optionally on a downsampled
+          pyramid level of the image (see proxy.py).
         - Rotates the image to correct the skew (deskewing).
         - Updates `params` with the detected skew angle for logging or debugging purposes.
         - If the detected angle is very small (less than 5 degrees), the rotation is skipped.
 
+    Estimators ('method'), measured on synthetic rotated text pages (see
+    performance/test_deskew_benchmarks.py):
+        - "minarearect": minimum area rectangle of all foreground pixels. Fastest and exact on a
+          clean single text block, but any stray mark, margin noise or second column pulls the
+          rectangle off the text lines.
+        - "projection": sharpest row projection profile, searched coarse to fine within +/- 'max_angle'.
+          Robust to noise and figures, within about 0.2 degree even at 1/4 scale, but 15-20x the
+          cost of "minarearect" at the same scale: use it with 'proxy_level' 2.
+        - "hough": Hough lines through connected-component centroids. Ignores large blobs such as
+          rules and photos, within about 0.5 degree at full or 1/2 scale and about twice the cost
+          of "minarearect"; unreliable at 1/4 scale and below, where characters merge, so its
+          'proxy_level' is capped at HOUGH_MAX_PROXY_LEVEL (1/2 scale).
+
     Parameters:
         image (np.ndarray): Input image as a NumPy array. Can be grayscale or color (BGR).
         params (dict): Dictionary to store processing parameters and results.
                       The key "detected_angle" will be updated with the skew angle (float).
+                      - 'method' (str): "minarearect", "projection" or "hough" (default "minarearect").
+                      - 'max_angle' (float): Largest skew searched by "projection" and "hough" (default 45).
+                      - 'proxy_level' (int): Pyramid level to detect the angle on; 2 = 1/4 scale (default 0, full).
+                      - 'verify_proxy' (bool): Also detect at full resolution, record the difference in
+                        "proxy_error" and use the full-resolution angle beyond PROXY_ANGLE_TOLERANCE (default False).
+        state (ImageState, optional): The pipeline's state for the image. Its cached gray conversion is
+                      reused, and a known-binary image skips the intermediate-value scan.
 
     Returns:
         np.ndarray: Deskewed (or original if no skew detected) image suitable for OCR.
     """
-    gray = image
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
-    vals = np.unique(gray)
-    bin_img = gray 
-    if not (len(vals) == 2 and 0 in vals and 255 in vals):
-        _, bin_img = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
-
-    inv = cv2.bitwise_not(bin_img)
-    coords = np.column_stack(np.where(inv > 0))
-
-    angle = 0.0
-    if coords.shape[0] > 0:
-        rect = cv2.minAreaRect(coords)
-        angle = rect[-1]
-
-        if angle < -45:
-            angle = -(90 + angle)
-        else:
-            angle = -angle
-
-        # Handle rare case where it detects 90 degree rotation for straight line
-        if abs(angle) == 90:
-            angle = 0.0
-
-    params["detected_angle"] = angle  # Always set this before return
-
-    if abs(angle) < 5:  # If image is already straight
+    M = rotation(image, params, state)
+    if M is None:  # If image is already straight
         logging.info("Image is already straight. Skipping deskew.")
         return image
 
     (h, w) = image.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
     rotated = cv2.warpAffine(image, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
 
-    logging.info(f"Detected skew angle: {angle:.2f} degrees. Image rotated to deskew.")
+    logging.info(f"Detected skew angle: {params['detected_angle']:.2f} degrees. Image rotated to deskew.")
     return rotated
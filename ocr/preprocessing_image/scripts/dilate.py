@@ -1,6 +1,27 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.morphology import for_target, structuring_element
+from preprocessing_image.registry import NEIGHBORHOOD, StepSpec, odd_ksize
+
+# Radius bound covers the kernel being raised to 5 for near-empty images
+SPEC = StepSpec(kind=NEIGHBORHOOD,
+                radius=lambda p: max(odd_ksize(p.get("ksize", 3)), 5) // 2 * p.get("iterations", 1),
+                dtypes=("uint8", "int16", "int32"), channels=(1, 3, 4), in_place=True)
+
+
+def output_state(state, params: dict) -> dict:
+    """Dilation of a 0/255 image stays 0/255 and keeps its polarity."""
+    return {"binary": state.binary, "polarity": state.polarity}
+
+
+def tile_params(image: np.ndarray, params: dict) -> dict:
+    """Decide the near-empty-image kernel bump on the whole image, so every tile uses the same kernel."""
+    ksize = odd_ksize(params.get("ksize", 3))
+    if np.count_nonzero(image) < 10 and 0 < ksize < 5:
+        ksize = 5
+    return dict(params, ksize=ksize, adjust_thin_ksize=False)
+
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     """
@@ -15,8 +36,10 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
             - 'ksize' (int): The size of the kernel used for dilation (default is 3).
             - 'kernel_shape' (str): The shape of the kernel. Can be "rect", "ellipse", or "cross" (default is "rect").
             - 'target' (str): Specifies whether to dilate bright regions ("bright") or dark text regions ("dark"). 
-                               The image will be inverted if "dark" is selected (default is "dark").
+                               For "dark", the image is eroded instead, which equals dilating its inverse (default is "dark").
             - 'iterations' (int): The number of iterations for the dilation (default is 1).
+            - 'adjust_thin_ksize' (bool): Raise kernels smaller than 5 to 5 when the image has fewer than
+                               10 nonzero pixels (default is True).
 
     Returns:
         np.ndarray: The dilated image, with expanded bright or dark regions depending on the target specified.
@@ -44,33 +67,17 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
             raise ValueError("Kernel size must be a positive odd integer.")
 
         # If the kernel size is too small for thin features, adjust it
-        if np.count_nonzero(image) < 10 and ksize < 5:
+        if params.get("adjust_thin_ksize", True) and np.count_nonzero(image) < 10 and ksize < 5:
             ksize = 5
             logging.warning("Adjusted kernel size to 5 for better dilation of thin features.")
 
         # Get the kernel shape (rectangular, elliptical, or cross)
         kernel_shape = params.get("kernel_shape", "rect").lower()
-        if kernel_shape == "ellipse":
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
-        elif kernel_shape == "cross":
-            kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (ksize, ksize))
-        else:
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (ksize, ksize))
-
-        # Determine whether to target bright or dark regions
-        target = params.get("target", "dark").lower()
-        img = image
-        inverted = False
-        if target == "dark":
-            img = cv2.bitwise_not(image)  # Invert the image for dark region dilation
-            inverted = True
-
-        # Apply dilation
-        dilated = cv2.dilate(img, kernel, iterations=params.get("iterations", 1))
-
-        # If the image was inverted, invert it back to restore the original bright/dark regions
-        if inverted:
-            dilated = cv2.bitwise_not(dilated)
+        kernel = structuring_element(kernel_shape, ksize)
+
+        # Dilating the dark regions is eroding the image: no inversion is needed
+        op = for_target(cv2.MORPH_DILATE, params.get("target", "dark").lower())
+        dilated = cv2.morphologyEx(image, op, kernel, iterations=params.get("iterations", 1))
 
         # Log the applied parameters
         logging.info(f"Applied dilation with ksize={ksize}, shape={kernel_shape}, iterations={params.get('iterations', 1)}.")
@@ -1,6 +1,16 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.morphology import for_target, structuring_element
+from preprocessing_image.registry import NEIGHBORHOOD, StepSpec, odd_ksize
+
+SPEC = StepSpec(kind=NEIGHBORHOOD, radius=lambda p: odd_ksize(p.get("ksize", 3)) // 2 * p.get("iterations", 1),
+                dtypes=("uint8", "int16", "int32"), channels=(1, 3, 4), in_place=True)
+
+
+def output_state(state, params: dict) -> dict:
+    """Erosion of a 0/255 image stays 0/255 and keeps its polarity."""
+    return {"binary": state.binary, "polarity": state.polarity}
 
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
@@ -16,7 +26,7 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
             - 'ksize' (int): The size of the kernel used for erosion (default is 3).
             - 'kernel_shape' (str): The shape of the kernel. Can be "rect", "ellipse", or "cross" (default is "rect").
             - 'target' (str): Specifies whether to erode bright regions ("bright") or dark text regions ("dark").
-                              The image will be inverted if "dark" is selected (default is "dark").
+                              For "dark", the image is dilated instead, which equals eroding its inverse (default is "dark").
             - 'iterations' (int): The number of iterations for the erosion (default is 1).
 
     Returns:
@@ -36,22 +46,11 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         if ksize % 2 == 0:
             ksize += 1
         kernel_shape = params.get("kernel_shape", "rect").lower()
-        if kernel_shape == "ellipse":
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (ksize, ksize))
-        elif kernel_shape == "cross":
-            kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (ksize, ksize))
-        else:
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (ksize, ksize))
-        target = params.get("target", "dark").lower()
-        img = image
-        inverted = False
-        if target == "dark":
-            img = cv2.bitwise_not(image)
-            inverted = True
+        kernel = structuring_element(kernel_shape, ksize)
+        # Eroding the dark regions is dilating the image: no inversion is needed
+        op = for_target(cv2.MORPH_ERODE, params.get("target", "dark").lower())
         iterations = params.get("iterations", 1)
-        eroded = cv2.erode(img, kernel, iterations=iterations)
-        if inverted:
-            eroded = cv2.bitwise_not(eroded)
+        eroded = cv2.morphologyEx(image, op, kernel, iterations=iterations)
         logging.info(f"Applied erosion with ksize={ksize}, shape={kernel_shape}, iterations={iterations}.")
         return eroded
     except Exception as e:
@@ -1,6 +1,26 @@
 import cv2
 import numpy as np
 import logging
+from functools import lru_cache
+from preprocessing_image.registry import POINTWISE, StepSpec
+
+SPEC = StepSpec(kind=POINTWISE, dtypes=("uint8",), channels=(1, 3, 4), in_place=True)
+
+
+@lru_cache(maxsize=64)
+def _gamma_table(gamma: float) -> np.ndarray:
+    """256-entry gamma lookup table, built once per gamma value (read-only, shared between calls)."""
+    table = ((np.arange(256) / 255.0) ** (1.0 / gamma) * 255).astype(np.uint8)
+    table.setflags(write=False)
+    return table
+
+
+def lookup_table(params: dict, channels: int, present=None):
+    """Per-pixel uint8 map applied by this step, for fusing with neighbouring pointwise steps."""
+    gamma = params.get("gamma", 1.0)
+    if not isinstance(gamma, (int, float)) or gamma <= 0:
+        return None
+    return _gamma_table(float(gamma))
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     """
@@ -92,15 +112,8 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         if gamma <= 0:
             raise ValueError("Gamma must be positive.")
         logging.info(f"Applying gamma correction with gamma = {gamma}")
-        lookup_table = np.array([(i / 255.0) ** (1.0 / gamma) * 255 for i in range(256)], dtype=np.uint8)
-        if len(image.shape) == 3:
-            channels = cv2.split(image)
-            channels = [cv2.LUT(ch, lookup_table) for ch in channels]
-            corrected = cv2.merge(channels)
-        else:
-            corrected = cv2.LUT(image, lookup_table)
-        corrected = np.clip(corrected, 0, 255)
-        return corrected
+        # A single-channel table is applied to every channel of a color image
+        return cv2.LUT(image, _gamma_table(float(gamma)))
     except Exception as e:
         logging.error(f"Gamma correction preprocessing failed: {e}")
         raise
\ No newline at end of file
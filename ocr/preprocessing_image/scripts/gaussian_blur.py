@@ -1,6 +1,12 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.registry import NEIGHBORHOOD, StepSpec, odd_ksize
+
+SPEC = StepSpec(kind=NEIGHBORHOOD, radius=lambda p: odd_ksize(p.get("ksize", 5)) // 2,
+                dtypes=("uint8",), channels=(1, 3, 4), in_place=True)
+
+
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     try:
         ksize = params.get("ksize", 5)
@@ -1,6 +1,10 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.registry import POINTWISE, StepSpec
+
+SPEC = StepSpec(kind=POINTWISE, channels=(1, 3), output_channels=1)
+
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     """
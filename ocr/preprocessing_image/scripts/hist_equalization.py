@@ -1,6 +1,10 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.registry import GLOBAL, StepSpec
+
+SPEC = StepSpec(kind=GLOBAL, dtypes=("uint8",), channels=(1, 3))
+
 
 def validate_input(image: np.ndarray) -> None:
     """
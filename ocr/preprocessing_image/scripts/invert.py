@@ -1,11 +1,33 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.state import flip_polarity
+from preprocessing_image.registry import POINTWISE, StepSpec
+
+SPEC = StepSpec(kind=POINTWISE, dtypes=("uint8",), channels=(1, 3, 4), in_place=True)
+
+
+_INVERT_TABLE = np.arange(255, -1, -1, dtype=np.uint8)
+_INVERT_TABLE.setflags(write=False)
+
+
+def lookup_table(params: dict, channels: int, present=None):
+    """Per-pixel uint8 map applied by this step; None for BGRA, where the alpha channel is kept."""
+    if channels == 4:
+        return None
+    return _INVERT_TABLE
+
+
+def output_state(state, params: dict) -> dict:
+    """Inverting keeps a 0/255 image binary and flips its polarity."""
+    return {"binary": state.binary, "polarity": flip_polarity(state.polarity)}
+
+
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     try:
         if not isinstance(image, np.ndarray):
             raise TypeError("Input must be a numpy array.")
-        if image.shape[-1] == 4:
+        if image.ndim == 3 and image.shape[-1] == 4:
             bgr = cv2.bitwise_not(image[..., :3])
             alpha = image[..., 3]
             return np.dstack((bgr, alpha))
@@ -1,29 +1,25 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.morphology import for_target, structuring_element
+from preprocessing_image.registry import KWARGS, NEIGHBORHOOD, StepSpec, odd_ksize
 
+# Called as preprocess(image, ksize=..., kernel_shape=..., target=...); closing is a dilation then an erosion
+SPEC = StepSpec(signature=KWARGS, kind=NEIGHBORHOOD, radius=lambda p: 2 * (odd_ksize(p.get("ksize", 3)) // 2),
+                dtypes=("uint8",), channels=(1, 3, 4), in_place=True)
 
-# Helper function to get kernel based on shape
-def get_kernel(shape: str, size: int) -> np.ndarray:
-    """
-    Returns the kernel based on the specified shape and size.
-    """
-    if shape == "ellipse":
-        return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
-    elif shape == "cross":
-        return cv2.getStructuringElement(cv2.MORPH_CROSS, (size, size))
-    else:
-        return cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+
+def output_state(state, params: dict) -> dict:
+    """Closing of a 0/255 image stays 0/255 and keeps its polarity."""
+    return {"binary": state.binary, "polarity": state.polarity}
 
 
-# Helper function to invert image if required
-def invert_image(image: np.ndarray, target: str) -> np.ndarray:
+# Helper function to get kernel based on shape
+def get_kernel(shape: str, size: int) -> np.ndarray:
     """
-    Inverts the image if the target is 'dark' (i.e., dark regions become white).
+    Returns the (cached, read-only) kernel based on the specified shape and size.
     """
-    if target == "dark":
-        return cv2.bitwise_not(image)
-    return image
+    return structuring_element(shape, size)
 
 
 def preprocess(image: np.ndarray, ksize: int = 3, kernel_shape: str = "rect", target: str = "dark") -> np.ndarray:
@@ -42,15 +38,8 @@ def preprocess(image: np.ndarray, ksize: int = 3, kernel_shape: str = "rect", ta
         # Get the kernel based on shape
         kernel = get_kernel(kernel_shape, ksize)
 
-        # Invert the image if needed
-        img = invert_image(image, target)
-
-        # Apply morphological closing (dilation followed by erosion)
-        closed = cv2.morphologyEx(img, cv2.MORPH_CLOSE, kernel)
-
-        # Invert the image back if it was originally inverted
-        if target == "dark":
-            closed = cv2.bitwise_not(closed)
+        # The closing of the dark regions is the opening of the image: no inversion is needed
+        closed = cv2.morphologyEx(image, for_target(cv2.MORPH_CLOSE, target), kernel)
 
         # Log the applied parameters
         logging.info(f"Applied morphological close with ksize={ksize}, shape={kernel_shape}.")
@@ -1,6 +1,28 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.registry import GLOBAL, StepSpec
+
+SPEC = StepSpec(kind=GLOBAL, dtypes=("uint8",), channels=(1, 3, 4), in_place=True)
+
+_VALUES = np.arange(256, dtype=np.uint8).reshape(1, 256)
+
+
+def lookup_table(params: dict, channels: int, present=None):
+    """
+    Per-pixel uint8 map applied by min-max normalization.
+
+    The map depends on the input's intensity bounds, so ``present`` (a length-256 mask of
+    the values occurring in the input) is required. Other norm types return None.
+    """
+    if present is None or params.get("norm_type", cv2.NORM_MINMAX) != cv2.NORM_MINMAX:
+        return None
+    alpha = params.get("alpha", 0)
+    beta = params.get("beta", 255)
+    # Normalizing 0..255 over just the present values uses the same bounds, scale and rounding as the image
+    mask = np.asarray(present, dtype=np.uint8).reshape(1, 256)
+    table = cv2.normalize(_VALUES, None, alpha, beta, cv2.NORM_MINMAX, mask=mask)
+    return table.reshape(256)
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     """
@@ -1,6 +1,67 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.registry import GEOMETRIC, StepSpec
+
+SPEC = StepSpec(kind=GEOMETRIC)
+
+
+def target_size(height: int, width: int, params: dict):
+    """The ``(width, height)`` to resize an image of the given size to, or None to leave it unchanged."""
+    target_width = params.get("target_width", None)
+    target_height = params.get("target_height", None)
+    upscale_only = params.get("upscale_only", True)
+
+    if target_width == 0 and target_height == 0:
+        logging.info("Resize step: Target size is zero, skipping resize.")
+        return None
+
+    # Width-based scaling
+    if target_width and not target_height:
+        scale = target_width / width
+    # Height-based scaling
+    elif target_height and not target_width:
+        scale = target_height / height
+    # Both provided
+    else:
+        scale_w = target_width / width if target_width else 1.0
+        scale_h = target_height / height if target_height else 1.0
+        scale = min(scale_w, scale_h) if upscale_only else max(scale_w, scale_h)
+
+    new_w = max(1, int(width * scale))
+    new_h = max(1, int(height * scale))
+
+    # Skip resize if size same
+    if new_w == width and new_h == height:
+        logging.info("Resize step: Image already meets size requirements, skipping resize.")
+        return None
+
+    # Don't downscale if upscale_only
+    if upscale_only and (new_w < width or new_h < height):
+        logging.info("Resize step: Upscale only enabled. Skipping downscale.")
+        return None
+
+    return new_w, new_h
+
+
+def record_size(params: dict, new_w: int, new_h: int) -> None:
+    params["resized"] = True
+    params["new_width"] = new_w
+    params["new_height"] = new_h
+
+
+def affine(shape: tuple, params: dict, image=None, state=None):
+    """The resize as a map of pixel coordinates, as cv2.resize samples them (see geometry.py)."""
+    height, width = shape[:2]
+    size = target_size(height, width, params)
+    if size is None:
+        return np.float64([[1, 0, 0], [0, 1, 0]]), (width, height)
+    new_w, new_h = size
+    record_size(params, new_w, new_h)
+    sx, sy = new_w / width, new_h / height
+    # Pixel centres: x_out + 0.5 = (x_in + 0.5) * sx
+    return np.float64([[sx, 0, 0.5 * sx - 0.5], [0, sy, 0.5 * sy - 0.5]]), (new_w, new_h)
+
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     """
@@ -63,44 +124,14 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         raise ValueError("Empty image provided.")
 
     height, width = image.shape[:2]
-    target_width = params.get("target_width", None)
-    target_height = params.get("target_height", None)
-    upscale_only = params.get("upscale_only", True)
-
-    if target_width == 0 and target_height == 0:
-        logging.info("Resize step: Target size is zero, skipping resize.")
-        return image
-
-    # Width-based scaling
-    if target_width and not target_height:
-        scale = target_width / width
-    # Height-based scaling
-    elif target_height and not target_width:
-        scale = target_height / height
-    # Both provided
-    else:
-        scale_w = target_width / width if target_width else 1.0
-        scale_h = target_height / height if target_height else 1.0
-        scale = min(scale_w, scale_h) if upscale_only else max(scale_w, scale_h)
-
-    new_w = max(1, int(width * scale))
-    new_h = max(1, int(height * scale))
-
-    # Skip resize if size same
-    if new_w == width and new_h == height:
-        logging.info("Resize step: Image already meets size requirements, skipping resize.")
-        return image
-
-    # Don't downscale if upscale_only
-    if upscale_only and (new_w < width or new_h < height):
-        logging.info("Resize step: Upscale only enabled. Skipping downscale.")
+    size = target_size(height, width, params)
+    if size is None:
         return image
+    new_w, new_h = size
 
     interpolation = cv2.INTER_CUBIC if new_w > width or new_h > height else cv2.INTER_AREA
     resized = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
 
-    params["resized"] = True
-    params["new_width"] = new_w
-    params["new_height"] = new_h
+    record_size(params, new_w, new_h)
 
     return resized
@@ -1,6 +1,10 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.registry import NEIGHBORHOOD, StepSpec
+
+SPEC = StepSpec(kind=NEIGHBORHOOD, radius=1, dtypes=("uint8",), channels=(1, 3, 4))
+
 
 def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
     """
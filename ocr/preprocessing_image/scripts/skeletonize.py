@@ -1,15 +1,59 @@
 import cv2
 import numpy as np
 import logging
+from preprocessing_image.morphology import structuring_element
+from preprocessing_image.state import is_binary, to_gray
+from preprocessing_image.registry import GLOBAL, StepSpec
+from preprocessing_image.thinning import ZHANG_SUEN, thin
 
-def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
+SPEC = StepSpec(kind=GLOBAL, dtypes=("uint8",), channels=(1, 3), output_channels=1, accepts_state=True)
+
+
+def output_state(state, params: dict) -> dict:
+    """The skeleton is a 0/255 image with dark strokes on a white background."""
+    return {"binary": True, "polarity": "dark"}
+
+
+def morphological_skeleton(inv: np.ndarray, max_iterations: int = 1000) -> np.ndarray:
+    """
+    Union of the erode/dilate residues of ever more eroded copies of a white-foreground image.
+
+    Cheap, but the result is neither one pixel wide nor connected; kept for configs relying on it.
+    """
+    skeleton = np.zeros_like(inv)
+    temp = np.empty_like(inv)
+    kernel = structuring_element("cross", 3)
+    eroded = inv
+    for _ in range(max_iterations):
+        eroded = cv2.erode(eroded, kernel)  # Erode the image
+        cv2.dilate(eroded, kernel, dst=temp)  # Dilate the eroded image
+        cv2.subtract(inv, temp, dst=temp)  # Subtract dilated image from original to get the skeleton
+        cv2.bitwise_or(skeleton, temp, dst=skeleton)  # Combine the result with the skeleton
+        inv = eroded
+        remaining = cv2.countNonZero(inv)
+        logging.debug(f"Processing: {remaining} foreground pixels remaining.")
+        # Exit the loop when no more foreground pixels remain
+        if remaining == 0:
+            return skeleton
+    raise RuntimeError("Skeletonization loop exceeded maximum iterations.")
+
+
+def preprocess(image: np.ndarray, params: dict, state=None) -> np.ndarray:
     """
     Thin the binary image to get a skeletal representation of text.
 
+    The default thinning (Zhang-Suen, or Guo-Hall) leaves a connected skeleton one pixel wide
+    (see thinning.py). The "morphological" method is the older erode/dilate residue skeleton.
+
     Args:
         image (np.ndarray): The input binary image to be skeletonized. If the image is in color, it will be converted to grayscale.
         params (dict): A dictionary containing configuration parameters for the skeletonization:
+            - 'method' (str): "zhangsuen", "guohall" or "morphological" (default is "zhangsuen").
+            - 'use_ximgproc' (bool): Thin with cv2.ximgproc.thinning when OpenCV contrib is installed. Same result,
+              but slower than the built-in lookup-table thinning (default is False).
             - 'reduction_percent' (float): The percentage reduction in foreground pixels due to skeletonization. This is calculated and stored after processing.
+        state (ImageState, optional): The pipeline's state for the image. Its cached gray conversion is reused,
+            and a known-binary image skips the intermediate-value scan.
 
     Returns:
         np.ndarray: The skeletonized image, with foreground features reduced to their thinned form.
@@ -24,58 +68,30 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         return image  # Return the color image as is (1x1, 3 channels)
     
     # Convert to grayscale if the image is in color
-    if len(image.shape) == 3:  # Color image
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image = to_gray(image, state)
 
     try:
-        # Ensure binary image (convert to grayscale and threshold if not binary)
+        # Ensure binary image (threshold if not binary)
         img = image
-        if len(img.shape) == 3:  # Color image, convert to grayscale
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        vals = np.unique(img)
         bin_img = img
-        if not (len(vals) == 2 and 0 in vals and 255 in vals):  # If image is not binary
+        if not is_binary(img, state):  # If image is not binary
             _, bin_img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
         
         # Invert the image so that text becomes white (foreground) for skeletonization algorithm
         inv = cv2.bitwise_not(bin_img)
-        
-        # Initialize an empty image for the skeleton
-        skeleton = np.zeros_like(inv)
-        
-        # Define a kernel for erosion and dilation
-        kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
-        eroded = inv.copy()
-        
-        # Maximum iterations safeguard to avoid infinite loops
-        max_iterations = 1000  # Safeguard
-        iteration_count = 0
 
-        while True:
-            eroded = cv2.erode(eroded, kernel)  # Erode the image
-            temp = cv2.dilate(eroded, kernel)  # Dilate the eroded image
-            temp = cv2.subtract(inv, temp)  # Subtract dilated image from original to get the skeleton
-            skeleton = cv2.bitwise_or(skeleton, temp)  # Combine the result with the skeleton
-            inv = eroded.copy()
+        method = params.get("method", ZHANG_SUEN).lower()
+        if method == "morphological":
+            skeleton = morphological_skeleton(inv)
+        else:
+            skeleton = thin(inv, method, use_ximgproc=params.get("use_ximgproc", False))
 
-            # Log progress
-            logging.info(f"Processing: {cv2.countNonZero(inv)} foreground pixels remaining.")
-            
-            iteration_count += 1
-            if iteration_count > max_iterations:
-                raise RuntimeError("Skeletonization loop exceeded maximum iterations.")
-            
-            # Exit the loop when no more foreground pixels remain
-            if cv2.countNonZero(inv) == 0:
-                break
-        
         # Invert the image back to original polarity (skeleton in black on white)
         skeleton_result = cv2.bitwise_not(skeleton)
         
         # Calculate reduction in foreground pixels
-        orig_foreground = int(np.sum(bin_img == 0))  # Count of foreground pixels in the original image
-        skel_foreground = int(np.sum(skeleton_result == 0))  # Count of foreground pixels in the skeletonized image
+        orig_foreground = cv2.countNonZero(inv)  # Count of foreground pixels in the original image
+        skel_foreground = cv2.countNonZero(skeleton)  # Count of foreground pixels in the skeletonized image
         reduction_percent = (orig_foreground - skel_foreground) / orig_foreground * 100 if orig_foreground > 0 else 0
         
         # Store the reduction percentage in params
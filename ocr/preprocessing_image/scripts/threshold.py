@@ -1,8 +1,35 @@
 import cv2
 import numpy as np
+import math
 import logging
+from preprocessing_image.state import to_gray
+from preprocessing_image.registry import GLOBAL, POINTWISE, StepSpec
 
-def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
+# A fixed threshold is a per-pixel map; Otsu picks its threshold from the whole histogram
+SPEC = StepSpec(kind=lambda p: GLOBAL if p.get("method", "otsu").lower() == "otsu" else POINTWISE,
+                dtypes=("uint8",), channels=(1, 3), output_channels=1, accepts_state=True)
+
+
+def lookup_table(params: dict, channels: int, present=None):
+    """
+    Per-pixel uint8 map applied by a fixed threshold on a single-channel image.
+
+    Otsu depends on the whole histogram and color input goes through a gray conversion,
+    so neither is a plain per-value map; both return None.
+    """
+    method = params.get("method", "otsu").lower()
+    thresh_val = params.get("threshold_value", 0)
+    if method == "otsu" or channels != 1 or thresh_val < 0 or thresh_val > 255:
+        return None
+    # cv2.threshold floors the threshold for 8-bit images: value > floor(t) -> 255
+    return np.where(np.arange(256) > math.floor(thresh_val), 255, 0).astype(np.uint8)
+
+def output_state(state, params: dict) -> dict:
+    """Threshold always produces a 0/255 image with the input's polarity."""
+    return {"binary": True, "polarity": state.polarity}
+
+
+def preprocess(image: np.ndarray, params: dict, state=None) -> np.ndarray:
     """
     Binarize the image using global threshold (Otsu or specified value).
 
@@ -15,6 +42,7 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         params (dict): A dictionary containing configuration parameters for the thresholding process:
             - 'method' (str): The method used for thresholding. Can be "otsu" (default) or "fixed" for a fixed threshold.
             - 'threshold_value' (int): The threshold value used for fixed thresholding. Should be between 0 and 255 (default is 0).
+        state (ImageState, optional): The pipeline's state for the image; its cached gray conversion is reused.
 
     Returns:
         np.ndarray: The binarized image with pixel values either 0 (black) or 255 (white).
@@ -28,10 +56,8 @@ def preprocess(image: np.ndarray, params: dict) -> np.ndarray:
         print(binary_image)
     """
     try:
-        gray = image
         # Ensure grayscale input
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = to_gray(image, state)
 
         method = params.get("method", "otsu").lower()
         thresh_val = params.get("threshold_value", 0)
@@ -0,0 +1,354 @@
+"""
+Preprocessing as a long-running local HTTP service.
+
+``run_preprocessing.py`` starts a new interpreter for every job, so each job pays for
+Python, cv2 and config startup before its first image. The service keeps a pool of worker
+processes warm instead: each has cv2 loaded and every named config compiled into a
+PipelinePlan once, and only runs steps per request::
+
+    python -m preprocessing_image.service --configs preprocessing_image/configs --workers 4
+
+    POST /process/<config>   the image as a multipart ``image`` field, or as the raw body
+    GET  /health             the worker count and the configs served
+
+A named config is ``<configs dir>/<name>.yaml``, any YAML file there with a ``steps``
+list. The upload is decoded with the plan's decoder (see decode.py) and run through its
+stages as ``process_image`` would, without touching the disk. The response is JSON with
+the validation results, the processed image encoded in the config's output format
+(base64; ``same`` keeps the upload's format) and timings; with ``?response=image`` the
+body is the encoded image and the results are in the ``X-Validation-Results`` header.
+
+Requests arriving within ``batch_window_ms`` of each other are micro-batched: a burst for
+one config goes to the pool as a few tasks of several images, one per worker, instead of
+one task per image, saving per-task pickling and scheduling once every worker is busy.
+``loadgen.py`` measures the service's latency and throughput.
+"""
+
+import os
+import json
+import time
+import queue
+import base64
+import logging
+import argparse
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from preprocessing_image.pipeline import run_stages
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.utils import load_config
+
+DEFAULT_CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configs")
+DEFAULT_WORKERS = 2
+DEFAULT_BATCH_WINDOW_MS = 5.0
+DEFAULT_MAX_BATCH = 16
+DEFAULT_TIMEOUT = 120.0
+
+# Leading bytes of the formats an upload without a file name is recognised by
+SIGNATURES = ((b"\xff\xd8\xff", ".jpg"), (b"\x89PNG", ".png"), (b"II*\x00", ".tif"), (b"MM\x00*", ".tif"),
+              (b"BM", ".bmp"))
+MIMETYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".tif": "image/tiff",
+             ".tiff": "image/tiff", ".webp": "image/webp", ".bmp": "image/bmp"}
+
+# Per-process plans installed by _init_worker
+_worker_plans = {}
+
+
+def find_configs(config_dir: str) -> dict:
+    """The named configs in ``config_dir``: ``{name: path}`` for every YAML file with a ``steps`` list."""
+    configs = {}
+    for entry in sorted(os.listdir(config_dir)):
+        name, extension = os.path.splitext(entry)
+        if extension.lower() not in (".yaml", ".yml"):
+            continue
+        path = os.path.join(config_dir, entry)
+        try:
+            config = load_config(path)
+        except Exception as e:
+            logging.warning(f"Skipping config {path}: {e}")
+            continue
+        if isinstance(config, dict) and isinstance(config.get("steps"), list):
+            configs[name] = path
+    return configs
+
+
+def image_extension(name: str, data: bytes) -> str:
+    """Extension of an upload: from its file name, else from its leading bytes ("" if unknown)."""
+    extension = os.path.splitext(name or "")[1].lower()
+    if extension:
+        return extension
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return ""
+
+
+def process_bytes(plan: PipelinePlan, name: str, data: bytes) -> dict:
+    """
+    Decode an uploaded image, run the plan's stages on it and encode the result.
+
+    Returns:
+        dict: ``results`` (validation results by step), ``image`` (the encoded output, None
+        if it could not be encoded, which is then the ``output`` result), its ``extension``
+        and ``process_ms``; or just ``error`` if the upload could not be decoded.
+    """
+    start = time.perf_counter()
+    extension = image_extension(name, data)
+    image = plan.decoder.decode(data, f"upload{extension}")
+    if image is None:
+        return {"error": "Could not decode the image."}
+    results = {}
+    final, state = run_stages(plan, image, results)
+    out_extension = os.path.splitext(plan.output.path_for(f"upload{extension or '.png'}"))[1]
+    try:
+        encoded = plan.output.encode(final, out_extension, binary=state.binary and state.channels == 1)
+    except Exception as e:
+        logging.error(f"Failed to encode the output of {name or 'upload'}: {e}")
+        results["output"] = {"status": "failure", "error": str(e)}
+        encoded = None
+    return {"results": results, "image": encoded, "extension": out_extension,
+            "process_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+def _init_worker(configs: dict, log_level: int) -> None:
+    """Worker initializer: compile every named config once, so requests only run the steps."""
+    logging.getLogger().setLevel(log_level)
+    for name, path in configs.items():
+        _worker_plans[name] = PipelinePlan.from_config(load_config(path))
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _process_batch(config_name: str, uploads: list) -> list:
+    plan = _worker_plans[config_name]
+    processed = []
+    for name, data in uploads:
+        try:
+            processed.append(process_bytes(plan, name, data))
+        except Exception as e:
+            logging.exception(f"Error processing {name or 'upload'}: {e}")
+            processed.append({"error": str(e)})
+    return processed
+
+
+class WorkerPool:
+    """Warm worker processes with every named config compiled; replaced if a worker dies."""
+
+    def __init__(self, configs: dict, workers: int = DEFAULT_WORKERS, log_level: int = logging.WARNING):
+        self.configs = dict(configs)
+        self.workers = max(1, workers)
+        self.log_level = log_level
+        self._lock = threading.Lock()
+        self._executor = self._start()
+
+    def _start(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self.configs, self.log_level))
+        # Start every worker now, not on the first requests
+        pids = {future.result() for future in [executor.submit(_warm) for _ in range(self.workers)]}
+        logging.info(f"Started {len(pids)} warm worker process(es).")
+        return executor
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            try:
+                return self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                logging.warning("A worker process died; starting a new pool.")
+                self._executor = self._start()
+                return self._executor.submit(fn, *args)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class _Request:
+    __slots__ = ("config", "name", "data", "future")
+
+    def __init__(self, config: str, name: str, data: bytes):
+        self.config = config
+        self.name = name
+        self.data = data
+        self.future = Future()
+
+
+class MicroBatcher:
+    """
+    Collects requests arriving within ``window`` seconds of the first (at most ``max_batch``)
+    and sends each config's requests to the pool as one task per worker.
+    """
+
+    def __init__(self, pool: WorkerPool, window: float = DEFAULT_BATCH_WINDOW_MS / 1000,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, config: str, name: str, data: bytes) -> Future:
+        """Queue an upload; the future's result is ``process_bytes``'s dict plus its ``batch_size``."""
+        request = _Request(config, name, data)
+        self._queue.put(request)
+        return request.future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.window
+            closing = False
+            while len(batch) < self.max_batch:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                batch.append(request)
+            self._dispatch(batch)
+            if closing:
+                return
+
+    def _dispatch(self, batch: list) -> None:
+        by_config = {}
+        for request in batch:
+            by_config.setdefault(request.config, []).append(request)
+        for config, requests in by_config.items():
+            # Spread a burst over every worker rather than queueing it behind one
+            size = -(-len(requests) // self.pool.workers)
+            for start in range(0, len(requests), size):
+                chunk = requests[start:start + size]
+                try:
+                    future = self.pool.submit(_process_batch, config, [(r.name, r.data) for r in chunk])
+                except Exception as e:
+                    for request in chunk:
+                        request.future.set_exception(e)
+                    continue
+                future.add_done_callback(partial(self._deliver, chunk))
+
+    @staticmethod
+    def _deliver(chunk: list, future: Future) -> None:
+        try:
+            processed = future.result()
+        except Exception as e:
+            for request in chunk:
+                request.future.set_exception(e)
+            return
+        for request, result in zip(chunk, processed):
+            result["batch_size"] = len(chunk)
+            request.future.set_result(result)
+
+
+class PreprocessingService:
+    """The named configs, the warm worker pool and the micro-batcher in front of it."""
+
+    def __init__(self, config_dir: str = DEFAULT_CONFIG_DIR, workers: int = DEFAULT_WORKERS,
+                 batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS, max_batch: int = DEFAULT_MAX_BATCH,
+                 log_level: int = logging.WARNING):
+        self.configs = find_configs(config_dir)
+        if not self.configs:
+            raise ValueError(f"No config with a steps list in {config_dir}")
+        self.pool = WorkerPool(self.configs, workers, log_level)
+        self.batcher = MicroBatcher(self.pool, batch_window_ms / 1000, max_batch)
+
+    def submit(self, config: str, name: str, data: bytes) -> Future:
+        """Process an upload with the named config (see ``MicroBatcher.submit``)."""
+        if config not in self.configs:
+            raise KeyError(config)
+        return self.batcher.submit(config, name, data)
+
+    def close(self) -> None:
+        self.batcher.close()
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def create_app(service: PreprocessingService, timeout: float = DEFAULT_TIMEOUT):
+    """The Flask app serving ``service``."""
+    from flask import Flask, Response, jsonify, request
+
+    app = Flask(__name__)
+
+    @app.get("/health")
+    def health():
+        return jsonify(status="ok", workers=service.pool.workers, configs=sorted(service.configs))
+
+    @app.post("/process/<config_name>")
+    def process(config_name: str):
+        if config_name not in service.configs:
+            return jsonify(error=f"Unknown config: {config_name}"), 404
+        upload = request.files.get("image")
+        if upload is not None:
+            name, data = upload.filename or "", upload.read()
+        else:
+            name, data = request.args.get("name", ""), request.get_data()
+        if not data:
+            return jsonify(error="No image in the request."), 400
+        start = time.perf_counter()
+        try:
+            processed = service.submit(config_name, name, data).result(timeout=timeout)
+        except TimeoutError:
+            return jsonify(error=f"Processing took longer than {timeout} s."), 504
+        except Exception as e:
+            logging.error(f"Processing {name or 'upload'} failed: {e}")
+            return jsonify(error=f"Processing failed: {e}"), 500
+        if "error" in processed:
+            return jsonify(error=processed["error"]), 422
+        timing = {"total_ms": round((time.perf_counter() - start) * 1000, 3),
+                  "process_ms": processed["process_ms"], "batch_size": processed["batch_size"]}
+        encoded, extension = processed["image"], processed["extension"]
+        if request.args.get("response") == "image" and encoded is not None:
+            response = Response(encoded, mimetype=MIMETYPES.get(extension, "application/octet-stream"))
+            response.headers["X-Validation-Results"] = json.dumps(processed["results"], separators=(",", ":"))
+            response.headers["X-Timing"] = json.dumps(timing, separators=(",", ":"))
+            return response
+        output = None if encoded is None else {"extension": extension,
+                                               "data": base64.b64encode(encoded).decode("ascii")}
+        return jsonify(image=name, results=processed["results"], output=output, timing=timing)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the preprocessing pipeline over HTTP with warm workers.")
+    parser.add_argument("--configs", default=DEFAULT_CONFIG_DIR, help="Directory of named YAML configs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or DEFAULT_WORKERS,
+                        help="Worker processes (default: one per CPU).")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="How long to wait for more requests to batch with the first (0: no batching).")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="Most requests collected into one batch.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds a request may take.")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level of the service and its workers.")
+    args = parser.parse_args()
+    log_level = getattr(logging, args.log_level.upper(), logging.WARNING)
+    logging.basicConfig(level=log_level, format="%(asctime)s - %(levelname)s - %(message)s")
+    # The pool is started before the server's threads, so workers are forked from a single-threaded process
+    with PreprocessingService(args.configs, args.workers, args.batch_window_ms, args.max_batch, log_level) as service:
+        create_app(service, args.timeout).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Result sinks: where each image's validation results go as it finishes.
+
+``yaml`` is the legacy behaviour: results are kept in memory and ``result.yaml`` is
+written once at the end. The streaming sinks write every image's record as it completes,
+so memory stays flat and a crash loses at most the last unflushed records:
+
+* ``jsonl``  - one ``{"index", "image", "result"}`` object per line, appended, flushed
+  every ``flush_every`` records or ``flush_interval`` seconds.
+* ``sqlite`` - one row per image in a ``results`` table, committed on the same schedule.
+
+``index`` is the image's position in the source, so readers can restore source order
+whatever order the images finished in (e.g. with several workers). ``to_legacy_yaml``
+converts a JSONL or SQLite result file into the legacy ``result.yaml``::
+
+    python -m preprocessing_image.sinks output/results.jsonl output/result.yaml
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from collections.abc import Mapping
+from typing import Iterator, Optional, Tuple
+
+from preprocessing_image.utils import update_result_yaml
+
+SINK_TYPES = ("yaml", "jsonl", "sqlite")
+DEFAULT_FILES = {"yaml": "result.yaml", "jsonl": "results.jsonl", "sqlite": "results.sqlite"}
+SQLITE_HEADER = b"SQLite format 3\0"
+
+
+class ResultSink:
+    """Receives each finished image's results; ``close()`` makes everything durable."""
+
+    path: str
+
+    def write(self, name: str, result: dict, index: int) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Make the records written so far durable, whatever the flush schedule."""
+
+    def close(self) -> None:
+        pass
+
+    def results(self) -> Mapping:
+        """The written results, by image name in source order."""
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class YamlSink(ResultSink):
+    """Legacy sink: keeps results in memory and dumps them to result.yaml on close."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._records = {}  # name -> (index, result)
+
+    def write(self, name: str, result: dict, index: int) -> None:
+        self._records[name] = (index, result)
+
+    def results(self) -> dict:
+        return {name: result for name, (_, result) in sorted(self._records.items(), key=lambda item: item[1][0])}
+
+    def close(self) -> None:
+        update_result_yaml(self.results(), self.path)
+
+
+class _FlushSchedule:
+    """Flush after ``every`` records or ``interval`` seconds, whichever comes first."""
+
+    def __init__(self, every: int, interval: float):
+        self.every = max(1, int(every))
+        self.interval = interval
+        self._unflushed = 0
+        self._last = time.monotonic()
+
+    def due(self) -> bool:
+        self._unflushed += 1
+        return self._unflushed >= self.every or time.monotonic() - self._last >= self.interval
+
+    def done(self) -> None:
+        self._unflushed = 0
+        self._last = time.monotonic()
+
+
+class JsonlSink(ResultSink):
+    """Appends one JSON line per image and flushes it to disk on a schedule."""
+
+    def __init__(self, path: str, flush_every: int = 100, flush_interval: float = 5.0):
+        self.path = path
+        self._schedule = _FlushSchedule(flush_every, flush_interval)
+        self._file = open(path, 'w')
+
+    def write(self, name: str, result: dict, index: int) -> None:
+        self._file.write(json.dumps({"index": index, "image": name, "result": result}, separators=(",", ":")) + "\n")
+        if self._schedule.due():
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._schedule.done()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def results(self) -> Mapping:
+        return LazyResults(self.path)
+
+
+class SqliteSink(ResultSink):
+    """Inserts one row per image into a ``results`` table, committing on a schedule."""
+
+    def __init__(self, path: str, flush_every: int = 100, flush_interval: float = 5.0):
+        self.path = path
+        self._schedule = _FlushSchedule(flush_every, flush_interval)
+        if os.path.exists(path):
+            os.remove(path)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE results (idx INTEGER NOT NULL, image TEXT PRIMARY KEY, result TEXT NOT NULL)")
+
+    def write(self, name: str, result: dict, index: int) -> None:
+        self._db.execute("INSERT OR REPLACE INTO results (idx, image, result) VALUES (?, ?, ?)",
+                         (index, name, json.dumps(result, separators=(",", ":"))))
+        if self._schedule.due():
+            self.flush()
+
+    def flush(self) -> None:
+        self._db.commit()
+        self._schedule.done()
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def results(self) -> Mapping:
+        return LazyResults(self.path)
+
+
+def make_sink(config: dict, output_dir: str) -> ResultSink:
+    """
+    Build the sink described by the ``results`` section of a pipeline config.
+
+    ``sink`` is one of yaml (default), jsonl or sqlite; ``path`` defaults to a file of the
+    matching type in ``output_dir``.
+    """
+    results_cfg = config.get("results") or {}
+    sink_type = str(results_cfg.get("sink", "yaml")).lower()
+    if sink_type not in SINK_TYPES:
+        raise ValueError(f"Invalid result sink: {sink_type}")
+    path = results_cfg.get("path") or os.path.join(output_dir, DEFAULT_FILES[sink_type])
+    if sink_type == "yaml":
+        return YamlSink(path)
+    flush_every = results_cfg.get("flush_every", 100)
+    flush_interval = float(results_cfg.get("flush_interval", 5.0))
+    if sink_type == "jsonl":
+        return JsonlSink(path, flush_every, flush_interval)
+    return SqliteSink(path, flush_every, flush_interval)
+
+
+def is_sqlite(path: str) -> bool:
+    """Whether the file at ``path`` is an SQLite database."""
+    with open(path, 'rb') as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+def read_records(path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield ``(image, result)`` from a JSONL or SQLite result file in source order.
+
+    The format is told by the file's header, not its name (``results.path`` can be any
+    name). For JSONL, a truncated last line (from a killed run) is skipped, and a later
+    record for the same image replaces an earlier one.
+    """
+    if is_sqlite(path):
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            for image, result in db.execute("SELECT image, result FROM results ORDER BY idx"):
+                yield image, json.loads(result)
+        finally:
+            db.close()
+        return
+    records = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                records[record["image"]] = (record["index"], record["result"])
+            except (ValueError, KeyError, TypeError):
+                logging.warning(f"Skipping unreadable result line in {path}")
+    for image, (_, result) in sorted(records.items(), key=lambda item: item[1][0]):
+        yield image, result
+
+
+class LazyResults(Mapping):
+    """Read-only mapping over a result file, loaded on first access."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Optional[dict] = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            self._data = dict(read_records(self.path))
+        return self._data
+
+    def __getitem__(self, name):
+        return self._load()[name]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+def to_legacy_yaml(source_path: str, yaml_path: str) -> None:
+    """Convert a JSONL or SQLite result file into the legacy result.yaml layout."""
+    update_result_yaml(dict(read_records(source_path)), yaml_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a JSONL or SQLite result file to the legacy result.yaml.")
+    parser.add_argument("source", help="results.jsonl or results.sqlite written by the pipeline.")
+    parser.add_argument("output", help="Path of the result.yaml to write.")
+    args = parser.parse_args()
+    to_legacy_yaml(args.source, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Image sources for the preprocessing pipeline.
+
+A source yields image names lazily, relative to its root directory, so a run over a
+nested tree of hundreds of thousands of files can start on the first image without
+listing everything up front. ``prefetch`` decodes upcoming images on a small thread
+pool (cv2 releases the GIL while decoding) so decode overlaps the step computations.
+"""
+
+import os
+import glob
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def is_image_file(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class ImageSource:
+    """Base class: iterating a source yields image names relative to ``root``."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def __iter__(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def path(self, name: str) -> str:
+        """Absolute (or root-joined) path of an image yielded by this source."""
+        return os.path.join(self.root, name)
+
+
+class DirectorySource(ImageSource):
+    """
+    Walk a directory with ``os.scandir``.
+
+    Entries are sorted per directory, so the order is stable without ever holding more
+    than one directory listing. Directories in ``exclude`` (e.g. the run's output
+    directory) are never entered.
+    """
+
+    def __init__(self, root: str, recursive: bool = False, exclude: Iterable[str] = ()):
+        super().__init__(root)
+        self.recursive = recursive
+        self.exclude = {os.path.realpath(p) for p in exclude}
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._walk(self.root, "")
+
+    def _walk(self, directory: str, prefix: str) -> Iterator[str]:
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logging.error(f"Cannot scan directory {directory}: {e}")
+            return
+        for entry in entries:
+            rel = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if self.recursive and os.path.realpath(entry.path) not in self.exclude:
+                    yield from self._walk(entry.path, rel + os.sep)
+            elif is_image_file(entry.name):
+                yield rel
+
+
+class ManifestSource(ImageSource):
+    """
+    Read image paths from a list file, one per line.
+
+    Paths are taken relative to ``root``, since outputs are written under the output
+    directory by the same relative name. An absolute path inside ``root`` is made relative
+    to it; one outside ``root``, or a relative path leading out of it through ``..``, is
+    logged and skipped, so no output can land on (or beside) an input. Blank lines and
+    lines starting with ``#`` are ignored. The file is read line by line, never loaded whole.
+    """
+
+    def __init__(self, root: str, manifest: str):
+        super().__init__(root)
+        self.manifest = manifest
+
+    def __iter__(self) -> Iterator[str]:
+        with open(self.manifest, 'r') as f:
+            for line in f:
+                name = line.strip()
+                if not name or name.startswith('#'):
+                    continue
+                relative = self._relative(name)
+                if relative is None:
+                    logging.error(f"Skipping manifest entry outside {self.root}: {name}")
+                    continue
+                yield relative
+
+    def _relative(self, name: str) -> Optional[str]:
+        """``name`` relative to the root, or None if it is not inside the root."""
+        if not os.path.isabs(name):
+            relative = os.path.normpath(name)
+        else:
+            relative = os.path.relpath(os.path.abspath(name), os.path.abspath(self.root))
+        if relative in (os.curdir, os.pardir) or relative.startswith(os.pardir + os.sep):
+            return None
+        return relative
+
+
+class GlobSource(ImageSource):
+    """Yield the images matching a glob pattern (``**`` recurses), in filesystem order."""
+
+    def __init__(self, root: str, pattern: str, exclude: Iterable[str] = ()):
+        super().__init__(root)
+        self.pattern = pattern
+        self.exclude = tuple(os.path.realpath(p) + os.sep for p in exclude)
+
+    def __iter__(self) -> Iterator[str]:
+        for path in glob.iglob(self.pattern, root_dir=self.root, recursive=True):
+            full = os.path.join(self.root, path)
+            if not is_image_file(path) or not os.path.isfile(full):
+                continue
+            if self.exclude and os.path.realpath(full).startswith(self.exclude):
+                continue
+            yield path
+
+
+def make_source(image_dir: str, config: dict, exclude: Iterable[str] = ()) -> ImageSource:
+    """
+    Build the image source described by the ``source`` section of a pipeline config.
+
+    ``type`` is one of ``directory`` (default; ``recursive`` walks subdirectories),
+    ``manifest`` (``manifest``: list file path) or ``glob`` (``pattern``).
+    """
+    source_cfg = config.get("source") or {}
+    source_type = source_cfg.get("type", "directory").lower()
+    if source_type == "directory":
+        return DirectorySource(image_dir, recursive=source_cfg.get("recursive", False), exclude=exclude)
+    if source_type == "manifest":
+        manifest = source_cfg.get("manifest")
+        if not manifest:
+            raise ValueError("Manifest source requires a 'manifest' file path.")
+        return ManifestSource(image_dir, manifest)
+    if source_type == "glob":
+        pattern = source_cfg.get("pattern")
+        if not pattern:
+            raise ValueError("Glob source requires a 'pattern'.")
+        return GlobSource(image_dir, pattern, exclude=exclude)
+    raise ValueError(f"Invalid image source type: {source_type}")
+
+
+def prefetch(source: ImageSource, reader: Callable[[str], Optional[np.ndarray]] = cv2.imread,
+             workers: int = 4, depth: int = 8,
+             names: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, Optional[np.ndarray]]]:
+    """
+    Yield ``(name, image)`` pairs in source order, decoding up to ``depth`` images ahead
+    on ``workers`` threads. ``image`` is None when the file could not be decoded.
+
+    ``names`` replaces iteration over the source (e.g. a filtered stream of its names).
+    """
+    names = iter(source if names is None else names)
+    if workers <= 0:
+        for name in names:
+            yield name, reader(source.path(name))
+        return
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+        for name in names:
+            pending.append((name, pool.submit(reader, source.path(name))))
+            if len(pending) >= depth:
+                break
+        while pending:
+            name, future = pending.popleft()
+            next_name = next(names, None)
+            if next_name is not None:
+                pending.append((next_name, pool.submit(reader, source.path(next_name))))
+            yield name, future.result()
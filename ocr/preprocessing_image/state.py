@@ -0,0 +1,115 @@
+"""
+Image-state metadata carried alongside the image between pipeline steps.
+
+The state records what is known about the current image: channel count, dtype, whether it
+is known to hold only 0 and 255 (``binary``) and its foreground polarity (``"dark"`` text
+on a light background, ``"light"``, or None when unknown). A script may declare what it
+guarantees about its output with ``output_state(state, params) -> dict`` (e.g. threshold
+always produces a binary image), and may accept the state as a ``state=`` keyword to skip
+checks and conversions the previous step already answered.
+
+The state also caches the gray conversion of the image it describes, so several steps
+handed the same color image (e.g. when deskew finds nothing to rotate) convert it once,
+and the gray image's downsampled pyramid levels used by proxy analysis (see proxy.py).
+"""
+
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+class ImageState:
+    """What is known about the current image; derived facts are only ever guarantees, never guesses."""
+
+    __slots__ = ("channels", "dtype", "binary", "polarity", "_gray_source", "_gray", "_pyramid")
+
+    def __init__(self, channels: int, dtype, binary: bool = False, polarity: Optional[str] = None):
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.binary = binary
+        self.polarity = polarity
+        self._gray_source = None
+        self._gray = None
+        self._pyramid = None
+
+    @classmethod
+    def of(cls, image: np.ndarray, binary: bool = False, polarity: Optional[str] = None) -> "ImageState":
+        """State of an image about which nothing beyond its layout is known (unless given)."""
+        channels = image.shape[2] if image.ndim == 3 else 1
+        return cls(channels, image.dtype, binary=binary, polarity=polarity)
+
+    def gray(self, image: np.ndarray) -> np.ndarray:
+        """BGR->gray conversion of ``image``, reused while the same image object is passed in."""
+        if image.ndim != 3:
+            return image
+        if self._gray_source is not image:
+            self._gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            self._gray_source = image
+        return self._gray
+
+    def pyramid(self, image: np.ndarray, level: int) -> np.ndarray:
+        """Gray ``image`` downsampled ``level`` times with cv2.pyrDown, cached like ``gray()``."""
+        gray = self.gray(image)
+        if not self._pyramid or self._pyramid[0] is not gray:
+            self._pyramid = [gray]
+        while len(self._pyramid) <= level:
+            self._pyramid.append(cv2.pyrDown(self._pyramid[-1]))
+        return self._pyramid[level]
+
+    def as_dict(self) -> dict:
+        return {"channels": self.channels, "dtype": str(self.dtype), "binary": self.binary, "polarity": self.polarity}
+
+    def __repr__(self) -> str:
+        return f"ImageState({self.as_dict()})"
+
+
+def flip_polarity(polarity: Optional[str]) -> Optional[str]:
+    return {"dark": "light", "light": "dark"}.get(polarity)
+
+
+def to_gray(image: np.ndarray, state: Optional[ImageState] = None) -> np.ndarray:
+    """Gray version of a BGR or gray image, through the state's cache when a state is given."""
+    if state is not None:
+        return state.gray(image)
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def is_binary(gray: np.ndarray, state: Optional[ImageState] = None) -> bool:
+    """
+    True if a gray image holds exactly the values 0 and 255 (both present, nothing else).
+
+    Same answer as ``set(np.unique(gray)) == {0, 255}`` without sorting every pixel: when the
+    state already guarantees a 0/255-only image only the extremes are checked, otherwise a
+    single range count rules out intermediate values.
+    """
+    if gray.dtype != np.uint8:
+        vals = np.unique(gray)
+        return len(vals) == 2 and 0 in vals and 255 in vals
+    min_val, max_val, _, _ = cv2.minMaxLoc(gray)
+    if min_val != 0 or max_val != 255:
+        return False
+    if state is not None and state.binary:
+        return True
+    return cv2.countNonZero(cv2.inRange(gray, 1, 254)) == 0
+
+
+def next_state(steps, state: ImageState, image: np.ndarray, output: np.ndarray) -> ImageState:
+    """
+    State of ``output`` after running ``steps`` on an image in ``state``.
+
+    A step that handed back its input unchanged keeps the state (and its gray cache). Otherwise
+    the steps' ``output_state`` declarations are applied in turn; a step without one leaves
+    nothing known beyond the output's layout.
+    """
+    if output is image:
+        return state
+    derived = state
+    for step in steps:
+        facts = step.output_state(derived, dict(step.params)) if step.output_state else {}
+        derived = ImageState(derived.channels, derived.dtype, **facts)
+    logging.debug(f"State after {[step.name for step in steps]}: binary={derived.binary}, polarity={derived.polarity}")
+    return ImageState.of(output, binary=derived.binary, polarity=derived.polarity)
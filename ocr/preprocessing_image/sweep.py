@@ -0,0 +1,218 @@
+"""
+Parameter sweeps that share common step prefixes across configs.
+
+A sweep runs several step configurations over the same images. The configurations are
+merged into a prefix tree keyed by (step name, params), so a prefix shared by several
+configs (e.g. grayscale -> gaussian_blur before different adaptive_threshold block sizes)
+is computed once per image and only the diverging suffixes run separately. Each config
+gets its own result table (and output images) under ``output/sweep/<config name>/``.
+
+Every config's plan is built from the base config with its own steps, so the base
+config's other settings (fusion, tiling, decoding, output format) apply as they would in
+``run_pipeline``: the tree's nodes are the plans' stages, images are decoded once per
+distinct set of decode flags the plans ask for, and outputs are written in the plan's
+output format.
+
+Sweep spec (YAML)::
+
+    configs:                 # explicit step lists, each with a name
+      - name: otsu
+        steps: [...]
+    grid:                    # and/or a grid of overrides applied to the base config's steps
+      adaptive_threshold.block_size: [11, 15, 21]
+      adaptive_threshold.C: [2, 5]
+"""
+
+import os
+import re
+import copy
+import json
+import logging
+import itertools
+
+import cv2
+
+from preprocessing_image.pipeline import apply_stage
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.sources import make_source, prefetch
+from preprocessing_image.state import ImageState
+from preprocessing_image.utils import update_result_yaml
+
+
+def expand_grid(steps: list, grid: dict) -> list:
+    """
+    Expand a grid of ``"<step>.<param>": [values]`` overrides into named step lists.
+
+    Returns:
+        list: ``(name, steps)`` pairs, one per combination, in grid order.
+    """
+    keys = list(grid)
+    for key in keys:
+        if "." not in key:
+            raise ValueError(f"Sweep grid key must be '<step>.<param>': {key}")
+        step_name = key.split(".", 1)[0]
+        if not any(step.get("name") == step_name for step in steps):
+            raise ValueError(f"Sweep grid refers to unknown step: {step_name}")
+    configs = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        variant = copy.deepcopy(steps)
+        for key, value in zip(keys, values):
+            step_name, param = key.split(".", 1)
+            for step in variant:
+                if step.get("name") == step_name:
+                    step.setdefault("params", {})[param] = value
+        name = ",".join(f"{key}={value}" for key, value in zip(keys, values))
+        configs.append((name, variant))
+    return configs
+
+
+def sweep_configs(base_config: dict, spec: dict) -> list:
+    """Collect the named step lists of a sweep spec: its explicit ``configs`` followed by its ``grid``."""
+    configs = [(entry["name"], entry["steps"]) for entry in spec.get("configs", []) or []]
+    if spec.get("grid"):
+        configs.extend(expand_grid(base_config.get("steps", []), spec["grid"]))
+    if not configs:
+        raise ValueError("Sweep spec defines no configs.")
+    names = [name for name, _ in configs]
+    if len(set(names)) != len(names):
+        raise ValueError("Sweep config names must be unique.")
+    return configs
+
+
+class _Node:
+    """A prefix-tree node: one plan stage shared by every config whose plan passes through it."""
+
+    def __init__(self, stage=None):
+        self.stage = stage
+        self.children = {}
+        self.configs = []  # configs whose plan ends at this node
+
+
+def build_prefix_tree(plans: dict) -> _Node:
+    """Merge named PipelinePlans into a prefix tree of their stages, keyed by (step name, params) per step."""
+    root = _Node()
+    for config_name, plan in plans.items():
+        node = root
+        for stage in plan.stages():
+            key = tuple((step.name, json.dumps(step.params, sort_keys=True, default=str)) for step in stage)
+            if key not in node.children:
+                node.children[key] = _Node(stage)
+            node = node.children[key]
+        node.configs.append(config_name)
+    return root
+
+
+def _count_steps(node: _Node) -> int:
+    return sum(len(child.stage) + _count_steps(child) for child in node.children.values())
+
+
+def _config_names(node: _Node) -> list:
+    names = list(node.configs)
+    for child in node.children.values():
+        names.extend(_config_names(child))
+    return names
+
+
+def run_tree(root: _Node, image, tiler=None) -> dict:
+    """
+    Run every config of the tree on one image, computing shared prefixes once.
+
+    Returns:
+        dict: ``{config name: (final image, {step: validation result}, its ImageState)}``.
+    """
+    outcomes = {}
+
+    def visit(node, image, state, results):
+        for config_name in node.configs:
+            outcomes[config_name] = (image, results, state)
+        for child in node.children.values():
+            output_img, stage_results, output_state = apply_stage(child.stage, image, state, tiler)
+            child_results = dict(results)
+            child_results.update(stage_results)
+            if output_img is None:
+                # A step failed: every config below this node stops here, keeping the last good image
+                for config_name in _config_names(child):
+                    outcomes[config_name] = (image, child_results, state)
+                continue
+            visit(child, output_img, output_state, child_results)
+
+    visit(root, image, ImageState.of(image), {})
+    return outcomes
+
+
+def _decoded_groups(plans: dict, path: str) -> list:
+    """
+    Decode the image at ``path`` once per distinct set of decode flags the plans ask for.
+
+    Returns:
+        list: ``(image, [config names])`` pairs; the image is None if it could not be decoded.
+    """
+    groups = {}
+    for config_name, plan in plans.items():
+        groups.setdefault(plan.decoder.flags(path), []).append(config_name)
+    return [(cv2.imread(path, flags), names) for flags, names in groups.items()]
+
+
+def _safe_dir_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._=,-]+", "_", name)
+
+
+def run_sweep(image_dir: str, config: dict, spec: dict) -> dict:
+    """
+    Run every config of a sweep spec over the images of ``image_dir``.
+
+    ``config`` supplies the base steps (for grid sweeps), the image source and the settings
+    every config's plan is built with. With
+    ``save_images`` (default true) in the spec, each config's final images are saved
+    next to its result table.
+
+    Returns:
+        dict: ``{config name: {image name: {step: validation result}}}``.
+    """
+    configs = sweep_configs(config, spec)
+    # Each config's steps in the base config, so its other settings apply as in run_pipeline
+    plans = {name: PipelinePlan.from_config(dict(config, steps=steps)) for name, steps in configs}
+    trees = {}  # config names decoded alike -> their prefix tree
+    tree = trees[tuple(plans)] = build_prefix_tree(plans)
+    total_steps = sum(len(plan) for plan in plans.values())
+    logging.info(f"Sweep of {len(plans)} configs runs {_count_steps(tree)} steps per image instead of {total_steps}.")
+
+    output_dir = os.path.join(image_dir, "output")
+    sweep_dir = os.path.join(output_dir, "sweep")
+    config_dirs = {name: os.path.join(sweep_dir, _safe_dir_name(name)) for name in plans}
+    save_images = spec.get("save_images", True)
+    tables = {name: {} for name in plans}
+
+    source = make_source(image_dir, config, exclude=[output_dir])
+    tiler = next(iter(plans.values())).tiler
+    for image_name, groups in prefetch(source, reader=lambda path: _decoded_groups(plans, path), workers=2, depth=4):
+        logging.info(f"Sweeping image: {image_name}")
+        for img, names in groups:
+            if img is None:
+                logging.error(f"Failed to read image: {source.path(image_name)}")
+                continue
+            key = tuple(names)
+            if key not in trees:
+                trees[key] = build_prefix_tree({name: plans[name] for name in names})
+            try:
+                outcomes = run_tree(trees[key], img, tiler)
+            except Exception as e:
+                logging.exception(f"Sweep error processing image {image_name}: {e}")
+                continue
+            for config_name, (final_img, results, state) in outcomes.items():
+                results = dict(results)
+                if save_images:
+                    output = plans[config_name].output
+                    path = output.path_for(os.path.join(config_dirs[config_name], image_name))
+                    try:
+                        output.write(final_img, path, binary=state.binary and state.channels == 1)
+                    except Exception as e:
+                        logging.error(f"Failed to save image {path}: {e}")
+                        results["output"] = {"status": "failure", "error": str(e)}
+                tables[config_name][image_name] = results
+
+    for config_name, table in tables.items():
+        os.makedirs(config_dirs[config_name], exist_ok=True)
+        update_result_yaml(table, os.path.join(config_dirs[config_name], "result.yaml"))
+    logging.info(f"Sweep completed. Results saved under {sweep_dir}")
+    return tables
@@ -0,0 +1,116 @@
+"""
+Binary thinning (Zhang-Suen and Guo-Hall) with neighborhood lookup tables.
+
+Both algorithms repeatedly peel deletable boundary pixels off the foreground in two
+alternating sub-iterations until nothing changes, leaving a connected skeleton one pixel
+wide. Whether a pixel is deletable depends only on its 8 neighbours, so each
+sub-iteration is three whole-image OpenCV calls:
+
+* ``cv2.filter2D`` with power-of-two weights encodes every pixel's neighbourhood as a
+  byte (bit k set when neighbour P(k+2) is foreground, going clockwise from north),
+* ``cv2.LUT`` maps that byte to "delete" through a 256-entry table built once per
+  algorithm and sub-iteration, and
+* the marked pixels are cleared.
+
+All of it runs in buffers allocated once per image, covering only the foreground's
+bounding box. ``cv2.ximgproc.thinning`` (OpenCV contrib) implements the same algorithms
+and can be used instead; both see the image padded with one background pixel, so the
+results are identical, but the lookup-table passes are several times faster.
+"""
+
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+ZHANG_SUEN = "zhangsuen"
+GUO_HALL = "guohall"
+METHODS = (ZHANG_SUEN, GUO_HALL)
+
+# Neighbourhood code weights: P2 (north) = bit 0, then clockwise to P9 (north-west) = bit 7
+_CODE_KERNEL = np.array([[128, 1, 2],
+                         [64, 0, 4],
+                         [32, 16, 8]], dtype=np.float32)
+
+
+def _zhang_suen_deletable(p, sub: int) -> bool:
+    p2, p3, p4, p5, p6, p7, p8, p9 = p
+    ring = (p2, p3, p4, p5, p6, p7, p8, p9, p2)
+    transitions = sum(1 for a, b in zip(ring, ring[1:]) if not a and b)
+    neighbours = sum(p)
+    if sub == 0:
+        m1, m2 = p2 and p4 and p6, p4 and p6 and p8
+    else:
+        m1, m2 = p2 and p4 and p8, p2 and p6 and p8
+    return transitions == 1 and 2 <= neighbours <= 6 and not m1 and not m2
+
+
+def _guo_hall_deletable(p, sub: int) -> bool:
+    p2, p3, p4, p5, p6, p7, p8, p9 = p
+    c = ((not p2 and (p3 or p4)) + (not p4 and (p5 or p6)) +
+         (not p6 and (p7 or p8)) + (not p8 and (p9 or p2)))
+    n1 = bool(p9 or p2) + bool(p3 or p4) + bool(p5 or p6) + bool(p7 or p8)
+    n2 = bool(p2 or p3) + bool(p4 or p5) + bool(p6 or p7) + bool(p8 or p9)
+    n = min(n1, n2)
+    m = ((p6 or p7 or not p9) and p8) if sub == 0 else ((p2 or p3 or not p5) and p4)
+    return c == 1 and 2 <= n <= 3 and not m
+
+
+@lru_cache(maxsize=None)
+def deletion_table(method: str, sub: int) -> np.ndarray:
+    """256-entry table: 1 where a foreground pixel with that neighbourhood code is deleted in sub-iteration ``sub``."""
+    rule = _zhang_suen_deletable if method == ZHANG_SUEN else _guo_hall_deletable
+    table = np.zeros(256, dtype=np.uint8)
+    for code in range(256):
+        table[code] = rule(tuple((code >> k) & 1 for k in range(8)), sub)
+    table.flags.writeable = False
+    return table
+
+
+def has_ximgproc() -> bool:
+    return hasattr(cv2, "ximgproc") and hasattr(cv2.ximgproc, "thinning")
+
+
+def thin(foreground: np.ndarray, method: str = ZHANG_SUEN, use_ximgproc: bool = False) -> np.ndarray:
+    """
+    Skeleton of a binary image.
+
+    Args:
+        foreground (np.ndarray): uint8 image, foreground nonzero.
+        method (str): "zhangsuen" or "guohall".
+        use_ximgproc (bool): Use cv2.ximgproc.thinning when OpenCV contrib is installed.
+
+    Returns:
+        np.ndarray: uint8 skeleton, foreground 255, same shape as the input.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Invalid thinning method: {method}. Use one of {METHODS}.")
+    skeleton = np.zeros(foreground.shape, dtype=np.uint8)
+    # Only the foreground's bounding box can change (page margins are skipped)
+    x, y, w, h = cv2.boundingRect(foreground)
+    if w == 0 or h == 0:
+        return skeleton
+    # One background pixel around it, so pixels on the image border are thinned like any other
+    padded = cv2.copyMakeBorder(foreground[y:y + h, x:x + w], 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    if use_ximgproc and has_ximgproc():
+        kind = cv2.ximgproc.THINNING_ZHANGSUEN if method == ZHANG_SUEN else cv2.ximgproc.THINNING_GUOHALL
+        thinned = cv2.ximgproc.thinning(cv2.threshold(padded, 0, 255, cv2.THRESH_BINARY)[1], thinningType=kind)
+        skeleton[y:y + h, x:x + w] = thinned[1:-1, 1:-1]
+        return skeleton
+
+    img = cv2.threshold(padded, 0, 1, cv2.THRESH_BINARY)[1]
+    code = np.empty_like(img)
+    marker = np.empty_like(img)
+    tables = (deletion_table(method, 0), deletion_table(method, 1))
+    while True:
+        changed = 0
+        for table in tables:
+            cv2.filter2D(img, -1, _CODE_KERNEL, dst=code, borderType=cv2.BORDER_CONSTANT)
+            cv2.LUT(code, table, dst=marker)
+            cv2.bitwise_and(marker, img, dst=marker)
+            cv2.subtract(img, marker, dst=img)
+            changed += cv2.countNonZero(marker)
+        if changed == 0:
+            break
+    cv2.multiply(img[1:-1, 1:-1], 255, dst=skeleton[y:y + h, x:x + w])
+    return skeleton
@@ -0,0 +1,107 @@
+"""
+Tiled execution of neighborhood steps on large images.
+
+A neighborhood step (blur, morphology, sharpen, adaptive threshold; see registry.py)
+computes each output pixel from input pixels within its declared ``radius``. Such a step
+can run on overlapping tiles: each tile is cut out with a halo of ``radius`` pixels on
+every side that has a neighbour, processed on its own, and only its centre is copied
+into the output. Halos are clipped at the image edges, so pixels near the true border
+see the same border handling as a whole-image run and the stitched output is
+bit-identical to it.
+
+Tiles run on a thread pool (OpenCV releases the GIL), and each worker only holds a
+tile-sized working set instead of the step's whole-image temporaries.
+
+Steps whose params depend on the whole image (e.g. dilate's kernel bump for near-empty
+images) declare a ``tile_params(image, params)`` hook that resolves them once on the
+full image, so every tile runs with the same params.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from preprocessing_image.registry import NEIGHBORHOOD
+
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_MIN_PIXELS = 16_000_000
+DEFAULT_WORKERS = 4
+
+Window = Tuple[slice, slice]
+
+
+def tile_windows(height: int, width: int, tile_size: int, radius: int) -> Iterator[Tuple[Window, Window, Window]]:
+    """
+    Yield ``(tile, halo, inner)`` windows covering an image.
+
+    ``tile`` is the part of the output a tile produces, ``halo`` the (edge-clipped) input
+    region it is computed from, and ``inner`` where ``tile`` lies inside ``halo``.
+    """
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        hy0, hy1 = max(y0 - radius, 0), min(y1 + radius, height)
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            hx0, hx1 = max(x0 - radius, 0), min(x1 + radius, width)
+            yield ((slice(y0, y1), slice(x0, x1)),
+                   (slice(hy0, hy1), slice(hx0, hx1)),
+                   (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0)))
+
+
+class TiledExecutor:
+    """
+    Runs neighborhood steps tile by tile with a halo overlap.
+
+    Only images of at least ``min_pixels`` pixels are tiled; smaller ones are cheaper to
+    run whole. ``workers`` threads process ``tile_size`` x ``tile_size`` tiles.
+    """
+
+    def __init__(self, tile_size: int = DEFAULT_TILE_SIZE, min_pixels: int = DEFAULT_MIN_PIXELS,
+                 workers: int = DEFAULT_WORKERS):
+        if tile_size <= 0:
+            raise ValueError(f"Tile size must be positive, got {tile_size}")
+        self.tile_size = int(tile_size)
+        self.min_pixels = int(min_pixels)
+        self.workers = max(1, int(workers))
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["TiledExecutor"]:
+        """TiledExecutor for ``tiling.enabled``, otherwise None."""
+        tiling_cfg = config.get("tiling") or {}
+        if not tiling_cfg.get("enabled", False):
+            return None
+        return cls(tiling_cfg.get("tile_size", DEFAULT_TILE_SIZE),
+                   tiling_cfg.get("min_pixels", DEFAULT_MIN_PIXELS),
+                   tiling_cfg.get("workers", DEFAULT_WORKERS))
+
+    def applies(self, step, image: np.ndarray, params: dict) -> bool:
+        """Whether ``step`` should run tiled on ``image``."""
+        if step.spec.kind_for(params) != NEIGHBORHOOD or image.ndim not in (2, 3):
+            return False
+        height, width = image.shape[:2]
+        return height * width >= self.min_pixels and (height > self.tile_size or width > self.tile_size)
+
+    def run(self, step, image: np.ndarray, params: dict) -> np.ndarray:
+        """Run ``step`` over the tiles of ``image`` and stitch the tiles' centres into one output."""
+        if step.tile_params is not None:
+            params = step.tile_params(image, params)
+        radius = step.spec.radius_for(params)
+        height, width = image.shape[:2]
+        windows = list(tile_windows(height, width, self.tile_size, radius))
+        logging.info(f"Running step '{step.name}' on {len(windows)} tiles of {self.tile_size}px with a {radius}px halo")
+
+        def run_tile(halo: Window, inner: Window) -> np.ndarray:
+            # Each tile gets its own params copy, as each image does
+            return step.run(image[halo], dict(params))[inner]
+
+        output = None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(run_tile, halo, inner): tile for tile, halo, inner in windows}
+            for future in as_completed(futures):
+                tile_out = future.result()
+                if output is None:
+                    output = np.empty((height, width) + tile_out.shape[2:], dtype=tile_out.dtype)
+                output[futures.pop(future)] = tile_out
+        return output
@@ -2,6 +2,7 @@ import os
 import cv2
 import yaml
 import logging
+from preprocessing_image.packed import PackedBinary, write_bilevel
 
 def load_config(config_path: str) -> dict:
     """Load YAML configuration file."""
@@ -9,12 +10,15 @@ def load_config(config_path: str) -> dict:
         config = yaml.safe_load(f)
     return config
 
-def save_image(image, path: str) -> None:
-    """Save an image to disk."""
+def save_image(image, path: str, bilevel: bool = False) -> None:
+    """Save an image (an array or a PackedBinary) to disk; ``bilevel`` writes a binary image one bit per pixel."""
     try:
         # Create directories if they don't exist
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        cv2.imwrite(path, image)
+        if bilevel:
+            write_bilevel(path, image)
+        else:
+            cv2.imwrite(path, image.unpack() if isinstance(image, PackedBinary) else image)
         logging.debug(f"Image saved to {path}")
     except Exception as e:
         logging.error(f"Failed to save image {path}: {e}")
@@ -23,6 +23,8 @@ def validate(input_image: np.ndarray, output_image: np.ndarray, params: dict) ->
         else:
             result["metrics"]["detected_angle"] = round(float(angle), 2)
             result["status"] = "success"
+            if "proxy_error" in params:
+                result["metrics"]["proxy_error"] = round(float(params["proxy_error"]), 3)
             logging.info(f"Deskew validation passed. Angle detected: {angle:.2f} degrees.")
 
     except Exception as e:
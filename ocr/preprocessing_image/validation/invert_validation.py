@@ -24,3 +24,15 @@ def validate(input_image: np.ndarray, output_image: np.ndarray, params: dict) ->
         result["status"] = "failure"
         logging.exception(f"Invert validation exception: {e}")
     return result
+
+
+def validate_histogram(input_hist: np.ndarray, output_hist: np.ndarray, params: dict) -> dict:
+    """Validate inversion from intensity histograms (used when the step ran fused into a lookup table)."""
+    result = {"step": "invert", "status": "", "metrics": {}}
+    if np.array_equal(output_hist, input_hist[::-1]):
+        result["status"] = "success"
+        logging.info("Invert validation passed: output is exact inversion of input.")
+    else:
+        result["status"] = "failure"
+        logging.error("Invert validation failed: output is not the exact inverse of input.")
+    return result
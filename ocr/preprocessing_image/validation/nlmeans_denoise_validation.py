@@ -14,6 +14,9 @@ def validate(input_image: np.ndarray, output_image: np.ndarray, params: dict) ->
         out_var = float(cv2.Laplacian(output_image, cv2.CV_64F).var())
         result["metrics"]["laplacian_var_before"] = round(in_var, 2)
         result["metrics"]["laplacian_var_after"] = round(out_var, 2)
+        for key in ("noise_sigma", "denoise_action", "applied_h"):
+            if key in params:
+                result["metrics"][key] = params[key]
         if out_var <= in_var:
             result["status"] = "success"
             logging.info("NLMeans denoising validation passed (Laplacian variance reduced).")
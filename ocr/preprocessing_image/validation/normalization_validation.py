@@ -7,10 +7,27 @@ import logging
 
 def validate(input_image: np.ndarray, output_image: np.ndarray, params: dict) -> dict:
     """Validate normalization step by checking intensity range."""
+    def bounds():
+        if output_image.size > 0:
+            return int(output_image.min()), int(output_image.max())
+        return None, None
+    return _validate_range(bounds, params)
+
+
+def validate_histogram(input_hist: np.ndarray, output_hist: np.ndarray, params: dict) -> dict:
+    """Validate normalization from intensity histograms (used when the step ran fused into a lookup table)."""
+    def bounds():
+        present = np.flatnonzero(output_hist)
+        if present.size > 0:
+            return int(present[0]), int(present[-1])
+        return None, None
+    return _validate_range(bounds, params)
+
+
+def _validate_range(bounds, params: dict) -> dict:
     result = {"step": "normalization", "status": "", "metrics": {}}
     try:
-        out_min = int(output_image.min()) if output_image.size > 0 else None
-        out_max = int(output_image.max()) if output_image.size > 0 else None
+        out_min, out_max = bounds()
         result["metrics"]["min_val"] = out_min
         result["metrics"]["max_val"] = out_max
         alpha = params.get("alpha", 0)
@@ -14,6 +14,8 @@ def validate(input_image: np.ndarray, output_image: np.ndarray, params: dict) ->
         out_pixels = int(np.sum(output_image == 0))
         removed_pixels = in_pixels - out_pixels
         result["metrics"]["removed_pixels"] = removed_pixels if removed_pixels > 0 else 0
+        if "removed_components" in params:
+            result["metrics"]["removed_components"] = int(params["removed_components"])
         if removed_pixels >= 0:
             result["status"] = "success"
             logging.info(f"Remove small components validation passed. Pixels removed: {removed_pixels}.")
@@ -7,15 +7,26 @@ import logging
 
 def validate(input_image: np.ndarray, output_image: np.ndarray, params: dict) -> dict:
     """Validate thresholding by checking resulting binary values and ratio of foreground."""
+    return _validate_values(lambda: np.unique(output_image), lambda: int(np.sum(output_image == 0)),
+                            lambda: output_image.size)
+
+
+def validate_histogram(input_hist: np.ndarray, output_hist: np.ndarray, params: dict) -> dict:
+    """Validate thresholding from intensity histograms (used when the step ran fused into a lookup table)."""
+    return _validate_values(lambda: np.flatnonzero(output_hist), lambda: int(output_hist[0]),
+                            lambda: int(output_hist.sum()))
+
+
+def _validate_values(unique_values, count_black, total_size) -> dict:
     result = {"step": "threshold", "status": "", "metrics": {}}
     try:
-        unique_vals = np.unique(output_image)
+        unique_vals = unique_values()
         # Check that output is binary (only 0 and 255 values)
         is_binary = all(val in [0, 255] for val in unique_vals)
         if is_binary:
             result["status"] = "success"
-            total_pixels = output_image.size
-            black_pixels = int(np.sum(output_image == 0))
+            black_pixels = count_black()
+            total_pixels = total_size()
             percent_black = (black_pixels / total_pixels) * 100 if total_pixels > 0 else 0
             result["metrics"]["black_pixels_percent"] = round(percent_black, 2)
             logging.info(f"Threshold validation passed. Black pixel percentage: {percent_black:.2f}%.")
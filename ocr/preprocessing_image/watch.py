@@ -0,0 +1,92 @@
+"""
+Watch-folder mode: keep a run open and process scans as they arrive.
+
+With ``watch.enabled`` (``run_preprocessing.py --watch``) the run does not end when the
+source is exhausted. ``FolderWatcher`` re-lists the configured source every ``interval``
+seconds and hands each batch of newly complete images to the pipeline, which processes
+them with the same plan, sink, journal and metrics as the rest of the run; the sink is
+flushed after every batch, so results show up seconds after a scan lands.
+
+A file counts as complete once its size and mtime are unchanged since the previous poll
+and it has not been modified for ``settle`` seconds (or has been seen unchanged that long,
+for shares whose clock runs ahead); files already older than that when first listed (the
+backlog at startup) are taken at once. Empty files are never complete. Scanners and copies
+onto network shares write files in place, and inotify reports neither when such a write is
+finished nor, on most network filesystems, anything at all, so the watcher polls. Each image is handed over once per
+run; with the journal enabled (``--watch`` turns it on), a restarted watch skips the
+images processed before it stopped.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Iterator, List, Optional
+
+from preprocessing_image.sources import ImageSource, ManifestSource
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_SETTLE = 2.0
+
+
+class FolderWatcher:
+    """Polls an image source and yields the images that have become complete since the last poll."""
+
+    def __init__(self, source: ImageSource, interval: float = DEFAULT_INTERVAL, settle: float = DEFAULT_SETTLE):
+        if isinstance(source, ManifestSource):
+            raise ValueError("Watch mode needs a directory or glob source, not a manifest.")
+        self.source = source
+        self.interval = interval
+        self.settle = settle
+        self._handed = set()   # images already handed to the pipeline
+        self._stats = {}       # image -> ((size, mtime_ns), monotonic time first seen with that stat)
+
+    @classmethod
+    def from_config(cls, config: dict, source: ImageSource) -> Optional["FolderWatcher"]:
+        """FolderWatcher for ``watch.enabled``, otherwise None."""
+        watch_cfg = config.get("watch") or {}
+        if not watch_cfg.get("enabled", False):
+            return None
+        return cls(source, interval=float(watch_cfg.get("interval", DEFAULT_INTERVAL)),
+                   settle=float(watch_cfg.get("settle", DEFAULT_SETTLE)))
+
+    def poll(self) -> List[str]:
+        """The images that have become complete since the last poll, in source order."""
+        now, wall = time.monotonic(), time.time()
+        ready = []
+        for name in self.source:
+            if name in self._handed:
+                continue
+            try:
+                st = os.stat(self.source.path(name))
+            except OSError:
+                self._stats.pop(name, None)  # removed or renamed since listed
+                continue
+            stat = (st.st_size, st.st_mtime_ns)
+            previous = self._stats.get(name)
+            if previous is None or previous[0] != stat:
+                self._stats[name] = (stat, now)
+                # Only a file written long enough ago is taken on first sight (e.g. the backlog at startup)
+                if previous is not None or wall - st.st_mtime < self.settle:
+                    continue
+            elif wall - st.st_mtime < self.settle and now - previous[1] < self.settle:
+                continue
+            if st.st_size == 0:
+                continue
+            del self._stats[name]
+            self._handed.add(name)
+            ready.append(name)
+        return ready
+
+    def batches(self, stop: Optional[threading.Event] = None) -> Iterator[List[str]]:
+        """Yield each poll's non-empty batch of complete images until ``stop`` is set."""
+        stop = stop or threading.Event()
+        logging.info(f"Watching {self.source.root} for new images every {self.interval} s.")
+        while not stop.is_set():
+            started = time.monotonic()
+            batch = self.poll()
+            if batch:
+                logging.info(f"{len(batch)} new image(s) to process.")
+                yield batch
+            stop.wait(max(self.interval - (time.monotonic() - started), 0))
+        logging.info("Stopped watching.")
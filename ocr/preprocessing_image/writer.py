@@ -0,0 +1,182 @@
+"""
+Output images: the format they are written in, and writing them off the processing thread.
+
+Encoding can cost more than the preprocessing itself (PNG's zlib especially), so with a
+single worker process the final and intermediate images are handed to an ``ImageWriter``
+that encodes them on a small thread pool while the next image is processed. OpenCV and
+zlib release the GIL while encoding. At most ``depth`` images wait to be written; beyond
+that the processing thread waits, so memory stays bounded. Images handed to the writer
+must not be modified afterwards (no step writes into its input).
+
+The ``output`` config section picks the format (``OutputFormat``):
+
+* ``same`` (default): the input's extension, written with OpenCV's default settings,
+* ``png`` with ``png_compression`` 0-9 (zlib level; lower is faster and larger),
+* ``webp``, lossless,
+* ``tiff``: binary images as 1-bit CCITT Group 4, others deflate-compressed,
+* ``npy``: the raw array with ``np.save``, no encoding at all.
+
+With ``binary.bilevel_output``, binary images are written one bit per pixel in any format
+that has a bilevel encoding (see packed.py). A failed write is logged and recorded as the
+image's ``output`` result, so the image counts as failed and is not journaled.
+"""
+
+import io
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from preprocessing_image.packed import PackedBinary, encode_bilevel
+
+FORMATS = ("same", "png", "webp", "tiff", "npy")
+EXTENSIONS = {"png": ".png", "webp": ".webp", "tiff": ".tif", "npy": ".npy"}
+DEFAULT_WORKERS = 2
+DEFAULT_DEPTH = 8
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    """How output images are encoded; picklable, so worker processes write the same way."""
+    format: str = "same"
+    png_compression: Optional[int] = None
+    bilevel: bool = False
+
+    def __post_init__(self):
+        if self.format not in FORMATS:
+            raise ValueError(f"Invalid output format: {self.format}. Use one of {FORMATS}.")
+
+    @classmethod
+    def from_config(cls, config: dict) -> "OutputFormat":
+        """Format for the ``output`` config section, with ``binary.bilevel_output``."""
+        output_cfg = config.get("output") or {}
+        binary_cfg = config.get("binary") or {}
+        level = output_cfg.get("png_compression")
+        return cls(format=str(output_cfg.get("format", "same")).lower(),
+                   png_compression=None if level is None else int(level),
+                   bilevel=bool(binary_cfg.get("bilevel_output", False)))
+
+    def path_for(self, path: str) -> str:
+        """``path`` with the extension of this format."""
+        if self.format == "same":
+            return path
+        return os.path.splitext(path)[0] + EXTENSIONS[self.format]
+
+    def encode(self, image, extension: str, binary: bool = False) -> bytes:
+        """
+        ``image`` (an array or a PackedBinary) encoded as a file with ``extension``. ``binary``
+        marks a single-channel image known to hold only 0 and 255.
+
+        Raises:
+            OSError: If the image could not be encoded.
+        """
+        if binary and (self.bilevel or self.format == "tiff"):
+            data = encode_bilevel(image, extension)
+            if data is not None:
+                return data
+        plane = image.unpack() if isinstance(image, PackedBinary) else image
+        if extension.lower() == ".npy":
+            buffer = io.BytesIO()
+            np.save(buffer, plane)
+            return buffer.getvalue()
+        ok, buffer = cv2.imencode(extension, plane, self._params())
+        if not ok:
+            raise OSError(f"cv2.imencode could not encode a {extension} image")
+        return buffer.tobytes()
+
+    def write(self, image, path: str, binary: bool = False) -> None:
+        """Encode ``image`` to ``path`` (see ``encode``). Raises OSError if it could not be written."""
+        data = self.encode(image, os.path.splitext(path)[1], binary)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _params(self) -> list:
+        if self.format == "png" and self.png_compression is not None:
+            return [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        if self.format == "webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, 101]  # above 100 is lossless
+        if self.format == "tiff":
+            return [cv2.IMWRITE_TIFF_COMPRESSION, 8]  # deflate
+        return []
+
+
+class ImageWriter:
+    """
+    Writes images in an OutputFormat, on ``workers`` background threads (0: on the caller's).
+
+    Writes are grouped by a key (the image name); ``done(key)`` and ``result(key)`` tell
+    when all of an image's writes have finished and whether any of them failed.
+    """
+
+    def __init__(self, output: OutputFormat, workers: int = DEFAULT_WORKERS, depth: int = DEFAULT_DEPTH):
+        self.output = output
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encode") if workers > 0 else None
+        self._slots = threading.BoundedSemaphore(max(1, depth))
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._errors = {}
+        self.failed = 0
+
+    @classmethod
+    def from_config(cls, config: dict, output: OutputFormat) -> "ImageWriter":
+        output_cfg = config.get("output") or {}
+        return cls(output, workers=int(output_cfg.get("workers", DEFAULT_WORKERS)),
+                   depth=int(output_cfg.get("depth", DEFAULT_DEPTH)))
+
+    def submit(self, key: str, image, path: str, binary: bool = False) -> str:
+        """Queue ``image`` to be written to ``path`` (its extension set by the format); returns the path written."""
+        path = self.output.path_for(path)
+        if self._pool is None:
+            self._write(key, image, path, binary)
+            return path
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._write, key, image, path, binary)
+        except BaseException:
+            # Not queued (e.g. the pool was shut down): the slot would otherwise never be released
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.setdefault(key, []).append(future)
+        return path
+
+    def _write(self, key: str, image, path: str, binary: bool) -> None:
+        try:
+            self.output.write(image, path, binary)
+            logging.debug(f"Image saved to {path}")
+        except Exception as e:
+            logging.error(f"Failed to save image {path}: {e}")
+            with self._lock:
+                self._errors.setdefault(key, []).append(f"{os.path.basename(path)}: {e}")
+                self.failed += 1
+
+    def done(self, key: str) -> bool:
+        """Whether every write queued under ``key`` has finished."""
+        return all(future.done() for future in self._pending.get(key, ()))
+
+    def result(self, key: str) -> Optional[dict]:
+        """Wait for the writes queued under ``key``; a failure result if any of them failed, else None."""
+        for future in self._pending.pop(key, ()):
+            future.result()
+        with self._lock:
+            errors = self._errors.pop(key, None)
+        if errors:
+            return {"status": "failure", "error": "; ".join(errors)}
+        return None
+
+    def close(self) -> None:
+        """Wait for every queued write."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
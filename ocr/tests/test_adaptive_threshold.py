@@ -1,3 +1,4 @@
+import cv2
 import numpy as np
 import pytest
 from preprocessing_image.scripts.adaptive_threshold import preprocess as adaptive_threshold_preprocess
@@ -103,3 +104,84 @@ def test_adaptive_threshold_validation_invalid_image_type():
 
     # Should fail due to invalid image type
     assert result["status"] == "failure"
+
+
+def stained_page(shape=(240, 320)):
+    """Faded text on a page with a left-to-right lighting gradient and a dark stain; returns (page, text mask)."""
+    page = np.full(shape, 200, dtype=np.uint8)
+    for i in range(4):
+        cv2.putText(page, "faded ink %d" % i, (10, 45 + 55 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 120, 2)
+    text = page < 200
+    page = cv2.subtract(page, np.tile(np.linspace(0, 70, shape[1]).astype(np.uint8), (shape[0], 1)))
+    stain = np.zeros(shape, dtype=np.uint8)
+    cv2.circle(stain, (220, 120), 70, 70, -1)
+    return cv2.subtract(page, stain), text
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("method", ["sauvola", "niblack", "wolf", "bradley"])
+def test_integral_methods_are_binary_and_validate(method):
+    img, _ = stained_page()
+    params = {"method": method, "block_size": 25}
+    output = adaptive_threshold_preprocess(img, params)
+    assert output.shape == img.shape and output.dtype == np.uint8
+    assert set(np.unique(output)).issubset({0, 255})
+    assert adaptive_threshold_validate(img, output, params)["status"] == "success"
+
+
+@pytest.mark.sanity
+def test_window_stats_match_brute_force():
+    from preprocessing_image.scripts.adaptive_threshold import window_stats
+    img = np.random.default_rng(5).integers(0, 256, (23, 31)).astype(np.uint8)
+    r = 4
+    for rows, mean, std in window_stats(img, 2 * r + 1):
+        for y in range(rows.start, rows.stop):
+            for x in range(img.shape[1]):
+                window = img[max(0, y - r):y + r + 1, max(0, x - r):x + r + 1].astype(float)
+                assert mean[y - rows.start, x] == pytest.approx(window.mean())
+                assert std[y - rows.start, x] == pytest.approx(window.std(), abs=1e-6)
+
+
+@pytest.mark.sanity
+def test_window_stats_exact_when_the_integral_wraps():
+    from preprocessing_image.scripts.adaptive_threshold import window_stats
+    # 9M near-white pixels: the int32 integral's totals pass 2**31 towards the bottom right
+    img = np.full((3000, 3000), 255, dtype=np.uint8)
+    img[:, ::2] = 253
+    assert cv2.integral(img, sdepth=cv2.CV_64F)[-1, -1] > 2 ** 31
+    *_, (rows, mean, std) = window_stats(img, 101)
+    assert rows.stop == 3000
+    # Away from the border every window holds 101 rows of 51 and 50 (or 50 and 51) of each value
+    assert np.all(mean[:-50, 100:-100:2] == (51 * 253 + 50 * 255) / 101)
+    assert np.all(mean[:-50, 101:-100:2] == (50 * 253 + 51 * 255) / 101)
+    assert np.allclose(std[:-50, 100:-100], 2 * np.sqrt(51 * 50) / 101)
+
+
+@pytest.mark.sanity
+def test_sauvola_separates_text_from_stain_and_gradient():
+    img, text = stained_page()
+    sauvola = adaptive_threshold_preprocess(img, {"method": "sauvola", "block_size": 31}) == 0
+    gaussian = adaptive_threshold_preprocess(img, {"method": "gaussian", "block_size": 31, "C": 2}) == 0
+
+    def errors(black):
+        return np.count_nonzero(black != text)
+
+    assert errors(sauvola) < errors(gaussian)
+    assert np.count_nonzero(sauvola & text) > 0.7 * np.count_nonzero(text)
+
+
+@pytest.mark.sanity
+def test_window_larger_than_image():
+    # Windows are clipped at the border, so a block larger than the image is valid
+    img, _ = stained_page()
+    output = adaptive_threshold_preprocess(img, {"method": "sauvola", "block_size": 1001})
+    assert set(np.unique(output)).issubset({0, 255})
+
+
+@pytest.mark.sanity
+def test_wolf_is_declared_global():
+    # Wolf needs whole-image statistics, so it must not be tiled
+    from preprocessing_image.registry import GLOBAL, NEIGHBORHOOD
+    from preprocessing_image.scripts.adaptive_threshold import SPEC
+    assert SPEC.kind_for({"method": "wolf"}) == GLOBAL
+    assert SPEC.kind_for({"method": "sauvola"}) == NEIGHBORHOOD
@@ -161,3 +161,87 @@ def test_crop_partial_param_height_missing():
     params = {"x": 10, "y": 10, "width": 20}
     output = preprocess(image, params)
     assert output.shape == (90, 20)
+
+
+def scanned_page(shape=(400, 300), border=True):
+    """Text block in the middle of a gray page, with black scanner bars on the left and bottom."""
+    import cv2
+    page = np.full(shape, 235, dtype=np.uint8)
+    for i in range(4):
+        cv2.putText(page, "line %d" % i, (90, 150 + 30 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 30, 2)
+    if border:
+        page[:, :12] = 10
+        page[-15:, :] = 20
+    return page
+
+
+@pytest.mark.preprocessing
+@pytest.mark.crop
+@pytest.mark.parametrize("proxy_level", [0, 1])
+def test_auto_crop_finds_content_and_rejects_scanner_edges(proxy_level):
+    from preprocessing_image.validation.crop_validation import validate
+    image = scanned_page()
+    params = {"mode": "auto", "padding": 5, "proxy_level": proxy_level}
+    output = preprocess(image, params)
+    x, y, width, height = params["crop_rect"]
+    # The scanner bars are gone and every text pixel is kept, within the padding
+    text = np.argwhere(image[:-15, 12:] < 200) + [0, 12]
+    assert x > 12 and y + height < 385
+    assert x <= text[:, 1].min() and y <= text[:, 0].min()
+    assert x + width > text[:, 1].max() and y + height > text[:, 0].max()
+    assert output.shape == (height, width)
+    result = validate(image, output, params)
+    assert result["status"] == "success" and result["metrics"]["removed_percent"] > 50
+
+
+@pytest.mark.preprocessing
+@pytest.mark.crop
+def test_auto_crop_inverted_page_and_padding():
+    image = scanned_page(border=False)
+    dark = {"mode": "auto", "padding": 0}
+    preprocess(image, dark)
+    inverted = {"mode": "auto", "padding": 0, "bg_threshold": 128}
+    preprocess(255 - image, inverted)
+    assert inverted["crop_rect"] == dark["crop_rect"]
+    padded = {"mode": "auto", "padding": 7}
+    preprocess(image, padded)
+    x, y, width, height = dark["crop_rect"]
+    assert padded["crop_rect"] == [x - 7, y - 7, width + 14, height + 14]
+
+
+@pytest.mark.preprocessing
+@pytest.mark.crop
+def test_auto_crop_blank_page_keeps_everything():
+    image = generate_sample_image(value=240)
+    params = {"mode": "auto", "bg_threshold": 200}
+    output = preprocess(image, params)
+    assert output.shape == image.shape and params["removed_percent"] == 0
+
+
+@pytest.mark.preprocessing
+@pytest.mark.crop
+def test_manual_crop_records_removed_percent():
+    params = {"x": 0, "y": 0, "width": 50, "height": 100}
+    preprocess(generate_sample_image(), params)
+    assert params["removed_percent"] == 50.0
+
+
+@pytest.mark.preprocessing
+@pytest.mark.crop
+def test_example_configs_crop(tmp_path):
+    import os
+    import cv2
+    from preprocessing_image.pipeline import process_image
+    from preprocessing_image.plan import PipelinePlan
+    from preprocessing_image.utils import load_config
+    config_dir = os.path.join(os.path.dirname(__file__), "..", "preprocessing_image", "configs")
+    cv2.imwrite(str(tmp_path / "page.png"), cv2.cvtColor(scanned_page(), cv2.COLOR_GRAY2BGR))
+    removed = {}
+    for name in ("base", "auto_crop"):
+        plan = PipelinePlan.from_config(load_config(os.path.join(config_dir, f"{name}.yaml")))
+        result = process_image(str(tmp_path), "page.png", plan, str(tmp_path / name))
+        assert result["crop"]["status"] == "success"
+        removed[name] = result["crop"]["metrics"]["removed_percent"]
+    # base.yaml keeps the whole page; the example cuts it to the content
+    assert removed["base"] == 0
+    assert removed["auto_crop"] > 50
@@ -0,0 +1,155 @@
+"""
+tests/test_decode.py
+
+Tests for decoding input images no larger than the plan's leading steps need.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.decode import discards_color, reduction
+from preprocessing_image.pipeline import apply_stage, process_image
+from preprocessing_image.plan import PipelinePlan
+
+GRAYSCALE = {"name": "grayscale", "params": {}}
+INVERT = {"name": "invert", "params": {}}
+
+
+def resize_to(width, upscale_only=False):
+    return {"name": "resize", "params": {"target_width": width, "upscale_only": upscale_only}}
+
+
+def color_page(height=880, width=640):
+    rng = np.random.default_rng(4)
+    page = np.full((height, width, 3), (225, 232, 238), dtype=np.uint8)
+    for i in range(14):
+        cv2.putText(page, "Line of text %d" % i, (40, 60 + 55 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (40, 30, 20), 2)
+    return cv2.add(page, rng.integers(0, 8, page.shape, dtype=np.uint8))
+
+
+@pytest.fixture
+def jpeg(tmp_path):
+    path = str(tmp_path / "page.jpg")
+    cv2.imwrite(path, color_page(), [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return path
+
+
+OPT_IN = {"grayscale": True, "reduced": True}
+
+
+def plan_for(*steps, **config):
+    return PipelinePlan.from_config(dict(config, steps=list(steps)))
+
+
+@pytest.mark.sanity
+def test_color_discarded():
+    plan = plan_for(GRAYSCALE, INVERT)
+    assert discards_color(plan.steps)
+    assert discards_color(plan_for({"name": "crop", "params": {"width": 10, "height": 10}}, GRAYSCALE).steps)
+    assert discards_color(plan_for({"name": "threshold", "params": {"method": "otsu"}}).steps)
+    assert not discards_color(plan_for(INVERT, GRAYSCALE).steps)
+    assert not discards_color(plan_for({"name": "gaussian_blur", "params": {}}, GRAYSCALE).steps)
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("width, factor", [(3000, 1), (1000, 2), (640, 2), (320, 4), (300, 8), (80, 8)])
+def test_reduction_keeps_the_resize_a_downscale(width, factor):
+    plan = plan_for(GRAYSCALE, INVERT, resize_to(width))
+    assert reduction(plan.steps, 2480, 3508) == factor
+
+
+@pytest.mark.sanity
+def test_no_reduction_before_resolution_dependent_steps():
+    assert reduction(plan_for(resize_to(300, upscale_only=True)).steps, 2480, 3508) == 1
+    assert reduction(plan_for({"name": "gaussian_blur", "params": {}}, resize_to(300)).steps, 2480, 3508) == 1
+    crop = {"name": "crop", "params": {"x": 10, "y": 10, "width": 2000, "height": 3000}}
+    assert reduction(plan_for(crop, resize_to(300)).steps, 2480, 3508) == 1
+
+
+@pytest.mark.sanity
+def test_flags(jpeg, tmp_path):
+    png = str(tmp_path / "page.png")
+    cv2.imwrite(png, color_page())
+    plan = plan_for(GRAYSCALE, resize_to(150), decode=OPT_IN)
+    assert plan.decoder.flags(jpeg) == cv2.IMREAD_REDUCED_GRAYSCALE_4 | cv2.IMREAD_IGNORE_ORIENTATION
+    assert plan.decoder.flags(png) == cv2.IMREAD_COLOR
+    assert plan_for(INVERT, resize_to(150), decode=OPT_IN).decoder.flags(jpeg) == \
+        cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION
+    # Off unless asked for
+    assert plan_for(GRAYSCALE, resize_to(150)).decoder.flags(jpeg) == cv2.IMREAD_COLOR
+    assert PipelinePlan(plan.steps).decoder.flags(jpeg) == cv2.IMREAD_COLOR
+
+
+def run_stages_of(plan, image):
+    state = None
+    for stage in plan.stages():
+        image, _, state = apply_stage(stage, image, state)
+    return image
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("width", [600, 300, 150])
+def test_default_decode_is_a_full_decode(jpeg, tmp_path, width):
+    steps = (GRAYSCALE, INVERT, resize_to(width))
+    plan = plan_for(*steps)
+    full = cv2.imread(jpeg)
+    assert np.array_equal(plan.decoder.read(jpeg), full)
+    assert np.array_equal(run_stages_of(plan, plan.decoder.read(jpeg)), run_stages_of(plan, full))
+    results = {}
+    for name, image in (("default", None), ("full", full)):
+        output_dir = tmp_path / name
+        output_dir.mkdir()
+        results[name] = process_image(str(tmp_path), "page.jpg", plan, str(output_dir), image=image)
+    assert results["default"] == results["full"]
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("width", [600, 300, 150])
+def test_opt_in_decode_keeps_the_output_layout(jpeg, tmp_path, width):
+    steps = (GRAYSCALE, INVERT, resize_to(width))
+    full, fast = plan_for(*steps), plan_for(*steps, decode=OPT_IN)
+    assert fast.decoder.flags(jpeg) != cv2.IMREAD_COLOR
+    assert run_stages_of(fast, fast.decoder.read(jpeg)).shape == run_stages_of(full, full.decoder.read(jpeg)).shape
+    # The same outcomes, but not the same pixels or metrics (see decode.py)
+    statuses = {}
+    for name, plan in (("full", full), ("fast", fast)):
+        output_dir = tmp_path / name
+        output_dir.mkdir()
+        results = process_image(str(tmp_path), "page.jpg", plan, str(output_dir))
+        statuses[name] = {step: result["status"] for step, result in results.items()}
+    assert statuses["fast"] == statuses["full"]
+
+
+@pytest.mark.sanity
+def test_exif_orientation_is_applied(tmp_path):
+    image_module = pytest.importorskip("PIL.Image")
+    page = color_page()
+    path = str(tmp_path / "rotated.jpg")
+    exif = image_module.Exif()
+    exif[0x0112] = 6  # stored landscape, displayed rotated 90 degrees clockwise
+    image_module.fromarray(cv2.cvtColor(cv2.rotate(page, cv2.ROTATE_90_COUNTERCLOCKWISE), cv2.COLOR_BGR2RGB)) \
+        .save(path, exif=exif, quality=92)
+    plan = plan_for(GRAYSCALE, resize_to(320), decode=OPT_IN)
+    assert plan.decoder.flags(path) == cv2.IMREAD_REDUCED_GRAYSCALE_2
+    decoded = plan.decoder.read(path)
+    assert decoded.shape == (440, 320)
+    stored = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_2 | cv2.IMREAD_IGNORE_ORIENTATION)
+    assert np.array_equal(decoded, cv2.rotate(stored, cv2.ROTATE_90_CLOCKWISE))
+
+
+@pytest.mark.sanity
+def test_decode_flags_change_the_journal_fingerprint():
+    steps = (GRAYSCALE, resize_to(150))
+    default = plan_for(*steps).fingerprint()
+    assert plan_for(*steps, decode=OPT_IN).fingerprint() != default
+    assert plan_for(*steps, decode={"grayscale": True}).fingerprint() != plan_for(*steps, decode=OPT_IN).fingerprint()
+    # Flags that cannot apply to these steps decode in full, like the default
+    unchanged = plan_for(INVERT, GRAYSCALE, decode={"grayscale": True})
+    assert unchanged.fingerprint() == plan_for(INVERT, GRAYSCALE).fingerprint()
+
+
+@pytest.mark.sanity
+def test_unreadable_file(tmp_path):
+    path = tmp_path / "broken.jpg"
+    path.write_bytes(b"not a jpeg")
+    assert plan_for(GRAYSCALE, resize_to(100), decode=OPT_IN).decoder.read(str(path)) is None
@@ -85,3 +85,52 @@ def test_multi_orientation_text():
     detected = abs(params.get("detected_angle", 0))
     assert detected < 10, f"Detected angle {detected}° should be near 0° for mixed orientations"
     assert output.shape == img.shape
+
+
+def rotated_text(angle):
+    img = np.full((600, 480), 255, dtype=np.uint8)
+    for i in range(10):
+        cv2.putText(img, "skewed text line %d" % i, (30, 60 + 50 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+    matrix = cv2.getRotationMatrix2D((240, 300), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (480, 600), borderValue=255)
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("method", ["minarearect", "projection", "hough"])
+def test_deskew_estimator_modes(method):
+    img = rotated_text(8)
+    params = {"method": method, "max_angle": 20}
+    output = deskew_preprocess(img, params)
+    assert abs(params["detected_angle"] + 8) < 1
+    assert output.shape == img.shape
+    assert deskew_validate(img, output, params)["status"] == "success"
+
+
+@pytest.mark.sanity
+def test_hough_proxy_level_is_capped():
+    # Dense, noisy text: at 1/4 scale the lines merge and Hough finds a spurious slope
+    img = np.full((1600, 1200), 255, dtype=np.uint8)
+    for i in range(62):
+        cv2.putText(img, "lorem ipsum dolor sit amet consectetur %d" % i, (40, 40 + 24 * i),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, 0, 1)
+    img = np.clip(img + np.random.default_rng(0).normal(0, 40, img.shape), 0, 255).astype(np.uint8)
+    params = {"method": "hough", "proxy_level": 2}
+    output = deskew_preprocess(img, params)
+    assert params["proxy_level"] == 1
+    assert abs(params["detected_angle"]) < 1
+    assert output is img
+
+
+@pytest.mark.sanity
+def test_base_config_deskews_at_full_resolution():
+    import os
+    from preprocessing_image.utils import load_config
+    config = load_config(os.path.join(os.path.dirname(__file__), "..", "preprocessing_image", "configs", "base.yaml"))
+    params = next(step["params"] for step in config["steps"] if step["name"] == "deskew")
+    assert params.get("proxy_level", 0) == 0
+
+
+@pytest.mark.sanity
+def test_deskew_invalid_method():
+    with pytest.raises(ValueError):
+        deskew_preprocess(rotated_text(0), {"method": "fourier"})
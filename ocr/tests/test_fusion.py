@@ -0,0 +1,95 @@
+"""
+tests/test_fusion.py
+
+Tests for fusing consecutive pointwise steps into a single lookup-table pass.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.fusion import apply_fused
+from preprocessing_image.pipeline import apply_stage
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.scripts import gamma_correction
+
+
+def step(name, **params):
+    return {"name": name, "enabled": True, "params": params}
+
+
+CHAINS = {
+    "invert_gamma": [step("invert"), step("gamma_correction", gamma=1.7)],
+    "normalize_gamma_threshold": [step("normalization", norm_type=cv2.NORM_MINMAX, alpha=10, beta=240),
+                                  step("gamma_correction", gamma=0.6),
+                                  step("threshold", method="fixed", threshold_value=127.5),
+                                  step("invert")],
+    "gamma_normalize_invert": [step("gamma_correction", gamma=2.2), step("normalization"), step("invert")],
+}
+
+
+def images():
+    rng = np.random.default_rng(3)
+    gray = rng.integers(40, 190, (50, 70), dtype=np.uint8)
+    color = rng.integers(0, 256, (50, 70, 3), dtype=np.uint8)
+    flat = np.full((20, 20), 77, dtype=np.uint8)
+    return {"gray": gray, "color": color, "flat": flat}
+
+
+def run_sequential(plan, image):
+    results = {}
+    for stage in plan.stages(fuse=False):
+        image, stage_results, _ = apply_stage(stage, image)
+        results.update(stage_results)
+    return image, results
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("chain", sorted(CHAINS))
+@pytest.mark.parametrize("image_kind", sorted(images()))
+def test_fused_matches_sequential(chain, image_kind):
+    plan = PipelinePlan.from_config({"steps": CHAINS[chain]})
+    image = images()[image_kind]
+    expected_img, expected_results = run_sequential(plan, image)
+    (stage,) = plan.stages()
+    fused_img, fused_results, _ = apply_stage(stage, image)
+    assert np.array_equal(fused_img, expected_img)
+    assert fused_results == expected_results
+
+
+@pytest.mark.sanity
+def test_stages_group_only_pointwise_runs():
+    plan = PipelinePlan.from_config({"steps": [
+        step("invert"), step("grayscale"), step("gamma_correction", gamma=1.2), step("invert"), step("median_blur"),
+    ]})
+    assert [[s.name for s in stage] for stage in plan.stages()] == [
+        ["invert"], ["grayscale"], ["gamma_correction", "invert"], ["median_blur"]]
+    assert all(len(stage) == 1 for stage in plan.stages(fuse=False))
+    no_fusion = PipelinePlan.from_config({"steps": CHAINS["invert_gamma"], "fuse_pointwise": False})
+    assert len(no_fusion.stages()) == 2
+
+
+@pytest.mark.sanity
+def test_non_lut_inputs_fall_back():
+    otsu = PipelinePlan.from_config({"steps": [step("gamma_correction", gamma=1.5), step("threshold")]})
+    image = images()["gray"]
+    assert apply_fused(otsu.steps, image) is None
+    fixed = PipelinePlan.from_config({"steps": [step("invert"), step("threshold", method="fixed", threshold_value=100)]})
+    # Threshold converts color input to gray first, and invert keeps a BGRA alpha channel
+    assert apply_fused(fixed.steps, images()["color"]) is None
+    assert apply_fused(fixed.steps, np.zeros((5, 5, 4), dtype=np.uint8)) is None
+    assert apply_fused(fixed.steps, image.astype(np.float32)) is None
+    # The fallback still runs the stage step by step
+    output, results, _ = apply_stage(otsu.steps, image)
+    assert set(np.unique(output)) <= {0, 255}
+    assert list(results) == ["gamma_correction", "threshold"]
+
+
+@pytest.mark.sanity
+def test_gamma_table_is_cached_and_matches_formula():
+    table = gamma_correction.lookup_table({"gamma": 2.0}, 1)
+    assert table is gamma_correction.lookup_table({"gamma": 2.0}, 3)
+    expected = np.array([(i / 255.0) ** (1.0 / 2.0) * 255 for i in range(256)], dtype=np.uint8)
+    assert np.array_equal(table, expected)
+    color = images()["color"]
+    out = gamma_correction.preprocess(color, {"gamma": 2.0})
+    assert np.array_equal(out, cv2.merge([cv2.LUT(ch, expected) for ch in cv2.split(color)]))
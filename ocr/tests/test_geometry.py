@@ -0,0 +1,118 @@
+"""
+tests/test_geometry.py
+
+Tests for running consecutive geometric steps (deskew, crop, resize) as one warp.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.geometry import source_edges, warp
+from preprocessing_image.pipeline import apply_stage
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.state import ImageState
+
+CROP = {"name": "crop", "params": {"x": 40, "y": 20, "width": 360, "height": 500}}
+DESKEW = {"name": "deskew", "params": {}}
+
+
+def skewed_page(height=600, width=440, angle=10):
+    page = np.full((height, width), 235, dtype=np.uint8)
+    for i in range(10):
+        cv2.putText(page, "Body text line %d" % i, (60, 80 + 45 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 30, 2)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(page, matrix, (width, height), borderValue=235)
+
+
+def resize_to(width):
+    return {"name": "resize", "params": {"target_width": width, "upscale_only": False}}
+
+
+def run(steps, image, fuse, binary=False):
+    plan = PipelinePlan.from_config({"steps": steps, "fuse_geometric": fuse})
+    state = ImageState.of(image, binary=binary, polarity="dark" if binary else None)
+    results = {}
+    for stage in plan.stages():
+        image, stage_results, state = apply_stage(stage, image, state)
+        results.update(stage_results)
+    return image, results, [[step.name for step in stage] for stage in plan.stages()]
+
+
+@pytest.mark.sanity
+def test_off_by_default():
+    plan = PipelinePlan.from_config({"steps": [CROP, resize_to(200)]})
+    assert not plan.fuse_geometric
+    assert len(plan.stages()) == 2
+
+
+@pytest.mark.sanity
+def test_fusion_changes_the_journal_fingerprint():
+    steps = [DESKEW, resize_to(200)]
+    unfused = PipelinePlan.from_config({"steps": steps})
+    fused = PipelinePlan.from_config({"steps": steps, "fuse_geometric": True})
+    assert fused.fingerprint() != unfused.fingerprint()
+    assert unfused.fingerprint() == PipelinePlan(unfused.steps).fingerprint()
+
+
+@pytest.mark.sanity
+def test_runs_are_grouped():
+    steps = [{"name": "grayscale", "params": {}}, DESKEW, CROP, resize_to(200),
+             {"name": "threshold", "params": {"method": "otsu"}}, CROP]
+    plan = PipelinePlan.from_config({"steps": steps, "fuse_geometric": True})
+    assert [[step.name for step in stage] for stage in plan.stages()] == \
+        [["grayscale"], ["deskew", "crop", "resize"], ["threshold"], ["crop"]]
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("width", [180, 360, 700])
+def test_crop_then_resize_matches_unfused_exactly(width):
+    image = skewed_page()
+    expected, expected_results, _ = run([CROP, resize_to(width)], image, fuse=False)
+    output, results, stages = run([CROP, resize_to(width)], image, fuse=True)
+    assert stages == [["crop", "resize"]]
+    assert np.array_equal(output, expected)
+    assert {name: r["metrics"] for name, r in results.items()} == \
+        {name: r["metrics"] for name, r in expected_results.items()}
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("width", [220, 800])
+def test_deskew_then_resize_is_one_resampling(width):
+    image = skewed_page()
+    expected, _, _ = run([DESKEW, CROP, resize_to(width)], image, fuse=False)
+    output, results, stages = run([DESKEW, CROP, resize_to(width)], image, fuse=True)
+    assert stages == [["deskew", "crop", "resize"]]
+    assert output.shape == expected.shape
+    assert np.abs(output.astype(int) - expected.astype(int)).mean() < 3
+    assert all(r["status"] == "success" for r in results.values())
+    assert results["deskew"]["metrics"]["detected_angle"] == pytest.approx(-10, abs=1)
+    assert results["resize"]["metrics"]["new_width"] == width
+
+
+@pytest.mark.sanity
+def test_binary_input_stays_binary():
+    _, image = cv2.threshold(skewed_page(), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    output, results, _ = run([DESKEW, resize_to(300)], image, fuse=True, binary=True)
+    assert output.shape[1] == 300
+    assert set(np.unique(output)) <= {0, 255}
+    assert results["resize"]["status"] == "success"
+
+
+@pytest.mark.sanity
+def test_step_needing_pixels_splits_the_run():
+    # Auto crop looks at the deskewed page, so deskew is warped alone and crop+resize after it
+    image = skewed_page()
+    steps = [DESKEW, {"name": "crop", "params": {"mode": "auto", "proxy_level": 0}}, resize_to(200)]
+    expected, _, _ = run(steps, image, fuse=False)
+    output, results, _ = run(steps, image, fuse=True)
+    assert np.array_equal(output, expected)
+    assert results["crop"]["status"] == "success"
+    assert results["crop"]["metrics"]["removed_percent"] > 0
+
+
+@pytest.mark.sanity
+def test_source_edges_of_a_crop():
+    matrix = np.float64([[1, 0, -40], [0, 1, -20]])
+    assert source_edges(matrix, (360, 500)).tolist() == [40, 20, 400, 520]
+    image = skewed_page()
+    assert np.array_equal(warp(image, matrix, (360, 500)), image[20:520, 40:400])
@@ -0,0 +1,104 @@
+"""
+tests/test_journal.py
+
+Tests for resumable, content-hash-keyed pipeline runs.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image import pipeline
+from preprocessing_image.journal import RunJournal
+from preprocessing_image.pipeline import run_pipeline
+
+STEPS = [
+    {"name": "grayscale", "enabled": True, "params": {}},
+    {"name": "threshold", "enabled": True, "params": {"method": "fixed", "threshold_value": 127}},
+]
+
+
+def write_image(path, value):
+    img = np.full((30, 40, 3), value, dtype=np.uint8)
+    cv2.rectangle(img, (5, 5), (20, 20), (0, 0, 0), -1)
+    cv2.imwrite(str(path), img)
+
+
+@pytest.fixture
+def counted_runs(monkeypatch):
+    """Record the names of the images that actually go through the steps."""
+    processed = []
+    original = pipeline.process_image
+
+    def counting_process_image(image_dir, image_name, *args, **kwargs):
+        processed.append(image_name)
+        return original(image_dir, image_name, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "process_image", counting_process_image)
+    return processed
+
+
+@pytest.mark.sanity
+def test_rerun_skips_unchanged_images(tmp_path, counted_runs):
+    for i in range(3):
+        write_image(tmp_path / f"img_{i}.png", 200)
+    config = {"steps": STEPS, "journal": {"enabled": True}}
+    first = run_pipeline(str(tmp_path), config)
+    assert counted_runs == ["img_0.png", "img_1.png", "img_2.png"]
+
+    counted_runs.clear()
+    write_image(tmp_path / "img_3.png", 180)
+    write_image(tmp_path / "img_1.png", 90)  # changed content
+    second = run_pipeline(str(tmp_path), config)
+    assert counted_runs == ["img_1.png", "img_3.png"]
+    assert second["img_0.png"] == first["img_0.png"]
+    assert list(second) == ["img_0.png", "img_1.png", "img_2.png", "img_3.png"]
+
+
+@pytest.mark.sanity
+def test_config_change_reprocesses(tmp_path, counted_runs):
+    write_image(tmp_path / "img.png", 200)
+    run_pipeline(str(tmp_path), {"steps": STEPS, "journal": {"enabled": True}})
+    counted_runs.clear()
+    changed = [STEPS[0], {"name": "threshold", "enabled": True, "params": {"method": "otsu"}}]
+    run_pipeline(str(tmp_path), {"steps": changed, "journal": {"enabled": True}})
+    assert counted_runs == ["img.png"]
+
+
+@pytest.mark.sanity
+def test_missing_output_is_regenerated(tmp_path, counted_runs):
+    write_image(tmp_path / "img.png", 200)
+    config = {"steps": STEPS, "journal": {"enabled": True}}
+    run_pipeline(str(tmp_path), config)
+    os.remove(tmp_path / "output" / "img.png")
+    counted_runs.clear()
+    run_pipeline(str(tmp_path), config)
+    assert counted_runs == ["img.png"]
+
+
+@pytest.mark.sanity
+def test_journal_ignores_truncated_line(tmp_path):
+    image = tmp_path / "img.png"
+    write_image(image, 200)
+    journal_path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(journal_path, "cfg")
+    assert journal.lookup("img.png", str(image)) is None
+    journal.record("img.png", {"threshold": {"status": "success"}})
+    journal.close()
+    with open(journal_path, "a") as f:
+        f.write('{"name": "half-writ')
+    reopened = RunJournal(journal_path, "cfg")
+    assert reopened.lookup("img.png", str(image)) == {"threshold": {"status": "success"}}
+    reopened.close()
+
+    # An image recorded after the truncated line can be looked up after the next restart
+    other = tmp_path / "other.png"
+    write_image(other, 120)
+    reopened = RunJournal(journal_path, "cfg")
+    assert reopened.lookup("other.png", str(other)) is None
+    reopened.record("other.png", {"threshold": {"status": "success", "n": 2}})
+    reopened.close()
+    again = RunJournal(journal_path, "cfg")
+    assert again.lookup("other.png", str(other)) == {"threshold": {"status": "success", "n": 2}}
+    assert again.lookup("img.png", str(image)) == {"threshold": {"status": "success"}}
+    again.close()
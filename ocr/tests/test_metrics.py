@@ -0,0 +1,78 @@
+"""
+tests/test_metrics.py
+
+Tests for per-step latency/memory metrics and the Prometheus textfile export.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+import yaml
+from preprocessing_image.metrics import RunMetrics, timed
+from preprocessing_image.pipeline import run_pipeline
+
+STEPS = [
+    {"name": "grayscale", "params": {}},
+    {"name": "gamma_correction", "params": {"gamma": 1.0}},
+    {"name": "invert", "params": {}},
+    {"name": "median_blur", "params": {"ksize": 3}},
+]
+
+
+def write_images(image_dir, count=4):
+    rng = np.random.default_rng(5)
+    for i in range(count):
+        cv2.imwrite(os.path.join(image_dir, f"img_{i}.png"), rng.integers(0, 256, (40, 60, 3), dtype=np.uint8))
+
+
+@pytest.mark.sanity
+def test_timed_records_wall_cpu_and_peak():
+    value, timing = timed(lambda n: np.ones(n, dtype=np.uint8).sum(), 1 << 20, trace_memory=True)
+    assert value == 1 << 20
+    assert timing["wall_ms"] >= 0 and timing["cpu_ms"] >= 0
+    assert timing["peak_kib"] >= 1024  # the 1 MiB array
+
+
+@pytest.mark.sanity
+def test_run_records_timings_summary_and_textfile(tmp_path):
+    write_images(tmp_path)
+    prom = tmp_path / "textfile" / "ocr.prom"
+    config = {"steps": STEPS, "metrics": {"enabled": True, "tracemalloc": True, "prometheus_file": str(prom)}}
+    results = run_pipeline(str(tmp_path), config)
+    for result in results.values():
+        assert result["median_blur"]["timing"]["wall_ms"] >= 0
+        # gamma and invert ran fused: they share one measurement named after the stage
+        assert result["gamma_correction"]["timing"]["stage"] == "gamma_correction+invert"
+        assert result["invert"]["timing"] == result["gamma_correction"]["timing"]
+        assert "peak_kib" in result["grayscale"]["timing"]
+
+    with open(tmp_path / "output" / "metrics.yaml") as f:
+        summary = yaml.safe_load(f)
+    assert set(summary) == {"grayscale", "gamma_correction+invert", "median_blur"}
+    assert summary["median_blur"]["count"] == 4
+    assert summary["median_blur"]["wall_ms_p50"] <= summary["median_blur"]["wall_ms_p99"]
+
+    text = prom.read_text()
+    assert 'ocr_preprocess_step_seconds{step="median_blur",quantile="0.95"}' in text
+    assert 'ocr_preprocess_step_seconds_count{step="grayscale"} 4' in text
+    assert 'ocr_preprocess_images_total{status="success"} 4' in text
+    assert not [p for p in os.listdir(prom.parent) if p.endswith(".tmp")]
+
+
+@pytest.mark.sanity
+def test_metrics_disabled_leaves_results_unchanged(tmp_path):
+    write_images(tmp_path, count=1)
+    result = run_pipeline(str(tmp_path), {"steps": STEPS})["img_0.png"]
+    assert all("timing" not in step_result for step_result in result.values())
+    assert not (tmp_path / "output" / "metrics.yaml").exists()
+
+
+@pytest.mark.sanity
+def test_run_metrics_counts_failures():
+    metrics = RunMetrics()
+    metrics.add({"threshold": {"status": "failure", "timing": {"wall_ms": 1.0, "cpu_ms": 1.0}}})
+    metrics.add({"pipeline": {"status": "failure", "error": "worker process crashed"}})
+    metrics.add({"threshold": {"status": "success", "timing": {"wall_ms": 3.0, "cpu_ms": 2.0}}})
+    assert metrics.images == {"success": 1, "failure": 2}
+    assert metrics.summary()["threshold"]["wall_ms_p50"] == 2.0
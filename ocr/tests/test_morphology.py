@@ -0,0 +1,73 @@
+"""
+tests/test_morphology.py
+
+The morphology steps run the dual operation for dark targets instead of inverting the
+image twice; outputs must equal the inverting implementation bit for bit.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.morphology import structuring_element
+from preprocessing_image.scripts import dilate, erode, morph_close, morph_open
+
+SHAPES = {"rect": cv2.MORPH_RECT, "ellipse": cv2.MORPH_ELLIPSE, "cross": cv2.MORPH_CROSS}
+OPS = {"dilate": cv2.MORPH_DILATE, "erode": cv2.MORPH_ERODE, "morph_open": cv2.MORPH_OPEN,
+       "morph_close": cv2.MORPH_CLOSE}
+
+
+def inverting_reference(name, image, ksize, shape, target, iterations=1):
+    """The previous implementation: invert, apply the operation, invert back."""
+    kernel = cv2.getStructuringElement(SHAPES[shape], (ksize, ksize))
+    img = cv2.bitwise_not(image) if target == "dark" else image
+    out = cv2.morphologyEx(img, OPS[name], kernel, iterations=iterations)
+    return cv2.bitwise_not(out) if target == "dark" else out
+
+
+def run(name, image, ksize, shape, target, iterations=1):
+    if name in ("morph_open", "morph_close"):
+        module = morph_open if name == "morph_open" else morph_close
+        return module.preprocess(image, ksize=ksize, kernel_shape=shape, target=target)
+    module = dilate if name == "dilate" else erode
+    return module.preprocess(image, {"ksize": ksize, "kernel_shape": shape, "target": target,
+                                     "iterations": iterations, "adjust_thin_ksize": False})
+
+
+IMAGES = {
+    "gray": np.random.default_rng(0).integers(0, 256, (47, 61), dtype=np.uint8),
+    "binary": (np.random.default_rng(1).random((47, 61)) < 0.3).astype(np.uint8) * 255,
+    "bgr": np.random.default_rng(2).integers(0, 256, (33, 29, 3), dtype=np.uint8),
+}
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("name", sorted(OPS))
+@pytest.mark.parametrize("image", sorted(IMAGES))
+@pytest.mark.parametrize("shape", sorted(SHAPES))
+@pytest.mark.parametrize("ksize", [3, 5])
+@pytest.mark.parametrize("target", ["dark", "bright"])
+def test_duality_matches_inverting_implementation(name, image, shape, ksize, target):
+    img = IMAGES[image]
+    iterations = 2 if name in ("dilate", "erode") else 1
+    expected = inverting_reference(name, img, ksize, shape, target, iterations)
+    assert np.array_equal(run(name, img, ksize, shape, target, iterations), expected)
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("name", ["dilate", "erode"])
+def test_duality_int16(name):
+    img = np.random.default_rng(3).integers(-3000, 3000, (30, 40)).astype(np.int16)
+    output = run(name, img, 3, "ellipse", "dark")
+    assert output.dtype == np.int16
+    assert np.array_equal(output, inverting_reference(name, img, 3, "ellipse", "dark"))
+
+
+@pytest.mark.sanity
+def test_structuring_elements_are_cached_and_read_only():
+    kernel = structuring_element("ellipse", 5)
+    assert kernel is structuring_element("ellipse", 5)
+    assert np.array_equal(kernel, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5)))
+    with pytest.raises(ValueError):
+        kernel[0, 0] = 1
+    # Unknown shapes fall back to a rectangle, as the steps always did
+    assert np.array_equal(structuring_element("square", 3), np.ones((3, 3), dtype=np.uint8))
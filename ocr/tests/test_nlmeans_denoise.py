@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.scripts.nlmeans_denoise import estimate_noise, preprocess as nlmeans_preprocess
+from preprocessing_image.validation.nlmeans_denoise_validation import validate as nlmeans_validate
+
+
+def text_page(shape=(300, 400), sigma=0.0, seed=0):
+    page = np.full(shape, 230, dtype=np.uint8)
+    for i in range(5):
+        cv2.putText(page, "noisy line %d" % i, (15, 45 + 55 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 30, 2)
+    if sigma:
+        noise = np.random.default_rng(seed).normal(0, sigma, shape)
+        page = np.clip(page + noise, 0, 255).astype(np.uint8)
+    return page
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("sigma", [3, 8, 15])
+def test_estimate_noise_recovers_sigma(sigma):
+    assert estimate_noise(text_page(sigma=sigma)) == pytest.approx(sigma, rel=0.2)
+
+
+@pytest.mark.sanity
+def test_estimate_noise_clean_page():
+    # Text edges alone do not read as noise
+    assert estimate_noise(text_page()) < 0.5
+
+
+@pytest.mark.sanity
+def test_fixed_mode_is_plain_nlmeans():
+    img = text_page(sigma=8)
+    output = nlmeans_preprocess(img, {"h": 10, "templateWindowSize": 7, "searchWindowSize": 21})
+    assert np.array_equal(output, cv2.fastNlMeansDenoising(img, None, 10, 7, 21))
+
+
+@pytest.mark.sanity
+def test_base_config_keeps_fixed_nlmeans():
+    import os
+    from preprocessing_image.utils import load_config
+    config_dir = os.path.join(os.path.dirname(__file__), "..", "preprocessing_image", "configs")
+    params = {name: next(step["params"] for step in load_config(os.path.join(config_dir, f"{name}.yaml"))["steps"]
+                         if step["name"] == "nlmeans_denoise")
+              for name in ("base", "auto_crop")}
+    img = text_page()
+    # base.yaml denoises every page as before; the example config leaves a clean page alone
+    assert np.array_equal(nlmeans_preprocess(img, params["base"]), cv2.fastNlMeansDenoising(img, None, 10, 7, 21))
+    assert np.array_equal(nlmeans_preprocess(img, params["auto_crop"]), img)
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("sigma,action", [(0, "skip"), (3, "median"), (12, "nlmeans")])
+def test_auto_mode_decision(sigma, action):
+    img = text_page(sigma=sigma)
+    params = {"mode": "auto"}
+    output = nlmeans_preprocess(img, params)
+    assert params["denoise_action"] == action
+    if action == "skip":
+        assert np.array_equal(output, img)
+    if action == "nlmeans":
+        assert params["applied_h"] == pytest.approx(params["noise_sigma"], abs=0.01)
+    result = nlmeans_validate(img, output, params)
+    assert result["status"] == "success"
+    assert result["metrics"]["denoise_action"] == action
+    assert result["metrics"]["noise_sigma"] == params["noise_sigma"]
+
+
+@pytest.mark.sanity
+def test_auto_mode_bilateral_fallback_and_given_sigma():
+    img = text_page(shape=(120, 160))
+    color = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    params = {"mode": "auto", "fallback": "bilateral", "noise_sigma": 4.0}
+    output = nlmeans_preprocess(color, params)
+    assert params["denoise_action"] == "bilateral" and output.shape == color.shape
+    with pytest.raises(ValueError, match="Invalid fallback"):
+        nlmeans_preprocess(img, {"mode": "auto", "fallback": "box", "noise_sigma": 4.0})
+
+
+@pytest.mark.sanity
+def test_auto_mode_without_fallback_uses_nlmeans():
+    params = {"mode": "auto", "fallback": "nlmeans", "noise_sigma": 3.0, "h_per_sigma": 2.0}
+    nlmeans_preprocess(text_page(), params)
+    assert params["denoise_action"] == "nlmeans" and params["applied_h"] == 6.0
@@ -0,0 +1,90 @@
+"""
+tests/test_packed.py
+
+Tests for bit-packed binary images and their 1-bit output formats.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image import pipeline
+from preprocessing_image.packed import PackedBinary, write_bilevel
+from preprocessing_image.pipeline import run_pipeline
+
+STEPS = [
+    {"name": "grayscale", "params": {}},
+    {"name": "threshold", "params": {"method": "otsu"}},
+    {"name": "morph_open", "params": {"ksize": 3}},
+    {"name": "invert", "params": {}},
+    {"name": "dilate", "params": {"ksize": 3, "target": "bright"}},
+]
+
+
+def binary_page(height=123, width=203):
+    page = np.full((height, width), 255, dtype=np.uint8)
+    for i in range(3):
+        cv2.putText(page, "bits %d" % i, (8, 35 + 38 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return page
+
+
+def png_bit_depth(path):
+    with open(path, "rb") as f:
+        return f.read(25)[24]  # IHDR bit depth
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("width", [1, 8, 13, 203])
+def test_pack_roundtrip_and_size(width):
+    image = binary_page(width=width) if width > 100 else np.tile(np.uint8([0, 255]), (5, width))[:, :width]
+    packed = PackedBinary.pack(image)
+    assert packed.shape == image.shape
+    assert packed.nbytes == image.shape[0] * ((width + 7) // 8)
+    unpacked = packed.unpack()
+    assert unpacked.dtype == np.uint8 and np.array_equal(unpacked, image)
+
+
+@pytest.mark.sanity
+def test_pack_rejects_color_images():
+    with pytest.raises(ValueError, match="single-channel uint8"):
+        PackedBinary.pack(np.zeros((4, 4, 3), dtype=np.uint8))
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("extension", [".png", ".tif"])
+@pytest.mark.parametrize("packed", [False, True])
+def test_write_bilevel_roundtrip(tmp_path, extension, packed):
+    image = binary_page()
+    path = str(tmp_path / f"page{extension}")
+    assert write_bilevel(path, PackedBinary.pack(image) if packed else image)
+    assert np.array_equal(cv2.imread(path, cv2.IMREAD_GRAYSCALE), image)
+    eight_bit = str(tmp_path / f"page8{extension}")
+    cv2.imwrite(eight_bit, image)
+    assert os.path.getsize(path) < os.path.getsize(eight_bit)
+    if extension == ".png":
+        assert png_bit_depth(path) == 1
+
+
+@pytest.mark.sanity
+def test_pipeline_packed_run_matches_unpacked(tmp_path, monkeypatch):
+    packs = []
+
+    class CountingPacked(PackedBinary):
+        @classmethod
+        def pack(cls, image):
+            packs.append(image.shape)
+            return super().pack(image)
+
+    monkeypatch.setattr(pipeline, "PackedBinary", CountingPacked)
+    color = cv2.cvtColor(binary_page(), cv2.COLOR_GRAY2BGR)
+    for sub, binary in (("plain", {}), ("packed", {"packed": True, "bilevel_output": True})):
+        os.makedirs(tmp_path / sub)
+        cv2.imwrite(str(tmp_path / sub / "page.png"), color)
+        results = run_pipeline(str(tmp_path / sub), {"steps": STEPS, "binary": binary, "fuse_pointwise": False})
+        assert all(result["status"] == "success" for result in results["page.png"].values())
+    plain = str(tmp_path / "plain" / "output" / "page.png")
+    packed = str(tmp_path / "packed" / "output" / "page.png")
+    assert np.array_equal(cv2.imread(packed, cv2.IMREAD_UNCHANGED), cv2.imread(plain, cv2.IMREAD_UNCHANGED))
+    assert png_bit_depth(packed) == 1 and png_bit_depth(plain) == 8
+    # Everything after the threshold was carried packed
+    assert len(packs) == 4
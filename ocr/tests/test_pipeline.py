@@ -0,0 +1,99 @@
+"""
+tests/test_pipeline.py
+
+Tests for the image-level pipeline runner.
+"""
+
+import os
+import signal
+import cv2
+import numpy as np
+import pytest
+import yaml
+from preprocessing_image import pipeline
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.plan import PipelinePlan
+
+STEPS = [
+    {"name": "grayscale", "enabled": True, "params": {}},
+    {"name": "threshold", "enabled": True, "params": {"method": "otsu", "threshold_value": 0}},
+    {"name": "invert", "enabled": True, "params": {}},
+]
+
+
+def write_images(image_dir, count=6):
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        img = np.full((60, 80, 3), 255, dtype=np.uint8)
+        cv2.putText(img, str(i), (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+        img = cv2.add(img, rng.integers(0, 30, img.shape, dtype=np.uint8))
+        cv2.imwrite(os.path.join(image_dir, f"page_{i}.png"), img)
+
+
+def read_result(image_dir):
+    with open(os.path.join(image_dir, "output", "result.yaml")) as f:
+        return f.read()
+
+
+@pytest.mark.sanity
+def test_run_pipeline_writes_results_and_outputs(tmp_path):
+    write_images(tmp_path, count=3)
+    (tmp_path / "notes.txt").write_text("not an image")
+    results = run_pipeline(str(tmp_path), {"steps": STEPS})
+    assert list(results) == ["page_0.png", "page_1.png", "page_2.png"]
+    for name in results:
+        assert list(results[name]) == ["grayscale", "threshold", "invert"]
+        assert os.path.exists(tmp_path / "output" / name)
+    assert yaml.safe_load(read_result(tmp_path)) == results
+
+
+@pytest.mark.sanity
+def test_parallel_output_matches_serial(tmp_path):
+    serial_dir = tmp_path / "serial"
+    parallel_dir = tmp_path / "parallel"
+    for d in (serial_dir, parallel_dir):
+        d.mkdir()
+        write_images(d)
+    run_pipeline(str(serial_dir), {"steps": STEPS, "workers": 1})
+    run_pipeline(str(parallel_dir), {"steps": STEPS, "workers": 3})
+    assert read_result(serial_dir) == read_result(parallel_dir)
+    for name in os.listdir(serial_dir / "output"):
+        if name.endswith(".png"):
+            a = cv2.imread(str(serial_dir / "output" / name), cv2.IMREAD_UNCHANGED)
+            b = cv2.imread(str(parallel_dir / "output" / name), cv2.IMREAD_UNCHANGED)
+            assert np.array_equal(a, b)
+
+
+@pytest.mark.sanity
+def test_worker_crash_does_not_stop_run(tmp_path, monkeypatch):
+    write_images(tmp_path, count=5)
+    original = pipeline.process_image
+
+    def crashing_process_image(image_dir, image_name, *args):
+        if image_name == "page_2.png":
+            os.kill(os.getpid(), signal.SIGSEGV)
+        return original(image_dir, image_name, *args)
+
+    monkeypatch.setattr(pipeline, "process_image", crashing_process_image)
+    results = run_pipeline(str(tmp_path), {"steps": STEPS, "workers": 2})
+    assert list(results) == [f"page_{i}.png" for i in range(5)]
+    assert results["page_2.png"]["pipeline"]["status"] == "failure"
+    for name in ("page_0.png", "page_1.png", "page_3.png", "page_4.png"):
+        assert results[name]["invert"]["status"] == "success"
+
+
+@pytest.mark.sanity
+def test_plan_resolves_enabled_steps_once():
+    steps = STEPS + [{"name": "skeletonize", "enabled": False, "params": {}}]
+    plan = PipelinePlan.from_config({"steps": steps})
+    assert plan.names == ["grayscale", "threshold", "invert"]
+    assert all(callable(step.preprocess) and callable(step.validate) for step in plan)
+
+
+@pytest.mark.sanity
+def test_missing_step_module_fails_run_up_front(tmp_path):
+    write_images(tmp_path, count=1)
+    config = {"steps": STEPS + [{"name": "does_not_exist", "enabled": True, "params": {}}]}
+    with pytest.raises(ImportError):
+        run_pipeline(str(tmp_path), config)
+    assert not (tmp_path / "output").exists()
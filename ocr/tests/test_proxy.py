@@ -0,0 +1,76 @@
+"""
+tests/test_proxy.py
+
+Tests for analysis on a downsampled pyramid proxy.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.proxy import MIN_PROXY_SIDE, analyze, effective_level, pyramid_level
+from preprocessing_image.scripts.deskew import PROXY_ANGLE_TOLERANCE, angle_difference, preprocess, skew_angle
+from preprocessing_image.state import ImageState
+from preprocessing_image.validation.deskew_validation import validate
+
+
+def text_page(angle, height=1200, width=900):
+    img = np.full((height, width), 255, dtype=np.uint8)
+    for i in range(18):
+        cv2.putText(img, "Lorem ipsum dolor sit amet %d" % i, (60, 100 + 55 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.1, 0, 2)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (width, height), borderValue=255)
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("angle", [-20, -8, -2, 0, 3, 7, 12, 25])
+@pytest.mark.parametrize("level", [1, 2, 3])
+def test_proxy_skew_angle_within_tolerance(angle, level):
+    page = text_page(angle)
+    full = skew_angle(page)
+    proxy = skew_angle(pyramid_level(page, level))
+    assert angle_difference(proxy, full) <= PROXY_ANGLE_TOLERANCE
+
+
+@pytest.mark.sanity
+def test_deskew_on_proxy_rotates_like_full_resolution():
+    page = cv2.cvtColor(text_page(9), cv2.COLOR_GRAY2BGR)
+    full_params, proxy_params = {}, {"proxy_level": 2, "verify_proxy": True}
+    full = preprocess(page, full_params)
+    proxy = preprocess(page, proxy_params)
+    assert proxy.shape == full.shape
+    assert angle_difference(proxy_params["detected_angle"], full_params["detected_angle"]) <= PROXY_ANGLE_TOLERANCE
+    result = validate(page, proxy, proxy_params)
+    assert result["status"] == "success"
+    assert result["metrics"]["proxy_error"] <= PROXY_ANGLE_TOLERANCE
+
+
+@pytest.mark.sanity
+def test_pyramid_levels_are_cached_in_state():
+    page = cv2.cvtColor(text_page(0), cv2.COLOR_GRAY2BGR)
+    state = ImageState.of(page)
+    quarter = state.pyramid(page, 2)
+    assert quarter.shape == (300, 225)
+    assert state.pyramid(page, 2) is quarter
+    assert state.pyramid(page, 1) is pyramid_level(page, 1, state)
+    # A different image object starts a new pyramid
+    assert state.pyramid(page.copy(), 2) is not quarter
+
+
+@pytest.mark.sanity
+def test_small_images_use_a_shallower_level():
+    assert effective_level((1200, 900), 2) == 2
+    assert effective_level((200, 900), 2) == 1
+    assert effective_level((MIN_PROXY_SIDE, 500), 3) == 0
+
+
+@pytest.mark.sanity
+def test_verify_falls_back_to_full_resolution_beyond_tolerance():
+    page = text_page(0)
+    params = {"proxy_level": 2, "verify_proxy": True}
+    # A scale-dependent "analysis": the proxy answer is far from the full-resolution one
+    result = analyze(lambda gray, state: gray.shape[0], page, params, tolerance=10)
+    assert result == 1200
+    assert params["proxy_error"] == 900
+    params = {"proxy_level": 2}
+    assert analyze(lambda gray, state: gray.shape[0], page, params) == 300
+    assert "proxy_error" not in params
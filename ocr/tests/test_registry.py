@@ -0,0 +1,74 @@
+"""
+tests/test_registry.py
+
+Tests for the step registry and the declared step metadata.
+"""
+
+import logging
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.plan import PlanStep, _check_layouts
+from preprocessing_image.registry import (GEOMETRIC, GLOBAL, KWARGS, NEIGHBORHOOD, POINTWISE, StepSpec,
+                                          available_steps)
+
+
+@pytest.mark.sanity
+def test_every_script_declares_a_spec():
+    steps = available_steps()
+    assert "morph_open" in steps and "threshold" in steps
+    for name, spec in steps.items():
+        assert isinstance(spec, StepSpec)
+        assert spec != StepSpec(), f"{name} has no SPEC"
+
+
+@pytest.mark.sanity
+def test_declared_kinds_and_radii():
+    steps = available_steps()
+    assert steps["invert"].kind_for({}) == POINTWISE
+    assert steps["threshold"].kind_for({"method": "otsu"}) == GLOBAL
+    assert steps["threshold"].kind_for({"method": "fixed"}) == POINTWISE
+    assert steps["deskew"].kind_for({}) == GEOMETRIC
+    assert steps["median_blur"].kind_for({}) == NEIGHBORHOOD
+    assert steps["median_blur"].radius_for({"ksize": 4}) == 2
+    assert steps["adaptive_threshold"].radius_for({"block_size": 15}) == 7
+    assert steps["morph_open"].radius_for({"ksize": 3}) == 2
+    assert steps["dilate"].radius_for({"ksize": 3, "iterations": 2}) == 4
+    assert steps["morph_close"].signature == KWARGS
+
+
+@pytest.mark.sanity
+def test_run_pipeline_drives_kwargs_steps(tmp_path):
+    img = np.full((60, 90, 3), 255, dtype=np.uint8)
+    cv2.putText(img, "ab", (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 3)
+    img[5, 5] = 0  # speck for the opening to remove
+    cv2.imwrite(str(tmp_path / "page.png"), img)
+    steps = [
+        {"name": "threshold", "params": {"method": "otsu"}},
+        {"name": "morph_open", "params": {"ksize": 3, "kernel_shape": "rect", "target": "dark"}},
+        {"name": "morph_close", "params": {"ksize": 3}},
+    ]
+    results = run_pipeline(str(tmp_path), {"steps": steps})["page.png"]
+    assert results["morph_open"]["status"] == "success"
+    assert results["morph_open"]["metrics"]["removed_pixels"] > 0
+    assert results["morph_close"]["status"] == "success"
+
+
+@pytest.mark.sanity
+def test_plan_warns_on_incompatible_layout(caplog):
+    def step(name, spec):
+        return PlanStep(name=name, params={}, preprocess=lambda img, p: img, validate=lambda i, o, p: {}, spec=spec)
+
+    gray_only = StepSpec(channels=(1,))
+    with caplog.at_level(logging.WARNING):
+        _check_layouts([step("to_gray", StepSpec(output_channels=1)), step("gray_op", gray_only)])
+    assert not caplog.records
+    with caplog.at_level(logging.WARNING):
+        _check_layouts([step("gray_op", gray_only)])
+    assert "gray_op" in caplog.text
+    # Nothing is known after an undeclared step, so nothing is checked
+    caplog.clear()
+    with caplog.at_level(logging.WARNING):
+        _check_layouts([step("opaque", StepSpec()), step("gray_op", gray_only)])
+    assert not caplog.records
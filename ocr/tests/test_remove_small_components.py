@@ -0,0 +1,77 @@
+import time
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.scripts.remove_small_components import preprocess as remove_preprocess
+from preprocessing_image.validation.remove_small_components_validation import validate as remove_validate
+
+
+def reference_remove(image, min_size):
+    """The original per-label loop, kept as the behaviour reference."""
+    _, bin_img = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    inv = cv2.bitwise_not(bin_img)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(inv, connectivity=8)
+    mask = np.zeros(inv.shape, dtype=np.uint8)
+    for label in range(1, num_labels):
+        if stats[label, cv2.CC_STAT_AREA] >= min_size:
+            mask[labels == label] = 255
+    return cv2.bitwise_not(mask)
+
+
+def speckled_page(shape=(300, 400), specks=0.02, seed=3):
+    rng = np.random.default_rng(seed)
+    img = np.full(shape, 255, dtype=np.uint8)
+    cv2.putText(img, "Keep me", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 2.0, 0, 6)
+    img[rng.random(shape) < specks] = 0
+    return img
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("min_size", [1, 3, 5, 20])
+def test_matches_per_label_reference(min_size):
+    img = speckled_page()
+    img[0, 0] = 128  # not binary: goes through Otsu like the reference
+    output = remove_preprocess(img, {"min_size": min_size})
+    assert np.array_equal(output, reference_remove(img, min_size))
+
+
+@pytest.mark.sanity
+def test_removed_components_reported():
+    img = speckled_page()
+    params = {"min_size": 5}
+    output = remove_preprocess(img, params)
+    result = remove_validate(img, output, params)
+    assert result["status"] == "success"
+    assert result["metrics"]["removed_components"] == params["removed_components"] > 100
+    assert result["metrics"]["removed_pixels"] > 0
+
+
+@pytest.mark.sanity
+def test_shape_criteria():
+    img = np.full((120, 200), 255, dtype=np.uint8)
+    img[10:14, 20:180] = 0                              # long horizontal rule: aspect 40
+    cv2.rectangle(img, (30, 30), (90, 100), 0, 1)       # hollow frame: density ~0.06
+    img[50:70, 130:150] = 0                             # solid block: aspect 1, density 1
+    img[100:120, 185:200] = 0                           # block touching the border
+
+    def kept(params):
+        output = remove_preprocess(img, dict(params))
+        return [bool(output[12, 100] == 0), bool(output[30, 60] == 0), bool(output[60, 140] == 0),
+                bool(output[110, 190] == 0)]
+
+    assert kept({}) == [True, True, True, True]
+    assert kept({"max_aspect": 10}) == [False, True, True, True]
+    assert kept({"min_density": 0.5}) == [True, False, True, True]
+    assert kept({"remove_border": True}) == [True, True, True, False]
+    assert kept({"max_height": 30, "min_width": 25}) == [True, False, False, False]
+    assert kept({"max_size": 300}) == [False, True, False, True]
+
+
+@pytest.mark.sanity
+def test_many_specks_are_fast():
+    # ~48k single-pixel specks: the per-label loop would make one full-image pass per speck
+    img = speckled_page((1200, 1600), specks=0.03, seed=9)
+    start = time.perf_counter()
+    output = remove_preprocess(img, {"min_size": 5})
+    assert time.perf_counter() - start < 2.0
+    assert np.count_nonzero(output == 0) < np.count_nonzero(img == 0)
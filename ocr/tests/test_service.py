@@ -0,0 +1,139 @@
+"""
+tests/test_service.py
+
+Tests for the preprocessing service (warm workers, micro-batching) and its load generator.
+"""
+
+import io
+import json
+import base64
+import threading
+import cv2
+import numpy as np
+import pytest
+import yaml
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.service import (PreprocessingService, create_app, find_configs, image_extension,
+                                         process_bytes)
+
+flask = pytest.importorskip("flask")
+
+STEPS = [
+    {"name": "grayscale", "params": {}},
+    {"name": "threshold", "params": {"method": "otsu"}},
+]
+
+
+def page(height=90, width=140):
+    image = np.full((height, width, 3), 230, dtype=np.uint8)
+    cv2.putText(image, "svc", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (30, 30, 30), 3)
+    return image
+
+
+def encoded(extension=".png"):
+    return cv2.imencode(extension, page())[1].tobytes()
+
+
+@pytest.fixture(scope="module")
+def config_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("configs")
+    (directory / "binarize.yaml").write_text(yaml.safe_dump({"steps": STEPS}))
+    (directory / "tiff.yaml").write_text(yaml.safe_dump({"steps": STEPS, "output": {"format": "tiff"}}))
+    (directory / "result.yaml").write_text(yaml.safe_dump({"page.png": {}}))
+    return str(directory)
+
+
+@pytest.fixture(scope="module")
+def service(config_dir):
+    with PreprocessingService(config_dir, workers=2, batch_window_ms=50) as service:
+        yield service
+
+
+@pytest.fixture(scope="module")
+def client(service):
+    return create_app(service, timeout=60).test_client()
+
+
+@pytest.mark.sanity
+def test_find_configs(config_dir):
+    assert sorted(find_configs(config_dir)) == ["binarize", "tiff"]
+
+
+@pytest.mark.sanity
+def test_image_extension():
+    assert image_extension("scan.JPG", b"") == ".jpg"
+    assert image_extension("", encoded(".png")) == ".png"
+    assert image_extension("", encoded(".jpg")) == ".jpg"
+    assert image_extension("", b"nothing known") == ""
+
+
+@pytest.mark.sanity
+def test_process_bytes_matches_the_plan():
+    plan = PipelinePlan.from_config({"steps": STEPS})
+    processed = process_bytes(plan, "page.png", encoded())
+    assert processed["extension"] == ".png"
+    assert all(result["status"] == "success" for result in processed["results"].values())
+    output = cv2.imdecode(np.frombuffer(processed["image"], np.uint8), cv2.IMREAD_UNCHANGED)
+    assert output.shape == (90, 140) and set(np.unique(output)) <= {0, 255}
+    assert process_bytes(plan, "page.png", b"not an image") == {"error": "Could not decode the image."}
+
+
+@pytest.mark.sanity
+def test_multipart_upload(client):
+    reply = client.post("/process/binarize", data={"image": (io.BytesIO(encoded(".jpg")), "a.jpg")})
+    assert reply.status_code == 200
+    body = reply.get_json()
+    assert body["image"] == "a.jpg" and body["output"]["extension"] == ".jpg"
+    assert body["results"]["threshold"]["status"] == "success"
+    assert body["timing"]["batch_size"] >= 1 and body["timing"]["total_ms"] >= body["timing"]["process_ms"]
+    output = cv2.imdecode(np.frombuffer(base64.b64decode(body["output"]["data"]), np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert output.shape == (90, 140)
+
+
+@pytest.mark.sanity
+def test_raw_body_with_image_response(client):
+    reply = client.post("/process/tiff?response=image", data=encoded(), content_type="application/octet-stream")
+    assert reply.status_code == 200 and reply.mimetype == "image/tiff"
+    assert json.loads(reply.headers["X-Validation-Results"])["threshold"]["status"] == "success"
+    output = cv2.imdecode(np.frombuffer(reply.data, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert output.shape == (90, 140)
+
+
+@pytest.mark.sanity
+def test_errors(client):
+    assert client.post("/process/missing", data=encoded()).status_code == 404
+    assert client.post("/process/binarize", data=b"").status_code == 400
+    reply = client.post("/process/binarize?name=x.png", data=b"not an image")
+    assert reply.status_code == 422 and "decode" in reply.get_json()["error"]
+    health = client.get("/health").get_json()
+    assert health == {"status": "ok", "workers": 2, "configs": ["binarize", "tiff"]}
+
+
+@pytest.mark.sanity
+def test_burst_is_micro_batched(service):
+    futures = [service.submit("binarize", f"p{i}.png", encoded()) for i in range(8)]
+    processed = [future.result(timeout=60) for future in futures]
+    assert all("error" not in result for result in processed)
+    # Eight requests inside one window go out as one task per worker
+    assert max(result["batch_size"] for result in processed) > 1
+    with pytest.raises(KeyError):
+        service.submit("missing", "p.png", encoded())
+
+
+@pytest.mark.sanity
+def test_loadgen_against_the_server(service):
+    pytest.importorskip("requests")
+    from werkzeug.serving import make_server
+    from preprocessing_image.loadgen import run_load
+
+    server = make_server("127.0.0.1", 0, create_app(service), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        report = run_load(f"http://127.0.0.1:{server.server_port}", "binarize",
+                          [("a.png", encoded()), ("b.jpg", encoded(".jpg"))], concurrency=3, total=9)
+    finally:
+        server.shutdown()
+    assert report["requests"] == 9 and report["errors"] == 0
+    assert set(report["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
+    assert report["mean_batch_size"] >= 1
@@ -0,0 +1,94 @@
+"""
+tests/test_sinks.py
+
+Tests for the streaming result sinks and the legacy result.yaml converter.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.sinks import JsonlSink, SqliteSink, make_sink, read_records, to_legacy_yaml
+
+STEPS = [
+    {"name": "grayscale", "params": {}},
+    {"name": "threshold", "params": {"method": "otsu"}},
+    {"name": "invert", "params": {}},
+]
+
+
+def write_images(image_dir, count=5):
+    rng = np.random.default_rng(2)
+    for i in range(count):
+        img = np.full((40, 60, 3), 230, dtype=np.uint8)
+        cv2.putText(img, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+        img = cv2.subtract(img, rng.integers(0, 40, img.shape, dtype=np.uint8))
+        cv2.imwrite(os.path.join(image_dir, f"scan_{i}.png"), img)
+
+
+def run_with(tmp_path, name, results_cfg, workers=1):
+    image_dir = tmp_path / name
+    image_dir.mkdir()
+    write_images(image_dir)
+    results = run_pipeline(str(image_dir), {"steps": STEPS, "workers": workers, "results": results_cfg})
+    return image_dir, results
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("sink", ["jsonl", "sqlite"])
+def test_streaming_sink_matches_legacy_yaml(tmp_path, sink):
+    legacy_dir, legacy = run_with(tmp_path, "legacy", {})
+    stream_dir, streamed = run_with(tmp_path, sink, {"sink": sink, "flush_every": 2, "legacy_yaml": True}, workers=2)
+    assert dict(streamed) == dict(legacy)
+    assert list(streamed) == list(legacy)
+    # The converted result.yaml is byte-for-byte the legacy one
+    assert (stream_dir / "output" / "result.yaml").read_bytes() == (legacy_dir / "output" / "result.yaml").read_bytes()
+
+
+@pytest.mark.sanity
+def test_sqlite_sink_with_any_file_name(tmp_path):
+    legacy_dir, legacy = run_with(tmp_path, "legacy", {})
+    path = tmp_path / "run.sqlite3"
+    stream_dir, streamed = run_with(tmp_path, "sqlite", {"sink": "sqlite", "path": str(path), "legacy_yaml": True})
+    assert path.read_bytes().startswith(b"SQLite format 3")
+    assert dict(streamed) == dict(legacy)
+    assert (stream_dir / "output" / "result.yaml").read_bytes() == (legacy_dir / "output" / "result.yaml").read_bytes()
+
+
+@pytest.mark.sanity
+def test_records_are_readable_before_close(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    sink = JsonlSink(path, flush_every=1)
+    sink.write("b.png", {"invert": {"status": "success"}}, 1)
+    sink.write("a.png", {"invert": {"status": "failure"}}, 0)
+    # Flushed per record: a reader (or a crash) sees both records while the run goes on
+    assert [name for name, _ in read_records(path)] == ["a.png", "b.png"]
+    sink.close()
+
+
+@pytest.mark.sanity
+def test_truncated_jsonl_line_is_skipped(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with JsonlSink(str(path)) as sink:
+        sink.write("a.png", {"step": {"status": "success"}}, 0)
+    with open(path, "a") as f:
+        f.write('{"index": 1, "image": "b.png", "res')
+    yaml_path = tmp_path / "result.yaml"
+    to_legacy_yaml(str(path), str(yaml_path))
+    assert yaml_path.read_text() == "a.png:\n  step:\n    status: success\n"
+
+
+@pytest.mark.sanity
+def test_sqlite_sink_keeps_last_record_per_image(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    with SqliteSink(path) as sink:
+        sink.write("a.png", {"v": 1}, 0)
+        sink.write("a.png", {"v": 2}, 0)
+    assert list(read_records(path)) == [("a.png", {"v": 2})]
+
+
+@pytest.mark.sanity
+def test_make_sink_rejects_unknown_type(tmp_path):
+    with pytest.raises(ValueError):
+        make_sink({"results": {"sink": "csv"}}, str(tmp_path))
@@ -1,3 +1,4 @@
+import cv2
 import numpy as np
 import pytest
 from preprocessing_image.scripts.skeletonize import preprocess as skeletonize_preprocess
@@ -147,3 +148,50 @@ def test_skeletonization_edge_case_color():
     # The output should be a 1x1 color image with the same values as the input image
     assert output.shape == (1, 1, 3)
     assert np.array_equal(output, color_img)  # Skeletonization shouldn't change a 1x1 color image
+
+
+def bold_text(thickness=7):
+    img = np.full((160, 420), 255, dtype=np.uint8)
+    cv2.putText(img, "Bold 42", (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 3.0, 0, thickness)
+    return img
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("method", ["zhangsuen", "guohall"])
+def test_thinning_gives_connected_one_pixel_skeleton(method):
+    img = bold_text()
+    params = {"method": method}
+    output = skeletonize_preprocess(img, params)
+    skeleton = (output == 0).astype(np.uint8)
+
+    # No 2x2 block of skeleton pixels: strokes are one pixel wide
+    blocks = skeleton[:-1, :-1] & skeleton[1:, :-1] & skeleton[:-1, 1:] & skeleton[1:, 1:]
+    assert not blocks.any()
+    # Every stroke is still one piece, and the skeleton lies inside the original strokes
+    strokes, _ = cv2.connectedComponents((img == 0).astype(np.uint8), connectivity=8)
+    pieces, _ = cv2.connectedComponents(skeleton, connectivity=8)
+    assert pieces == strokes
+    assert not (skeleton & (img == 255)).any()
+    assert 80 < params["reduction_percent"] < 100
+
+
+@pytest.mark.sanity
+def test_thinning_lookup_table_matches_rules():
+    from preprocessing_image.thinning import deletion_table
+    first, second = deletion_table("zhangsuen", 0), deletion_table("zhangsuen", 1)
+    # An isolated pixel and a line end always stay
+    assert first[0] == second[0] == 0
+    assert first[0b00000001] == second[0b00000001] == 0
+    # A pixel on the bottom edge of a blob (P8, P9, P2, P3, P4 set) goes in the first pass,
+    # one on the top edge (P4..P8 set) in the second
+    assert first[0b11000111] == 1 and second[0b11000111] == 0
+    assert first[0b01111100] == 0 and second[0b01111100] == 1
+    assert not first.flags.writeable
+
+
+@pytest.mark.sanity
+def test_morphological_method_and_invalid_method():
+    img = bold_text(3)
+    assert skeletonize_preprocess(img, {"method": "morphological"}).shape == img.shape
+    with pytest.raises(ValueError):
+        skeletonize_preprocess(img, {"method": "medial"})
@@ -0,0 +1,96 @@
+"""
+tests/test_sources.py
+
+Tests for the pipeline image sources and decode prefetching.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.sources import DirectorySource, GlobSource, ManifestSource, make_source, prefetch
+
+
+@pytest.fixture
+def image_tree(tmp_path):
+    """customer/day nested tree with a non-image file and an output dir that must be skipped."""
+    img = np.full((20, 30, 3), 200, dtype=np.uint8)
+    for rel in ["b.png", "a.jpg", "acme/2024-01-02/p1.png", "acme/2024-01-01/p2.bmp", "output/old.png"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(path), img)
+    (tmp_path / "acme" / "readme.txt").write_text("ignore me")
+    return tmp_path
+
+
+@pytest.mark.sanity
+def test_directory_source_top_level_is_sorted(image_tree):
+    assert list(DirectorySource(str(image_tree))) == ["a.jpg", "b.png"]
+
+
+@pytest.mark.sanity
+def test_directory_source_recursive_skips_excluded(image_tree):
+    source = DirectorySource(str(image_tree), recursive=True, exclude=[str(image_tree / "output")])
+    assert list(source) == [
+        "a.jpg",
+        os.path.join("acme", "2024-01-01", "p2.bmp"),
+        os.path.join("acme", "2024-01-02", "p1.png"),
+        "b.png",
+    ]
+
+
+@pytest.mark.sanity
+def test_manifest_source(image_tree):
+    manifest = image_tree / "list.txt"
+    manifest.write_text("# nightly batch\nb.png\n\nacme/2024-01-02/p1.png\n")
+    assert list(ManifestSource(str(image_tree), str(manifest))) == ["b.png", "acme/2024-01-02/p1.png"]
+
+
+@pytest.mark.sanity
+def test_manifest_entries_stay_inside_root(image_tree, tmp_path_factory):
+    elsewhere = tmp_path_factory.mktemp("elsewhere") / "a.png"
+    cv2.imwrite(str(elsewhere), np.full((40, 60, 3), 200, dtype=np.uint8))
+    manifest = image_tree / "list.txt"
+    manifest.write_text(f"{image_tree / 'b.png'}\n{elsewhere}\n../{elsewhere.parent.name}/a.png\n./a.jpg\n")
+    assert list(ManifestSource(str(image_tree), str(manifest))) == ["b.png", "a.jpg"]
+
+    # An entry outside the root is never processed, so its output cannot overwrite the scan
+    before = elsewhere.read_bytes()
+    config = {"source": {"type": "manifest", "manifest": str(manifest)},
+              "steps": [{"name": "grayscale", "enabled": True, "params": {}}]}
+    results = run_pipeline(str(image_tree), config)
+    assert sorted(results) == ["a.jpg", "b.png"]
+    assert elsewhere.read_bytes() == before
+    assert cv2.imread(str(elsewhere), cv2.IMREAD_UNCHANGED).shape == (40, 60, 3)
+    assert (image_tree / "output" / "b.png").exists()
+
+
+@pytest.mark.sanity
+def test_glob_source(image_tree):
+    source = GlobSource(str(image_tree), "**/*.png", exclude=[str(image_tree / "output")])
+    assert sorted(source) == sorted(["b.png", os.path.join("acme", "2024-01-02", "p1.png")])
+
+
+@pytest.mark.sanity
+def test_make_source_rejects_unknown_type(image_tree):
+    with pytest.raises(ValueError):
+        make_source(str(image_tree), {"source": {"type": "ftp"}})
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("workers", [0, 1, 3])
+def test_prefetch_preserves_order(image_tree, workers):
+    source = DirectorySource(str(image_tree), recursive=True, exclude=[str(image_tree / "output")])
+    pairs = list(prefetch(source, workers=workers, depth=2))
+    assert [name for name, _ in pairs] == list(source)
+    assert all(img is not None and img.shape == (20, 30, 3) for _, img in pairs)
+
+
+@pytest.mark.sanity
+def test_run_pipeline_recursive_mirrors_tree(image_tree):
+    config = {"source": {"type": "directory", "recursive": True},
+              "steps": [{"name": "grayscale", "enabled": True, "params": {}}]}
+    results = run_pipeline(str(image_tree), config)
+    assert len(results) == 4
+    assert (image_tree / "output" / "acme" / "2024-01-02" / "p1.png").exists()
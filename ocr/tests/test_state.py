@@ -0,0 +1,89 @@
+"""
+tests/test_state.py
+
+Tests for the image-state metadata carried between pipeline steps.
+"""
+
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.pipeline import apply_stage
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.state import ImageState, is_binary, next_state, to_gray
+
+
+def unique_is_binary(gray):
+    vals = np.unique(gray)
+    return len(vals) == 2 and 0 in vals and 255 in vals
+
+
+def page():
+    img = np.full((80, 120, 3), 235, dtype=np.uint8)
+    cv2.putText(img, "state", (8, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (20, 20, 20), 3)
+    return img
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("values", [[0, 255], [0], [255], [0, 1, 255], [0, 254, 255], [3, 200], [0, 128]])
+def test_is_binary_matches_unique(values):
+    rng = np.random.default_rng(1)
+    gray = rng.choice(np.array(values, dtype=np.uint8), size=(30, 40))
+    assert is_binary(gray) == unique_is_binary(gray)
+    if set(values) <= {0, 255}:
+        assert is_binary(gray, ImageState.of(gray, binary=True)) == unique_is_binary(gray)
+
+
+@pytest.mark.sanity
+def test_gray_conversion_is_cached_per_image():
+    state = ImageState.of(page())
+    img = page()
+    gray = state.gray(img)
+    assert state.gray(img) is gray
+    assert np.array_equal(gray, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    other = page()
+    assert state.gray(other) is not gray
+    assert to_gray(gray) is gray
+
+
+@pytest.mark.sanity
+def test_steps_declare_output_state():
+    plan = PipelinePlan.from_config({"steps": [
+        {"name": "threshold", "params": {"method": "otsu"}},
+        {"name": "invert", "params": {}},
+        {"name": "median_blur", "params": {"ksize": 3}},
+        {"name": "remove_small_components", "params": {"min_size": 3}},
+    ]})
+    threshold, invert, median_blur, remove_small = plan.steps
+    assert threshold.spec.accepts_state and remove_small.spec.accepts_state and not invert.spec.accepts_state
+    img = page()
+    state = ImageState.of(img)
+    binary = cv2.threshold(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+    state = next_state((threshold,), state, img, binary)
+    assert (state.channels, state.binary, state.polarity) == (1, True, None)
+    state = next_state((remove_small,), state, binary, binary.copy())
+    assert (state.binary, state.polarity) == (True, "dark")
+    state = next_state((invert,), state, binary, 255 - binary)
+    assert (state.binary, state.polarity) == (True, "light")
+    # A step without a declaration leaves nothing known; an unchanged image keeps its state
+    assert not next_state((median_blur,), state, binary, binary.copy()).binary
+    assert next_state((median_blur,), state, binary, binary) is state
+
+
+@pytest.mark.sanity
+def test_pipeline_with_state_matches_stateless_steps():
+    steps = [
+        {"name": "threshold", "params": {"method": "otsu"}},
+        {"name": "deskew", "params": {}},
+        {"name": "remove_small_components", "params": {"min_size": 4}},
+        {"name": "skeletonize", "params": {}},
+    ]
+    plan = PipelinePlan.from_config({"steps": steps})
+    image = page()
+    stateful = image
+    state = ImageState.of(image)
+    stateless = image
+    for step in plan:
+        stateful, _, state = apply_stage((step,), stateful, state)
+        stateless = step.preprocess(stateless, dict(step.params))
+        assert np.array_equal(stateful, stateless)
+    assert state.binary and state.polarity == "dark"
@@ -0,0 +1,98 @@
+"""
+tests/test_sweep.py
+
+Tests for prefix-sharing parameter sweeps.
+"""
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+from preprocessing_image import pipeline
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.sweep import expand_grid, run_sweep
+
+BASE_STEPS = [
+    {"name": "grayscale", "enabled": True, "params": {}},
+    {"name": "gaussian_blur", "enabled": True, "params": {"ksize": 3, "sigma": 0}},
+    {"name": "adaptive_threshold", "enabled": True, "params": {"method": "gaussian", "block_size": 11, "C": 2}},
+]
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    rng = np.random.default_rng(1)
+    for i in range(2):
+        img = np.full((50, 70, 3), 230, dtype=np.uint8)
+        cv2.putText(img, f"A{i}", (5, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (20, 20, 20), 2)
+        img = cv2.add(img, rng.integers(0, 20, img.shape, dtype=np.uint8))
+        cv2.imwrite(str(tmp_path / f"scan_{i}.png"), img)
+    return tmp_path
+
+
+@pytest.mark.sanity
+def test_expand_grid():
+    configs = expand_grid(BASE_STEPS, {"adaptive_threshold.block_size": [11, 15], "adaptive_threshold.C": [2]})
+    assert [name for name, _ in configs] == ["adaptive_threshold.block_size=11,adaptive_threshold.C=2",
+                                             "adaptive_threshold.block_size=15,adaptive_threshold.C=2"]
+    assert configs[1][1][2]["params"]["block_size"] == 15
+    assert BASE_STEPS[2]["params"]["block_size"] == 11
+
+
+@pytest.mark.sanity
+def test_expand_grid_rejects_unknown_step():
+    with pytest.raises(ValueError):
+        expand_grid(BASE_STEPS, {"deskew.angle": [1]})
+
+
+@pytest.mark.sanity
+def test_sweep_shares_prefix_and_matches_single_runs(image_dir, tmp_path_factory, monkeypatch):
+    calls = []
+    original = pipeline.apply_step
+
+    def counting_apply_step(step, image, state=None, tiler=None):
+        calls.append(step.name)
+        return original(step, image, state, tiler)
+
+    monkeypatch.setattr("preprocessing_image.pipeline.apply_step", counting_apply_step)
+    spec = {"grid": {"adaptive_threshold.block_size": [11, 15, 21]}}
+    tables = run_sweep(str(image_dir), {"steps": BASE_STEPS}, spec)
+
+    # grayscale and gaussian_blur run once per image, adaptive_threshold once per config per image
+    assert calls.count("grayscale") == 2
+    assert calls.count("gaussian_blur") == 2
+    assert calls.count("adaptive_threshold") == 6
+
+    name = "adaptive_threshold.block_size=15"
+    single_dir = tmp_path_factory.mktemp("single")
+    for path in image_dir.glob("*.png"):
+        cv2.imwrite(str(single_dir / path.name), cv2.imread(str(path)))
+    steps = [dict(s, params=dict(s["params"])) for s in BASE_STEPS]
+    steps[2]["params"]["block_size"] = 15
+    single = run_pipeline(str(single_dir), {"steps": steps})
+    assert tables[name] == single
+    swept = cv2.imread(str(image_dir / "output" / "sweep" / name / "scan_0.png"))
+    alone = cv2.imread(str(single_dir / "output" / "scan_0.png"))
+    assert np.array_equal(swept, alone)
+    with open(image_dir / "output" / "sweep" / name / "result.yaml") as f:
+        assert yaml.safe_load(f) == single
+
+
+@pytest.mark.sanity
+def test_sweep_uses_the_base_config_settings(image_dir, tmp_path_factory):
+    config = {"steps": BASE_STEPS, "output": {"format": "tiff"}, "fuse_pointwise": False}
+    spec = {"grid": {"adaptive_threshold.block_size": [11, 15]}}
+    tables = run_sweep(str(image_dir), config, spec)
+
+    name = "adaptive_threshold.block_size=15"
+    single_dir = tmp_path_factory.mktemp("single")
+    for path in image_dir.glob("*.png"):
+        cv2.imwrite(str(single_dir / path.name), cv2.imread(str(path)))
+    steps = [dict(s, params=dict(s["params"])) for s in BASE_STEPS]
+    steps[2]["params"]["block_size"] = 15
+    single = run_pipeline(str(single_dir), dict(config, steps=steps))
+    assert tables[name] == single
+    swept = cv2.imread(str(image_dir / "output" / "sweep" / name / "scan_0.tif"), cv2.IMREAD_UNCHANGED)
+    alone = cv2.imread(str(single_dir / "output" / "scan_0.tif"), cv2.IMREAD_UNCHANGED)
+    assert swept is not None and np.array_equal(swept, alone)
+    assert not (image_dir / "output" / "sweep" / name / "scan_0.png").exists()
@@ -0,0 +1,102 @@
+"""
+tests/test_tiling.py
+
+Tests for the tiled executor: stitched tiles must match a whole-image run exactly.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.pipeline import apply_step, run_pipeline
+from preprocessing_image.plan import PipelinePlan
+from preprocessing_image.tiling import TiledExecutor, tile_windows
+
+NEIGHBORHOOD_STEPS = [
+    ("gaussian_blur", {"ksize": 7, "sigma": 0}),
+    ("median_blur", {"ksize": 5}),
+    ("dilate", {"ksize": 3, "kernel_shape": "ellipse", "iterations": 2}),
+    ("erode", {"ksize": 5, "kernel_shape": "cross"}),
+    ("morph_open", {"ksize": 3, "kernel_shape": "rect", "target": "dark"}),
+    ("morph_close", {"ksize": 5}),
+    ("sharpen", {}),
+    ("adaptive_threshold", {"method": "gaussian", "block_size": 15, "C": 2}),
+    ("adaptive_threshold", {"method": "sauvola", "block_size": 31}),
+    ("adaptive_threshold", {"method": "niblack", "block_size": 9, "k": -0.2}),
+    ("nlmeans_denoise", {"h": 10, "templateWindowSize": 7, "searchWindowSize": 11}),
+    ("nlmeans_denoise", {"mode": "auto", "templateWindowSize": 7, "searchWindowSize": 11}),
+    ("nlmeans_denoise", {"mode": "auto", "mild_sigma": 50, "templateWindowSize": 7, "searchWindowSize": 11}),
+]
+
+
+def make_page(height=203, width=317):
+    rng = np.random.default_rng(11)
+    img = np.full((height, width, 3), 225, dtype=np.uint8)
+    for i in range(4):
+        cv2.putText(img, "tile %d" % i, (8, 40 + 45 * i), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (20, 20, 20), 2)
+    img = cv2.subtract(img, rng.integers(0, 30, img.shape, dtype=np.uint8))
+    return img
+
+
+def plan_step(name, params):
+    return PipelinePlan.from_config({"steps": [{"name": name, "params": params}]}).steps[0]
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("name,params", NEIGHBORHOOD_STEPS)
+@pytest.mark.parametrize("tile_size", [32, 64, 100])
+def test_tiled_output_matches_whole_image(name, params, tile_size):
+    step = plan_step(name, params)
+    image = make_page()
+    tiler = TiledExecutor(tile_size=tile_size, min_pixels=0, workers=3)
+    assert tiler.applies(step, image, step.params)
+    whole, whole_result = apply_step(step, image)
+    tiled, tiled_result = apply_step(step, image, tiler=tiler)
+    assert tiled.dtype == whole.dtype and tiled.shape == whole.shape
+    assert np.array_equal(tiled, whole)
+    assert tiled_result == whole_result and whole_result["status"] == "success"
+
+
+@pytest.mark.sanity
+def test_dilate_kernel_bump_is_decided_on_whole_image():
+    # Fewer than 10 bright pixels overall: the whole-image run raises ksize 3 to 5,
+    # and every tile must do the same even though most tiles are empty
+    image = np.zeros((90, 130), dtype=np.uint8)
+    image[[10, 45, 80], [20, 64, 120]] = 255
+    step = plan_step("dilate", {"ksize": 3, "target": "bright"})
+    whole, _ = apply_step(step, image)
+    tiled, _ = apply_step(step, image, tiler=TiledExecutor(tile_size=24, min_pixels=0))
+    assert np.array_equal(tiled, whole)
+    assert np.count_nonzero(whole) == 3 * 25
+
+
+@pytest.mark.sanity
+def test_small_images_and_other_kinds_are_not_tiled():
+    tiler = TiledExecutor(tile_size=64, min_pixels=10_000)
+    image = make_page(60, 90)
+    assert not tiler.applies(plan_step("median_blur", {"ksize": 5}), image, {"ksize": 5})
+    big = make_page(300, 400)
+    assert tiler.applies(plan_step("median_blur", {"ksize": 5}), big, {"ksize": 5})
+    assert not tiler.applies(plan_step("threshold", {"method": "otsu"}), big, {"method": "otsu"})
+
+
+@pytest.mark.sanity
+def test_tile_windows_cover_image_once():
+    covered = np.zeros((70, 45), dtype=int)
+    for tile, halo, inner in tile_windows(70, 45, 16, 3):
+        covered[tile] += 1
+        assert halo[0].start >= 0 and halo[0].stop <= 70 and halo[1].stop <= 45
+        assert inner[0].stop - inner[0].start == tile[0].stop - tile[0].start
+    assert (covered == 1).all()
+
+
+@pytest.mark.sanity
+def test_run_pipeline_with_tiling_matches_untiled(tmp_path):
+    steps = [{"name": name, "params": params} for name, params in NEIGHBORHOOD_STEPS[:3]]
+    for sub, tiling in (("whole", {}), ("tiled", {"enabled": True, "tile_size": 48, "min_pixels": 0})):
+        os.makedirs(tmp_path / sub)
+        cv2.imwrite(str(tmp_path / sub / "page.png"), make_page())
+        run_pipeline(str(tmp_path / sub), {"steps": steps, "tiling": tiling})
+    whole = cv2.imread(str(tmp_path / "whole" / "output" / "page.png"), cv2.IMREAD_UNCHANGED)
+    tiled = cv2.imread(str(tmp_path / "tiled" / "output" / "page.png"), cv2.IMREAD_UNCHANGED)
+    assert np.array_equal(tiled, whole)
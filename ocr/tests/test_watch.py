@@ -0,0 +1,154 @@
+"""
+tests/test_watch.py
+
+Tests for watch-folder mode: detecting complete new images and processing them incrementally.
+"""
+
+import os
+import time
+import threading
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image import pipeline
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.sinks import read_records
+from preprocessing_image.sources import DirectorySource, ManifestSource
+from preprocessing_image.watch import FolderWatcher
+
+STEPS = [
+    {"name": "grayscale", "params": {}},
+    {"name": "threshold", "params": {"method": "otsu"}},
+]
+
+
+def write_scan(path, age=0.0):
+    page = np.full((60, 90, 3), 220, dtype=np.uint8)
+    cv2.putText(page, "scan", (5, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (20, 20, 20), 2)
+    cv2.imwrite(str(path), page)
+    if age:
+        past = time.time() - age
+        os.utime(path, (past, past))
+
+
+def wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def records(path):
+    if not os.path.exists(path):
+        return {}
+    return dict(read_records(path))
+
+
+@pytest.mark.sanity
+def test_backlog_is_taken_at_once_and_new_files_once_settled(tmp_path):
+    write_scan(tmp_path / "old.png", age=60)
+    write_scan(tmp_path / "new.png")
+    (tmp_path / "empty.png").write_bytes(b"")
+    os.utime(tmp_path / "empty.png", (time.time() - 60, time.time() - 60))
+    watcher = FolderWatcher(DirectorySource(str(tmp_path)), interval=0.05, settle=0.3)
+    assert watcher.poll() == ["old.png"]
+    assert watcher.poll() == []
+    time.sleep(0.35)
+    assert watcher.poll() == ["new.png"]
+    # Each image is handed over once; empty files never are
+    time.sleep(0.35)
+    assert watcher.poll() == []
+
+
+@pytest.mark.sanity
+def test_growing_file_waits_until_it_stops_changing(tmp_path):
+    watcher = FolderWatcher(DirectorySource(str(tmp_path)), interval=0.05, settle=0.3)
+    data = cv2.imencode(".png", np.full((60, 90), 128, dtype=np.uint8))[1].tobytes()
+    path = tmp_path / "arriving.png"
+    with open(path, "wb") as f:
+        for i in range(4):
+            f.write(data[i * len(data) // 4:(i + 1) * len(data) // 4])
+            f.flush()
+            assert watcher.poll() == []
+            time.sleep(0.1)
+    assert watcher.poll() == []
+    time.sleep(0.35)
+    assert watcher.poll() == ["arriving.png"]
+
+
+@pytest.mark.sanity
+def test_manifest_cannot_be_watched(tmp_path):
+    with pytest.raises(ValueError, match="manifest"):
+        FolderWatcher(ManifestSource(str(tmp_path), str(tmp_path / "list.txt")))
+    assert FolderWatcher.from_config({}, DirectorySource(str(tmp_path))) is None
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("workers", [1, 2])
+def test_watch_processes_arrivals_incrementally(tmp_path, workers):
+    write_scan(tmp_path / "page_0.png", age=60)
+    config = {"steps": STEPS, "workers": workers, "journal": {"enabled": True}, "results": {"sink": "jsonl"},
+              "watch": {"enabled": True, "interval": 0.05, "settle": 0.2}}
+    results_path = str(tmp_path / "output" / "results.jsonl")
+    stop = threading.Event()
+    run = threading.Thread(target=run_pipeline, args=(str(tmp_path), config, stop))
+    run.start()
+    try:
+        # Results are readable while the watch runs, well before the sink's flush schedule
+        assert wait_for(lambda: "page_0.png" in records(results_path))
+        write_scan(tmp_path / "page_1.png")
+        assert wait_for(lambda: "page_1.png" in records(results_path))
+        assert (tmp_path / "output" / "page_1.png").is_file()
+    finally:
+        stop.set()
+        run.join(timeout=30)
+    assert not run.is_alive()
+    results = records(results_path)
+    assert list(results) == ["page_0.png", "page_1.png"]
+    assert all(result["threshold"]["status"] == "success" for result in results.values())
+
+    # A restarted watch reuses the journal instead of processing the same scans again
+    output_mtime = os.stat(tmp_path / "output" / "page_1.png").st_mtime_ns
+    os.remove(results_path)
+    stop = threading.Event()
+    run = threading.Thread(target=run_pipeline, args=(str(tmp_path), config, stop))
+    run.start()
+    try:
+        assert wait_for(lambda: len(records(results_path)) == 2)
+    finally:
+        stop.set()
+        run.join(timeout=30)
+    assert records(results_path) == results
+    assert os.stat(tmp_path / "output" / "page_1.png").st_mtime_ns == output_mtime
+
+
+@pytest.mark.sanity
+def test_watch_keeps_one_worker_pool(tmp_path, monkeypatch):
+    pools = []
+
+    class CountingPool(pipeline.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "ProcessPoolExecutor", CountingPool)
+    write_scan(tmp_path / "page_0.png", age=60)
+    config = {"steps": STEPS, "workers": 2, "results": {"sink": "jsonl"},
+              "watch": {"enabled": True, "interval": 0.05, "settle": 0.2}}
+    results_path = str(tmp_path / "output" / "results.jsonl")
+    stop = threading.Event()
+    run = threading.Thread(target=run_pipeline, args=(str(tmp_path), config, stop))
+    run.start()
+    try:
+        assert wait_for(lambda: "page_0.png" in records(results_path))
+        for i in (1, 2):
+            write_scan(tmp_path / f"page_{i}.png")
+            assert wait_for(lambda: f"page_{i}.png" in records(results_path))
+    finally:
+        stop.set()
+        run.join(timeout=30)
+    assert not run.is_alive()
+    # Every poll's new scans went to the pool started for the first one
+    assert len(pools) == 1
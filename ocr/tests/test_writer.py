@@ -0,0 +1,144 @@
+"""
+tests/test_writer.py
+
+Tests for output formats and writing output images on background threads.
+"""
+
+import os
+import cv2
+import numpy as np
+import pytest
+from preprocessing_image.packed import PackedBinary
+from preprocessing_image.pipeline import run_pipeline
+from preprocessing_image.writer import ImageWriter, OutputFormat
+
+STEPS = [
+    {"name": "grayscale", "params": {}},
+    {"name": "threshold", "params": {"method": "otsu"}},
+]
+
+
+def binary_page(height=90, width=140):
+    page = np.full((height, width), 255, dtype=np.uint8)
+    cv2.putText(page, "out", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3)
+    return page
+
+
+def gray_page(height=90, width=140):
+    rng = np.random.default_rng(1)
+    return cv2.add(binary_page(height, width) // 2 + 60, rng.integers(0, 40, (height, width), dtype=np.uint8))
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("fmt, extension", [("same", ".jpg"), ("png", ".png"), ("webp", ".webp"),
+                                            ("tiff", ".tif"), ("npy", ".npy")])
+def test_lossless_formats_roundtrip(tmp_path, fmt, extension):
+    output = OutputFormat(format=fmt, png_compression=0 if fmt == "png" else None)
+    path = output.path_for(str(tmp_path / "sub" / "page.jpg"))
+    assert path == str(tmp_path / "sub" / f"page{extension}")
+    image = gray_page()
+    output.write(image, path)
+    if fmt == "npy":
+        assert np.array_equal(np.load(path), image)
+    elif fmt != "same":  # same keeps .jpg, which is lossy; webp stores gray as three equal channels
+        assert np.array_equal(cv2.imread(path, cv2.IMREAD_GRAYSCALE), image)
+    else:
+        assert cv2.imread(path, cv2.IMREAD_UNCHANGED).shape == image.shape
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("packed", [False, True])
+def test_binary_tiff_is_group4(tmp_path, packed):
+    image_module = pytest.importorskip("PIL.Image")
+    image = binary_page()
+    path = str(tmp_path / "page.tif")
+    OutputFormat(format="tiff").write(PackedBinary.pack(image) if packed else image, path, binary=True)
+    with image_module.open(path) as written:
+        assert written.mode == "1" and written.info["compression"] == "group4"
+    assert np.array_equal(cv2.imread(path, cv2.IMREAD_GRAYSCALE), image)
+
+
+@pytest.mark.sanity
+def test_png_compression_level(tmp_path):
+    image = gray_page(400, 600)
+    sizes = []
+    for level in (0, 9):
+        path = str(tmp_path / f"level{level}.png")
+        OutputFormat(format="png", png_compression=level).write(image, path)
+        sizes.append(os.path.getsize(path))
+    assert sizes[1] < sizes[0]
+
+
+@pytest.mark.sanity
+def test_invalid_format():
+    with pytest.raises(ValueError, match="Invalid output format"):
+        OutputFormat.from_config({"output": {"format": "gif"}})
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("workers", [0, 3])
+def test_writer_writes_everything_by_close(tmp_path, workers):
+    image = gray_page()
+    with ImageWriter(OutputFormat(format="png"), workers=workers, depth=2) as writer:
+        for i in range(12):
+            writer.submit(f"img_{i}", image, str(tmp_path / f"img_{i}.jpg"))
+        results = [writer.result(f"img_{i}") for i in range(12)]
+    assert results == [None] * 12
+    assert sorted(os.listdir(tmp_path)) == sorted(f"img_{i}.png" for i in range(12))
+
+
+@pytest.mark.sanity
+def test_failed_write_is_reported(tmp_path):
+    blocked = tmp_path / "blocked.png"
+    blocked.mkdir()  # a directory where the image should go
+    with ImageWriter(OutputFormat(), workers=2) as writer:
+        writer.submit("blocked", gray_page(), str(blocked))
+        writer.submit("fine", gray_page(), str(tmp_path / "fine.png"))
+        failure = writer.result("blocked")
+        assert writer.result("fine") is None
+    assert failure["status"] == "failure" and "blocked.png" in failure["error"]
+    assert writer.failed == 1
+
+
+@pytest.mark.sanity
+def test_rejected_submit_releases_its_slot(tmp_path):
+    writer = ImageWriter(OutputFormat(), workers=1, depth=1)
+    writer.close()
+    # With a single slot, a slot kept by the first rejected submit would block the second forever
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            writer.submit("late", gray_page(), str(tmp_path / "late.png"))
+    assert writer._slots.acquire(timeout=1)
+
+
+@pytest.mark.sanity
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pipeline_output_format(tmp_path, workers):
+    for i in range(3):
+        cv2.imwrite(str(tmp_path / f"page_{i}.jpg"), cv2.cvtColor(gray_page(), cv2.COLOR_GRAY2BGR))
+    config = {"steps": STEPS, "workers": workers, "output": {"format": "tiff"}, "save_intermediate": True}
+    results = run_pipeline(str(tmp_path), config)
+    assert list(results) == [f"page_{i}.jpg" for i in range(3)]
+    output_dir = tmp_path / "output"
+    for i in range(3):
+        assert all(result["status"] == "success" for result in results[f"page_{i}.jpg"].values())
+        final = cv2.imread(str(output_dir / f"page_{i}.tif"), cv2.IMREAD_UNCHANGED)
+        assert final.shape == (90, 140) and set(np.unique(final)) <= {0, 255}
+        assert (output_dir / f"page_{i}_grayscale.tif").exists()
+
+
+@pytest.mark.sanity
+def test_pipeline_records_failed_output_and_retries_it(tmp_path):
+    for i in range(2):
+        cv2.imwrite(str(tmp_path / f"page_{i}.png"), gray_page())
+    (tmp_path / "output" / "page_1.png").mkdir(parents=True)
+    config = {"steps": STEPS, "journal": {"enabled": True}}
+    results = run_pipeline(str(tmp_path), config)
+    assert "output" not in results["page_0.png"]
+    assert results["page_1.png"]["output"]["status"] == "failure"
+    assert results["page_1.png"]["threshold"]["status"] == "success"
+
+    (tmp_path / "output" / "page_1.png").rmdir()
+    results = run_pipeline(str(tmp_path), config)
+    assert "output" not in results["page_1.png"]
+    assert (tmp_path / "output" / "page_1.png").is_file()